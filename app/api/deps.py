@@ -1,11 +1,12 @@
-from fastapi import Depends
+from fastapi import Depends, Request, Response
 from fastapi.security import OAuth2PasswordBearer
 
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.database import async_session_maker
+from app.core.database import async_session_maker, replica_router
 from app.core.redis_service import RedisCacheService
 from app.core.redis import get_redis_service
+from app.core.limiter import PipelinedLimit, RateLimiter, rate_limit_headers
 from app.service.users import UserService
 
 
@@ -13,9 +14,36 @@ from app.service.users import UserService
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/users/login")
 
 def get_user_service(cache: RedisCacheService = Depends(get_redis_service)) -> UserService:
-    return UserService(session_factory=async_session_maker, cache_service=cache)
+    return UserService(session_factory=async_session_maker, cache_service=cache, replicas=replica_router)
 
 async def get_current_user(token: str = Depends(oauth2_scheme),
                            service: UserService = Depends(get_user_service)
                            ):
     return await service.authenticate_user(token)
+
+
+class RateLimitedUser:
+    """get_current_user с лимитом запросов: лимит проверяется в том же pipeline,
+    что и токен с кэшем пользователя, поэтому весь путь стоит один round trip."""
+
+    def __init__(self, limiter: RateLimiter):
+        self.limiter = limiter
+
+    async def __call__(self,
+                       request: Request,
+                       response: Response,
+                       token: str = Depends(oauth2_scheme),
+                       service: UserService = Depends(get_user_service)
+                       ):
+        key = self.limiter.key(request)
+        if self.limiter.approximate:
+            # Приблизительный лимит считается в воркере и в pipeline не нужен
+            result = await self.limiter.check(service.cache_service.client, key)
+            if not result.allowed:
+                self.limiter.reject(result)
+            user, _ = await service.authenticate(token)
+        else:
+            user, result = await service.authenticate(token, PipelinedLimit(self.limiter, key))
+
+        response.headers.update(rate_limit_headers(result))
+        return user
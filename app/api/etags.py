@@ -0,0 +1,22 @@
+import re
+from typing import Optional
+
+from app.core.exceptions import PreconditionFailedError
+
+_ETAG = re.compile(r'^"(\d+)"$')
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+def parse_if_match(value: Optional[str]) -> Optional[int]:
+    """Версия из If-Match; None, если заголовка нет или он "*" (подходит любая версия).
+
+    Слабые и несколько ETag через запятую не поддерживаются: If-Match сравнивается строго.
+    """
+    if value is None or value.strip() == "*":
+        return None
+    match = _ETAG.match(value.strip())
+    if match is None:
+        raise PreconditionFailedError("Некорректный If-Match: передайте ETag из ответа на GET")
+    return int(match.group(1))
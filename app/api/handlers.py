@@ -10,5 +10,6 @@ async def app_error_handler(request: Request, exc: AppErrors):
             "error": exc.__class__.__name__,
                  "message": exc.message,
                  "path": request.url.path
-        }
+        },
+        headers=exc.headers,
     )
@@ -0,0 +1,40 @@
+import logging
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.query_stats import collect_queries
+
+logger = logging.getLogger(__name__)
+
+
+class QueryStatsMiddleware:
+    """Собирает обращения к БД за запрос и отдает их в заголовке Server-Timing.
+
+    У потоковых ответов (без Content-Length) заголовки уходят до первого запроса
+    к БД, поэтому для них итог пишется в лог после отправки тела.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        streaming = False
+        with collect_queries() as stats:
+            async def send_with_timing(message: Message) -> None:
+                nonlocal streaming
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    streaming = not any(name.lower() == b"content-length" for name, _ in headers)
+                    if not streaming:
+                        headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+        if streaming:
+            logger.info(f"{scope['method']} {scope['path']}: {stats.server_timing()}")
@@ -1,10 +1,13 @@
 import logging
 from fastapi import APIRouter, Depends
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 from app.core.database import get_db
+from app.core import metrics
+from app.api.routing import InstrumentedRoute
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 logger = logging.getLogger(__name__)
 
 @router.get("/health", tags=["health"])
@@ -19,4 +22,13 @@ async def health_check(db: AsyncSession = Depends(get_db)):
     return {
         "status": "alive",
         "database": db_status
-    }
+    }
+
+@router.get("/stats", tags=["health"])
+async def stats():
+    return metrics.snapshot()
+
+@router.get("/metrics", tags=["health"], include_in_schema=False)
+async def prometheus_metrics():
+    content, media_type = metrics.render_latest()
+    return Response(content=content, media_type=media_type)
@@ -0,0 +1,33 @@
+import base64
+import json
+
+from fastapi import Request, Response
+
+from app.core.exceptions import InvalidCursorError
+
+
+def encode_cursor(last_id: int) -> str:
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        last_id = payload["id"]
+    except (ValueError, KeyError, TypeError):
+        raise InvalidCursorError()
+
+    if not isinstance(last_id, int) or isinstance(last_id, bool) or last_id < 0:
+        raise InvalidCursorError()
+    return last_id
+
+def set_next_page_headers(request: Request, response: Response, last_id: int) -> str:
+    next_cursor = encode_cursor(last_id)
+    next_url = (request.url
+                .remove_query_params(["skip", "after_id", "cursor"])
+                .include_query_params(cursor=next_cursor))
+
+    response.headers["X-Next-Cursor"] = next_cursor
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    return next_cursor
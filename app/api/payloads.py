@@ -0,0 +1,29 @@
+from typing import Any, List
+
+import orjson
+from fastapi import Request
+
+from app.core.exceptions import InvalidPayloadError
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def read_json_rows(request: Request, max_rows: int) -> List[Any]:
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+
+    try:
+        if content_type in NDJSON_MEDIA_TYPES:
+            rows = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise InvalidPayloadError()
+
+    if not isinstance(rows, list):
+        raise InvalidPayloadError("Ожидается JSON-массив или NDJSON")
+    if not rows:
+        raise InvalidPayloadError("Пустой список")
+    if len(rows) > max_rows:
+        raise InvalidPayloadError(f"Не больше {max_rows} строк за запрос")
+    return rows
@@ -0,0 +1,57 @@
+import time
+from typing import Callable, Dict
+
+from fastapi import Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.routing import APIRoute
+from starlette.exceptions import HTTPException
+
+from app.core import metrics
+from app.core.exceptions import AppErrors
+
+
+def _status_of(exc: Exception) -> int:
+    if isinstance(exc, AppErrors):
+        return exc.status_code
+    if isinstance(exc, HTTPException):
+        return exc.status_code
+    if isinstance(exc, RequestValidationError):
+        return 422
+    return 500
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute с метриками: гистограмма времени по роуту и статусу и счетчик запросов в работе.
+
+    Метки роута (шаблон пути, а не реальный URL) известны при создании роута,
+    поэтому дочерние метрики создаются один раз, а не на каждый запрос.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+        method = ",".join(sorted(self.methods))
+        in_flight = metrics.HTTP_REQUESTS_IN_FLIGHT.labels(method, self.path)
+        timers: Dict[int, object] = {}
+
+        def timer(status: int):
+            child = timers.get(status)
+            if child is None:
+                child = timers[status] = metrics.HTTP_REQUEST_SECONDS.labels(method, self.path, str(status))
+            return child
+
+        async def instrumented_handler(request: Request) -> Response:
+            in_flight.inc()
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = await handler(request)
+                status = response.status_code
+                return response
+            except Exception as exc:
+                status = _status_of(exc)
+                raise
+            finally:
+                timer(status).observe(time.perf_counter() - started)
+                in_flight.dec()
+
+        return instrumented_handler
@@ -1,28 +1,37 @@
-from typing import List
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, Query, Path, Body
-from fastapi.responses import Response
+import orjson
+from fastapi import APIRouter, Depends, Query, Path, Body, Header, Request
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
 
 from app.core.redis_service import RedisCacheService
-from app.schemas.user import UserSchema, UserCreate, UserUpdate
+from app.schemas.user import (UserSchema, UserCreate, UserUpdate, UserBatch, UserImportReport, UserStatusChange,
+                              UserStatusReport, dump_users_json)
 from app.service.users import UserService
+from app.service.export import MEDIA_TYPES
 from app.models.user import User
 
-from app.api.deps import get_current_user, oauth2_scheme, get_user_service
+from app.api.deps import RateLimitedUser, oauth2_scheme, get_user_service
+from app.api.etags import etag, parse_if_match
+from app.api.pagination import decode_cursor, set_next_page_headers
+from app.api.payloads import read_json_rows
+from app.api.routing import InstrumentedRoute
 from app.core.limiter import RateLimiter
+from app.core.config import settings
 
-router = APIRouter()
+router = APIRouter(route_class=InstrumentedRoute)
 
 login_limiter = RateLimiter(times=10, seconds=60)
+me_user = RateLimitedUser(RateLimiter(times=20, seconds=60))
 
 @router.post("/logout",)
 async def logout(token: str = Depends(oauth2_scheme),
                  service: UserService = Depends(get_user_service)):
     return await service.logout(token)
 
-@router.get("/me", dependencies=[Depends(RateLimiter(times=20, seconds=60))], summary="Получить информацию о текущем пользователе")
-async def read_users_me(current_user: User = Depends(get_current_user),
+@router.get("/me", summary="Получить информацию о текущем пользователе")
+async def read_users_me(current_user: User = Depends(me_user),
                         service: UserService = Depends(get_user_service)):
     return {
         "data": current_user,
@@ -37,8 +46,13 @@ async def read_users_me(current_user: User = Depends(get_current_user),
 
          Этот метод позволяет:
          - **Ограничивать выборку** через 'skip' и 'limit';
+         - **Листать курсором**: 'after_id' или непрозрачный 'cursor' вместо 'skip',
+           стоимость страницы не зависит от глубины;
          - **Фильтр по удаленным**: по умолчанию скрыты, включаются флагом 'show_deleted'
          - **Фильтр по активным**: по умолчанию показаны, выключаются флагом 'show_active'
+
+         Если страница заполнена целиком, курсор следующей страницы возвращается
+         в заголовках 'X-Next-Cursor' и 'Link' (rel="next").
          """,
          responses={
              200: {"description": "Успешный возврат списка",
@@ -51,27 +65,103 @@ async def read_users_me(current_user: User = Depends(get_current_user),
                                    "email": "ivan@example.com",
                                    "is_active": True,
                                    "is_deleted": False,
-                                   "created_at": "2023-10-27T10:00:00"
+                                   "created_at": "2023-10-27T10:00:00",
+                                   "version": 1
                                }
                            ]
                        }
                    }
                    },
+             400: {"description": "Некорректный курсор пагинации"},
              422: {"description": "Ошибка валидции параметров"}
          })
-async def user_list(skip: int = Query(0,
+async def user_list(request: Request,
+                    skip: int = Query(0,
                                       ge=0,
                                       description="Пропустить количество пользователей"
                                       ),
                     limit: int = Query(10,
-                                       ge=1, le=10,
+                                       ge=1, le=100,
                                        description="Лимит вывода"
                                        ),
+                    after_id: Optional[int] = Query(None,
+                                                    ge=0,
+                                                    description="Вернуть пользователей с id больше указанного"
+                                                    ),
+                    cursor: Optional[str] = Query(None, description="Курсор из заголовка 'X-Next-Cursor'"),
                     show_deleted: bool = Query(False, description="Если True, покажет в том числе удаленных"),
                     show_active: bool = Query(True, description="Если False, скроет активных"),
                     service: UserService = Depends(get_user_service)
                     ):
-    return await service.user_list(skip, limit, show_deleted, show_active)
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+
+    users = await service.user_list(skip, limit, show_deleted, show_active, after_id)
+
+    # response_model остается для OpenAPI, тело собирается без повторной валидации
+    response = Response(content=dump_users_json(users), media_type="application/json")
+    if len(users) == limit:
+        set_next_page_headers(request, response, users[-1].id)
+    return response
+
+@router.get("/batch",
+            response_model=UserBatch,
+            tags=["users"],
+            summary="Получить пользователей по списку ID",
+            description="""
+            ### Получает пачку пользователей за один запрос
+
+            - ID передаются повторяющимся параметром: '?ids=1&ids=2&ids=3';
+            - Пользователи возвращаются в порядке запроса, повторы ID схлопываются;
+            - ID, которых нет (или которые не прошли фильтры), перечислены в 'missing';
+            - Фильтры 'show_deleted' и 'show_active' работают так же, как в получении по ID.
+            """,
+            responses={
+                422: {"description": "Ошибка валидции параметров"}
+            })
+async def get_users_batch(ids: List[int] = Query(...,
+                                                 min_length=1,
+                                                 max_length=settings.USER_BATCH_MAX_IDS,
+                                                 description="ID пользователей"
+                                                 ),
+                          show_deleted: bool = Query(False, description="Если True, покажет в том числе удаленных"),
+                          show_active: bool = Query(True, description="Если False, скроет активных"),
+                          service: UserService = Depends(get_user_service)
+                          ):
+    # Пользователи уже в JSON-виде из кэша, повторно через UserBatch их не прогоняем
+    body = orjson.dumps(await service.get_users(ids, show_deleted, show_active))
+    return Response(content=body, media_type="application/json")
+
+@router.get("/export",
+            tags=["users"],
+            summary="Выгрузка всех пользователей потоком",
+            description="""
+            ### Потоковая выгрузка таблицы пользователей в NDJSON или CSV
+
+            - Строки читаются курсором на стороне сервера фиксированными пачками
+              и сразу отправляются клиенту, память не растет с размером таблицы;
+            - **Фильтр по удаленным**: по умолчанию скрыты, включаются флагом 'show_deleted'
+            - **Фильтр по активным**: по умолчанию показаны, выключаются флагом 'show_active'
+            """,
+            response_class=StreamingResponse,
+            responses={
+                200: {"description": "Поток строк",
+                      "content": {"application/x-ndjson": {}, "text/csv": {}}},
+                422: {"description": "Ошибка валидции параметров"}
+            })
+async def export_users(export_format: Literal["ndjson", "csv"] = Query("ndjson",
+                                                                       alias="format",
+                                                                       description="Формат выгрузки"
+                                                                       ),
+                       show_deleted: bool = Query(False, description="Если True, покажет в том числе удаленных"),
+                       show_active: bool = Query(True, description="Если False, скроет активных"),
+                       service: UserService = Depends(get_user_service)
+                       ):
+    return StreamingResponse(
+        service.export_users(export_format, show_deleted, show_active),
+        media_type=MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="users.{export_format}"'},
+    )
 
 @router.get("/{user_id}",
          response_model=UserSchema,
@@ -94,7 +184,8 @@ async def user_list(skip: int = Query(0,
                                    "email": "ivan@example.com",
                                    "is_active": True,
                                    "is_deleted": False,
-                                   "created_at": "2023-10-27T10:00:00"
+                                   "created_at": "2023-10-27T10:00:00",
+                                   "version": 1
                                }
                            ]
                        }
@@ -108,7 +199,8 @@ async def get_user(user_id: int = Path(..., description="ID пользовате
                    show_active: bool = Query(True, description="Если False, скроет активных"),
                    service: UserService = Depends(get_user_service)
                    ):
-    return await service.get_user(user_id, show_deleted, show_active)
+    body, version = await service.get_user_json(user_id, show_deleted, show_active)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag(version)})
 
 @router.post("/",
           response_model=UserSchema,
@@ -141,7 +233,8 @@ async def get_user(user_id: int = Path(..., description="ID пользовате
                                   "email": "ivan@example.com",
                                   "is_active": True,
                                   "is_deleted": False,
-                                  "created_at": "2026-02-04T12:00:00"
+                                  "created_at": "2026-02-04T12:00:00",
+                                  "version": 1
                               }
                           ]
                       }
@@ -150,13 +243,76 @@ async def get_user(user_id: int = Path(..., description="ID пользовате
               400: {"description": "Пользователь с таким E-Mail уже существует"},
               422: {"description": "Ошибка валидации данных (неверный формат E-Mail, "
                                    "короткий username, "
-                                   "короткий пароль)."}
+                                   "короткий пароль)."},
+              503: {"description": "Очередь хеширования паролей переполнена"}
           })
 async def create_user(data: UserCreate,
                       service: UserService = Depends(get_user_service)
                       ):
     return await service.create_user(data)
 
+@router.post("/bulk",
+             response_model=UserImportReport,
+             tags=["users"],
+             summary="Массовое создание пользователей",
+             description="""
+             ### Импорт пачки учетных записей за несколько обращений к БД
+
+             Принимает JSON-массив объектов как в создании пользователя или NDJSON
+             ('Content-Type: application/x-ndjson', по объекту на строку).
+
+             ***Как работает метод:***
+             - Каждая строка валидируется отдельно, ошибки не прерывают импорт;
+             - Дубликаты внутри пачки и уже занятые 'username'/'email' отсекаются до хеширования;
+             - Пароли хешируются параллельно в пуле bcrypt;
+             - Строки загружаются через COPY во временную таблицу и переносятся одним INSERT ... ON CONFLICT DO NOTHING.
+
+             В ответе итог по каждой строке: 'created', 'conflict' (с полем) или 'invalid' (с причиной).
+             """,
+             responses={
+                 400: {"description": "Тело не разбирается или строк больше допустимого"},
+                 503: {"description": "Очередь хеширования паролей переполнена"}
+             },
+             openapi_extra={
+                 "requestBody": {
+                     "required": True,
+                     "content": {
+                         "application/json": {
+                             "schema": {"type": "array", "items": {"$ref": "#/components/schemas/UserCreate"}}
+                         },
+                         "application/x-ndjson": {"schema": {"type": "string"}}
+                     }
+                 }
+             })
+async def import_users(request: Request,
+                       service: UserService = Depends(get_user_service)
+                       ):
+    rows = await read_json_rows(request, max_rows=settings.USER_IMPORT_MAX_ROWS)
+    return await service.import_users(rows)
+
+@router.post("/status",
+             response_model=UserStatusReport,
+             tags=["users"],
+             summary="Массовая смена статуса пользователей",
+             description="""
+             ### Активация, деактивация или мягкое удаление пачки пользователей
+
+             ***Как работает метод:***
+             - Все ID меняются одним UPDATE; пользователи, уже стоящие в нужном состоянии, не трогаются;
+             - 'soft_delete' заодно деактивирует: активный и удаленный одновременно быть не может;
+             - 'activate' не применяется к удаленным, они попадают в ответ как 'conflict';
+             - Кэш всех измененных пользователей сбрасывается одной пачкой.
+
+             В ответе итог по каждому ID: 'updated', 'unchanged', 'conflict' или 'not_found'.
+             """,
+             responses={
+                 422: {"description": "Ошибка валидации: пустой список, слишком много ID или неизвестное действие"}
+             })
+async def change_status(data: UserStatusChange = Body(..., description="ID пользователей и действие"),
+                        service: UserService = Depends(get_user_service)
+                        ):
+    return await service.change_status(data.ids, data.action)
+
 @router.patch("/{user_id}",
            response_model=UserSchema,
            summary="Обновить данные пользователя",
@@ -170,6 +326,7 @@ async def create_user(data: UserCreate,
                         "           - Если меняется 'email' или 'username', система проверит его на уникальность.\n"
                         "           - Поле 'id' и 'created_at' изменить нельзя.\n"
                         "           - Пользователь не может быть 'is_active' и 'is_deleted' одновременно, при 'is_active' = 'True', то 'is_deleted' = 'False' и наоборот'\n"
+                        "           - С заголовком 'If-Match' (ETag из GET) запись обновится, только если ее версия не менялась, иначе 412.\n"
                         "           "),
            responses={
                200:
@@ -184,7 +341,8 @@ async def create_user(data: UserCreate,
                                        "email": "ivan@example.com",
                                        "is_active": True,
                                        "is_deleted": False,
-                                       "created_at": "2026-02-04T12:00:00"
+                                       "created_at": "2026-02-04T12:00:00",
+                                       "version": 1
                                    }
                                ]
                            }
@@ -193,15 +351,21 @@ async def create_user(data: UserCreate,
                400: {"description": "Email/username уже занят другим пользователем/"
                                     "активность и удаленность пользователя одновременно"},
                404: {"description": "Пользователь не найден"},
+               412: {"description": "Запись изменилась после выдачи ETag из If-Match"},
                422: {"description": "Ошибка валидации данных (неверный формат E-Mail, "
                                     "короткий username, "
                                     "короткий пароль)."}
            })
-async def update_user(user_data: UserUpdate = Body(..., description="Данные для обновления (JSON)"),
+async def update_user(response: Response,
+                      user_data: UserUpdate = Body(..., description="Данные для обновления (JSON)"),
                       user_id: int = Path(..., description="ID пользователя", ge=1),
+                      if_match: Optional[str] = Header(None, description="ETag из ответа GET: "
+                                                                         "обновить, только если запись не менялась"),
                       service: UserService = Depends(get_user_service)
                       ):
-    return await service.update_user(user_data, user_id)
+    updated = await service.update_user(user_data, user_id, expected_version=parse_if_match(if_match))
+    response.headers["ETag"] = etag(updated.version)
+    return updated
 #Есть Soft_delete в Patch, но в тз не указано явно какой Delete нужен
 @router.delete("/{user_id}",
             status_code=204,
@@ -231,7 +395,8 @@ async def delete_user(user_id: int = Path(description="Id пользовател
              responses={
                 201: {"description": "Успешный вход"},
                 404: {"description": "Пользователь не найден"},
-                401: {"description": "Неверный логин или пароль"}
+                401: {"description": "Неверный логин или пароль"},
+                503: {"description": "Очередь проверки паролей переполнена"}
              })
 async def login(data: OAuth2PasswordRequestForm = Depends(),
                 service: UserService = Depends(get_user_service)):
@@ -0,0 +1,99 @@
+from typing import Any, Dict, Optional
+
+import orjson
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class OrjsonCodec:
+    codec_id = b"j"
+    json_native = True
+
+    def dumps(self, obj: Any) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+class MsgpackCodec:
+    codec_id = b"m"
+    json_native = False
+
+    def __init__(self):
+        if msgpack is None:
+            raise RuntimeError("CACHE_CODEC=msgpack требует установленного пакета msgpack")
+
+    def dumps(self, obj: Any) -> bytes:
+        return msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data: bytes) -> Any:
+        return msgpack.unpackb(data, raw=False)
+
+
+CODECS = {
+    "orjson": OrjsonCodec,
+    "msgpack": MsgpackCodec,
+}
+
+
+class VersionedCodec:
+    """Кодирует значения кэша один раз, с заголовком из id кодека и версии схемы.
+
+    Заголовок — два байта: id кодека и schema_version. Записи старой версии схемы
+    (или старого формата без заголовка) читаются как промах, поэтому смена схемы
+    не требует сброса Redis. Чужой, но известный кодек декодируется своим кодеком,
+    что позволяет менять CACHE_CODEC раскаткой по воркерам.
+
+    С record_version_field за заголовком идут еще четыре байта — значение этого
+    поля записи: его читает record_version, не разбирая тело.
+    """
+
+    def __init__(self, codec_name: str, schema_version: int, record_version_field: Optional[str] = None):
+        self.codec = CODECS[codec_name]()
+        self.schema_version = schema_version
+        self.record_version_field = record_version_field
+        self.header = self.codec.codec_id + bytes([schema_version])
+        self._body_offset = len(self.header) + (4 if record_version_field else 0)
+        self._decoders: Dict[bytes, Any] = {self.codec.codec_id: self.codec}
+        for codec_class in CODECS.values():
+            if codec_class.codec_id not in self._decoders:
+                try:
+                    self._decoders[codec_class.codec_id] = codec_class()
+                except RuntimeError:
+                    pass
+
+    def encode(self, obj: Any) -> bytes:
+        if self.record_version_field is None:
+            return self.header + self.codec.dumps(obj)
+        record_version = obj.get(self.record_version_field, 0)
+        return self.header + record_version.to_bytes(4, "big") + self.codec.dumps(obj)
+
+    def _decoder_for(self, payload: Optional[bytes]):
+        if not payload or len(payload) < self._body_offset or payload[1] != self.schema_version:
+            return None
+        return self._decoders.get(payload[:1])
+
+    def record_version(self, payload: bytes) -> int:
+        return int.from_bytes(payload[2:self._body_offset], "big")
+
+    def accepts(self, payload: Optional[bytes]) -> bool:
+        return self._decoder_for(payload) is not None
+
+    def decode(self, payload: Optional[bytes]) -> Optional[Any]:
+        decoder = self._decoder_for(payload)
+        if decoder is None:
+            return None
+        return decoder.loads(payload[self._body_offset:])
+
+    def decode_json(self, payload: Optional[bytes]) -> Optional[bytes]:
+        """Отдает значение как готовое JSON-тело ответа; для JSON-кодека без разбора."""
+        decoder = self._decoder_for(payload)
+        if decoder is None:
+            return None
+        if decoder.json_native:
+            return payload[self._body_offset:]
+        return orjson.dumps(decoder.loads(payload[self._body_offset:]))
@@ -1,16 +1,69 @@
 import os
+from typing import List, Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL : str
+    # Соединений с одним сервером Postgres на весь инстанс (все воркеры uvicorn вместе):
+    # сумма по инстансам должна оставаться ниже max_connections за вычетом служебных
+    DB_CONNECTION_BUDGET: int = 60
+    # Число воркеров uvicorn; uvicorn сам читает эту переменную как значение --workers
+    WEB_CONCURRENCY: int = 1
+    # Доля соединений воркера, которая открывается только под пиком (overflow) и закрывается после
+    DB_POOL_OVERFLOW_FRACTION: float = 0.25
+    DB_POOL_TIMEOUT: float = 60
+    DB_POOL_RECYCLE: int = 3600
+    # Режим для PgBouncer в transaction pooling: без своего пула и без именованных prepared statements
+    DB_PGBOUNCER: bool = False
+    # Сколько подготовленных выражений asyncpg держит на соединение (LRU); 0 — не кэшировать
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    # Сверка индексов модели с БД при старте: warn — в лог, fail — не запускаться
+    DB_SCHEMA_CHECK: Literal["off", "warn", "fail"] = "warn"
+    # Реплики для чтения, JSON-список URL: '["postgresql+asyncpg://...@replica1/db", ...]'
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_MAX_LAG_SECONDS: float = 5
+    REPLICA_HEALTH_CHECK_SECONDS: float = 5
+    # Не меньше REPLICA_MAX_LAG_SECONDS + REPLICA_HEALTH_CHECK_SECONDS: за это время запись доходит до реплик
+    READ_YOUR_WRITES_SECONDS: float = 10
 
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
+    TOKEN_CACHE_SIZE: int = 50000
+    TOKEN_CACHE_TTL: float = 30
+    REVOCATION_FILTER_CAPACITY: int = 1_000_000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_FILTER_REBUILD_SECONDS: float = 300
 
     REDIS_HOST: str
     REDIS_PORT: int
 
+    RATE_LIMIT_STRATEGY: Literal["fixed_window", "sliding_window", "gcra"] = "sliding_window"
+    RATE_LIMIT_MODE: Literal["exact", "approximate"] = "exact"
+    RATE_LIMIT_FLUSH_INTERVAL_MS: int = 100
+    RATE_LIMIT_FLUSH_HITS: int = 5
+
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_QUEUE_SIZE: int = 32
+
+    USER_LOCAL_CACHE_SIZE: int = 10000
+    USER_LOCAL_CACHE_TTL: float = 30
+    CACHE_CODEC: Literal["orjson", "msgpack"] = "orjson"
+
+    USER_CACHE_TTL: int = 300
+    USER_CACHE_TTL_JITTER: int = 30
+    USER_CACHE_LOCK_ENABLED: bool = False
+    USER_CACHE_LOCK_TTL_MS: int = 2000
+    USER_CACHE_LOCK_POLL_MS: int = 50
+
+    USER_BATCH_MAX_IDS: int = 100
+    USER_IMPORT_MAX_ROWS: int = 1000
+    USER_STATUS_MAX_IDS: int = 5000
+    USER_EXPORT_CHUNK_SIZE: int = 1000
+
+    SLOW_QUERY_MS: float = 200
+
     model_config = SettingsConfigDict(
         env_file=".env.test" if os.getenv("PYTEST") else ".env"
     )
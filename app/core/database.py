@@ -1,18 +1,216 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+import asyncio
+import itertools
+import logging
+import time
+import uuid
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
+from app.core import metrics
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
+
+
+class _PoolMetrics:
+    """Метрики пула: выданные соединения, overflow и ожидание соединения.
+
+    Метка pool — pool_logging_name движка ("primary", "replica0", ...).
+    """
+
+    _metrics = None
+
+    def _children(self):
+        if self._metrics is None:
+            name = self._orig_logging_name or "primary"
+            self._metrics = (metrics.DB_POOL_WAIT_SECONDS.labels(name),
+                             metrics.DB_POOL_CHECKED_OUT.labels(name),
+                             metrics.DB_POOL_OVERFLOW.labels(name))
+        return self._metrics
+
+    def _do_get(self):
+        started = time.perf_counter()
+        connection = super()._do_get()
+        self._children()[0].observe(time.perf_counter() - started)
+        self._track(1)
+        return connection
+
+    def _do_return_conn(self, record):
+        super()._do_return_conn(record)
+        self._track(-1)
+
+    def _track(self, delta: int) -> None:
+        _, checked_out, overflow = self._children()
+        checked_out.set(self.checkedout())
+        overflow.set(max(0, self.overflow()))
+
+
+class InstrumentedQueuePool(_PoolMetrics, AsyncAdaptedQueuePool):
+    pass
+
+
+class InstrumentedNullPool(_PoolMetrics, NullPool):
+    """Без пула: каждое соединение открывается заново, ожидание — это время подключения."""
+
+    _checked_out = 0
+
+    def _track(self, delta: int) -> None:
+        self._checked_out += delta
+        self._children()[1].set(self._checked_out)
+
+
+def pool_limits(budget: int, workers: int, overflow_fraction: float) -> Tuple[int, int]:
+    """pool_size и max_overflow воркера, чтобы все воркеры вместе держали не больше budget соединений."""
+    per_worker = budget // max(1, workers)
+    if per_worker < 1:
+        logger.warning(f"Бюджет {budget} соединений меньше числа воркеров {workers}, каждому дается одно")
+        per_worker = 1
+    overflow = int(per_worker * overflow_fraction)
+    return max(1, per_worker - overflow), overflow
+
+
+def _statement_name() -> str:
+    # Имена prepared statements уникальны: в transaction pooling соседний клиент PgBouncer
+    # может получить то же серверное соединение
+    return f"__asyncpg_{uuid.uuid4()}__"
+
+
+def make_engine(url: str, name: str) -> AsyncEngine:
+    if settings.DB_PGBOUNCER:
+        metrics.DB_POOL_LIMIT.labels(name, "size").set(0)
+        return create_async_engine(url,
+                                   echo=False,
+                                   poolclass=InstrumentedNullPool,
+                                   pool_logging_name=name,
+                                   connect_args={"statement_cache_size": 0,
+                                                 "prepared_statement_cache_size": 0,
+                                                 "prepared_statement_name_func": _statement_name},
+                                   )
+
+    pool_size, max_overflow = pool_limits(settings.DB_CONNECTION_BUDGET, settings.WEB_CONCURRENCY,
+                                          settings.DB_POOL_OVERFLOW_FRACTION)
+    metrics.DB_POOL_LIMIT.labels(name, "size").set(pool_size)
+    metrics.DB_POOL_LIMIT.labels(name, "overflow").set(max_overflow)
+    return create_async_engine(url,
+                               echo=False,
+                               poolclass=InstrumentedQueuePool,
+                               pool_logging_name=name,
+                               pool_size=pool_size,
+                               max_overflow=max_overflow,
+                               pool_timeout=settings.DB_POOL_TIMEOUT,
+                               pool_recycle=settings.DB_POOL_RECYCLE,
+                               connect_args={"prepared_statement_cache_size":
+                                             settings.DB_PREPARED_STATEMENT_CACHE_SIZE},
+                               )
+
+def make_session_maker(bind: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(bind, expire_on_commit=False, class_=AsyncSession)
+
+
+engine = make_engine(settings.DATABASE_URL, "primary")
+
+async_session_maker = make_session_maker(engine)
+
+# Отставание реплики в секундах; 0, если она проиграла все, что получила, или это не реплика
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, name: str, engine: AsyncEngine):
+        self.name = name
+        self.engine = engine
+        self.session_maker = make_session_maker(engine)
+        # До первой проверки реплика считается недоступной: чтения идут на primary
+        self.healthy = False
+        self.lag: Optional[float] = None
+
+
+class ReplicaRouter:
+    """Выбирает, куда идти за чтением: реплики по кругу, primary, если здоровых реплик нет.
+
+    Реплика здорова, если последняя проверка прошла и отставание не больше max_lag_seconds.
+    Проверки идут фоном каждые interval секунд (start/stop из lifespan).
+    """
+
+    def __init__(self, primary: async_sessionmaker, replicas: List[Replica], max_lag_seconds: float):
+        self.primary = primary
+        self.replicas = replicas
+        self.max_lag_seconds = max_lag_seconds
+        self._turn = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self._to_replica = metrics.DB_READS.labels("replica")
+        self._to_primary = metrics.DB_READS.labels("primary")
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.replicas)
+
+    def reader(self) -> async_sessionmaker:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            self._to_primary.inc()
+            return self.primary
+        self._to_replica.inc()
+        return healthy[next(self._turn) % len(healthy)].session_maker
+
+    async def check(self, timeout: float = 5) -> None:
+        await asyncio.gather(*(self._check(replica, timeout) for replica in self.replicas))
+
+    @staticmethod
+    async def _lag(replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            return float(await conn.scalar(REPLICA_LAG_QUERY))
+
+    async def _check(self, replica: Replica, timeout: float) -> None:
+        try:
+            lag = await asyncio.wait_for(self._lag(replica), timeout)
+        except Exception as exc:
+            if replica.healthy or replica.lag is None:
+                logger.warning(f"Реплика {replica.name} недоступна, чтения идут на primary: {exc}")
+            replica.healthy, replica.lag = False, float("inf")
+            return
+
+        healthy = lag <= self.max_lag_seconds
+        if replica.healthy and not healthy:
+            logger.warning(f"Реплика {replica.name} отстает на {lag:.1f} с, чтения идут мимо нее")
+        replica.healthy, replica.lag = healthy, lag
+        metrics.DB_REPLICA_LAG_SECONDS.labels(replica.name).set(lag)
+
+    def start(self, interval: float) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._check_forever(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _check_forever(self, interval: float) -> None:
+        while True:
+            await self.check(timeout=interval)
+            await asyncio.sleep(interval)
 
-engine = create_async_engine(settings.DATABASE_URL,
-                             echo=False,
-                             pool_size=20,
-                             max_overflow=100,
-                             pool_timeout=60,
-                             pool_recycle=3600
-                             )
 
-async_session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+replica_router = ReplicaRouter(
+    primary=async_session_maker,
+    replicas=[Replica(f"replica{i}", make_engine(url, f"replica{i}"))
+              for i, url in enumerate(settings.DATABASE_REPLICA_URLS)],
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+)
 
 class Base(DeclarativeBase):
     pass
@@ -1,7 +1,11 @@
+from typing import Dict, Optional
+
 class AppErrors(Exception):
-    def __init__(self, message: str = "Внутренняя ошибка сервера", status_code: int = 500):
+    def __init__(self, message: str = "Внутренняя ошибка сервера", status_code: int = 500,
+                 headers: Optional[Dict[str, str]] = None):
         self.message = message
         self.status_code = status_code
+        self.headers = headers
         super().__init__(self.message)
 
 class EntityNotFoundError(AppErrors):
@@ -25,9 +29,26 @@ class WrongDataError(AppErrors):
         super().__init__(message, status_code=401)
 
 class TooManyRequestsError(AppErrors):
-    def __init__(self, message: str = "Превышен лимит"):
-        super().__init__(message, status_code=429)
+    def __init__(self, message: str = "Превышен лимит", headers: Optional[Dict[str, str]] = None):
+        super().__init__(message, status_code=429, headers=headers)
 
 class TokenBlackListedError(AppErrors):
     def __init__(self, message: str = "Токен сброшен, войдите заново"):
-        super().__init__(message, status_code=401)
+        super().__init__(message, status_code=401)
+
+class ServiceOverloadedError(AppErrors):
+    def __init__(self, message: str = "Сервис перегружен, повторите запрос позже"):
+        super().__init__(message, status_code=503)
+
+class InvalidCursorError(AppErrors):
+    def __init__(self, message: str = "Некорректный курсор пагинации"):
+        super().__init__(message, status_code=400)
+
+class InvalidPayloadError(AppErrors):
+    def __init__(self, message: str = "Некорректное тело запроса"):
+        super().__init__(message, status_code=400)
+
+class PreconditionFailedError(AppErrors):
+    def __init__(self, message: str = "Запись изменилась: перечитайте ее и повторите запрос с новым If-Match",
+                 headers: Optional[Dict[str, str]] = None):
+        super().__init__(message, status_code=412, headers=headers)
@@ -0,0 +1,83 @@
+import asyncio
+import inspect
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Union
+
+import redis.asyncio as redis
+
+logger = logging.getLogger(__name__)
+
+
+class InvalidationListener:
+    """Фоновая подписка на каналы Redis pub/sub, через которые воркеры сбрасывают локальные кэши.
+
+    Пока подписки нет (обрыв соединения), сообщения теряются, поэтому после
+    переподключения вызываются on_reset-обработчики и локальные кэши чистятся целиком
+    (или перечитываются, если обработчик асинхронный). on_disconnect-обработчики
+    вызываются сразу при обрыве, для кэшей, которым нельзя доверять без подписки.
+    """
+
+    def __init__(self, client: redis.Redis, retry_delay: float = 1.0):
+        self.client = client
+        self.retry_delay = retry_delay
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self._reset_handlers: List[Callable[[], Union[None, Awaitable[None]]]] = []
+        self._disconnect_handlers: List[Callable[[], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.connected = asyncio.Event()
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]) -> None:
+        self._handlers[channel] = handler
+
+    def on_reset(self, handler: Callable[[], Union[None, Awaitable[None]]]) -> None:
+        self._reset_handlers.append(handler)
+
+    def on_disconnect(self, handler: Callable[[], None]) -> None:
+        self._disconnect_handlers.append(handler)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*self._handlers)
+                for handler in self._reset_handlers:
+                    result = handler()
+                    if inspect.isawaitable(result):
+                        await result
+                self.connected.set()
+
+                async for message in pubsub.listen():
+                    data = message["data"]
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    channel = message["channel"]
+                    if isinstance(channel, bytes):
+                        channel = channel.decode("utf-8")
+                    try:
+                        self._handlers[channel](data)
+                    except Exception as exc:
+                        logger.error(f"Ошибка обработки инвалидации из {channel}: {exc}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.warning(f"Подписка на инвалидацию кэша оборвалась: {exc}")
+            finally:
+                self.connected.clear()
+                for handler in self._disconnect_handlers:
+                    handler()
+                await pubsub.aclose()
+
+            await asyncio.sleep(self.retry_delay)
@@ -1,30 +1,339 @@
-from fastapi import Request, Depends
+import asyncio
+import logging
+import math
+import secrets
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
 
+from fastapi import Request, Response, Depends
+
+from app.core import metrics
+from app.core.config import settings
 from app.core.redis import get_redis_client
 from app.core.exceptions import TooManyRequestsError
+from app.core.lua import LuaScript
 
 import redis.asyncio as redis
 
-LUA_LIMITER = """
+logger = logging.getLogger(__name__)
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_ms: int
+    retry_after_ms: int
+
+
+# Все скрипты возвращают {allowed, remaining, reset_ms, retry_after_ms}.
+# Время передается из приложения в миллисекундах: у воркеров одни часы (NTP),
+# а скрипт остается детерминированным и реплицируется как есть.
+
+LUA_FIXED_WINDOW = """
 local current = redis.call("INCR", KEYS[1])
 if current == 1 then
-    redis.call("EXPIRE", KEYS[1], ARGV[1])
+    redis.call("PEXPIRE", KEYS[1], ARGV[2])
+end
+local reset = redis.call("PTTL", KEYS[1])
+local limit = tonumber(ARGV[3])
+if current > limit then
+    return {0, 0, reset, reset}
+end
+return {1, limit - current, reset, 0}
+"""
+
+LUA_SLIDING_WINDOW = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call("ZREMRANGEBYSCORE", KEYS[1], "-inf", now - window)
+local count = redis.call("ZCARD", KEYS[1])
+if count >= limit then
+    local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+    local retry = tonumber(oldest[2]) + window - now
+    return {0, 0, retry, retry}
+end
+redis.call("ZADD", KEYS[1], now, ARGV[4])
+redis.call("PEXPIRE", KEYS[1], window)
+local oldest = redis.call("ZRANGE", KEYS[1], 0, 0, "WITHSCORES")
+return {1, limit - count - 1, tonumber(oldest[2]) + window - now, 0}
+"""
+
+LUA_GCRA = """
+local now = tonumber(ARGV[1])
+local period = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local interval = period / limit
+local tat = tonumber(redis.call("GET", KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+local new_tat = tat + interval
+local allow_at = new_tat - period
+if now < allow_at then
+    return {0, 0, math.ceil(tat - now), math.ceil(allow_at - now)}
 end
-return current
+redis.call("SET", KEYS[1], string.format("%.3f", new_tat), "PX", math.ceil(new_tat - now))
+return {1, math.floor((now - allow_at) / interval), math.ceil(new_tat - now), 0}
 """
 
+
+class RateLimitStrategy:
+    name: str
+    script: LuaScript
+
+    def args(self, now_ms: int, window_ms: int, times: int) -> list:
+        return [now_ms, window_ms, times]
+
+    async def hit(self, client: redis.Redis, key: str, times: int, seconds: int,
+                  now_ms: Optional[int] = None) -> RateLimitResult:
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        raw = await self.script(client, [key], self.args(now_ms, seconds * 1000, times))
+        return self.parse(raw, times)
+
+    def queue(self, pipe, key: str, times: int, seconds: int) -> None:
+        """Добавляет проверку в чужой pipeline; ответ разбирается через parse."""
+        now_ms = int(time.time() * 1000)
+        pipe.evalsha(self.script.sha, 1, key, *self.args(now_ms, seconds * 1000, times))
+
+    @staticmethod
+    def parse(raw: list, times: int) -> RateLimitResult:
+        allowed, remaining, reset_ms, retry_after_ms = raw
+        return RateLimitResult(bool(allowed), times, int(remaining), int(reset_ms), int(retry_after_ms))
+
+
+class FixedWindow(RateLimitStrategy):
+    """Счетчик INCR на окно: дешевле всех, но на стыке окон пропускает до 2x лимита."""
+
+    name = "fixed_window"
+    script = LuaScript(LUA_FIXED_WINDOW)
+
+
+class SlidingWindowLog(RateLimitStrategy):
+    """Точное скользящее окно на ZSET: память O(times) на ключ."""
+
+    name = "sliding_window"
+    script = LuaScript(LUA_SLIDING_WINDOW)
+
+    def args(self, now_ms: int, window_ms: int, times: int) -> list:
+        return [now_ms, window_ms, times, f"{now_ms}-{secrets.token_hex(4)}"]
+
+
+class GCRA(RateLimitStrategy):
+    """GCRA (token bucket): одно число на ключ, запросы равномерно распределяются по окну
+    с допустимым всплеском до times."""
+
+    name = "gcra"
+    script = LuaScript(LUA_GCRA)
+
+
+STRATEGIES: Dict[str, RateLimitStrategy] = {
+    strategy.name: strategy for strategy in (FixedWindow(), SlidingWindowLog(), GCRA())
+}
+
+async def load_scripts(client: redis.Redis) -> None:
+    for strategy in STRATEGIES.values():
+        await strategy.script.load(client)
+
+
+def rate_limit_headers(result: RateLimitResult) -> Dict[str, str]:
+    headers = {
+        "X-RateLimit-Limit": str(result.limit),
+        "X-RateLimit-Remaining": str(result.remaining),
+        "X-RateLimit-Reset": str(math.ceil(result.reset_ms / 1000)),
+    }
+    if not result.allowed:
+        headers["Retry-After"] = str(max(1, math.ceil(result.retry_after_ms / 1000)))
+    return headers
+
+
+class _LocalWindow:
+    __slots__ = ("window", "synced", "pending", "previous")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.synced = 0
+        self.pending = 0
+        self.previous = 0
+
+
+class LocalRateLimits:
+    """Приблизительный лимитер: счет ведется в воркере, в Redis уходят пачки приращений.
+
+    Окно скользящее по счетчикам: оценка = счетчик прошлого окна с весом оставшейся
+    доли окна + глобальный счетчик текущего окна на момент последней синхронизации
+    + локальные, еще не отправленные хиты. Решение принимается без Redis; приращения
+    отправляются INCRBY раз в flush_interval_ms или сразу, как только по ключу
+    накопилось flush_hits хитов.
+
+    Цена — перепуск: каждый воркер не видит до flush_hits чужих несинхронизированных
+    хитов, поэтому на W воркерах окно может пропустить до times + W * flush_hits
+    запросов. Меньше flush_hits — точнее лимит, но чаще запросы в Redis.
+    """
+
+    def __init__(self, flush_interval_ms: int, flush_hits: int):
+        self.flush_interval_ms = flush_interval_ms
+        self.flush_hits = flush_hits
+        self._windows: Dict[Tuple[str, int], _LocalWindow] = {}
+        self._carry: List[Tuple[str, int, int, int]] = []
+        self._client: Optional[redis.Redis] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending_flush: Optional[asyncio.Task] = None
+
+    def _state(self, key: str, window_ms: int, window: int) -> _LocalWindow:
+        state = self._windows.get((key, window_ms))
+        if state is None:
+            state = self._windows[(key, window_ms)] = _LocalWindow(window)
+        elif state.window != window:
+            if state.pending:
+                self._carry.append((key, window_ms, state.window, state.pending))
+            state.previous = state.synced + state.pending if window == state.window + 1 else 0
+            state.window, state.synced, state.pending = window, 0, 0
+        return state
+
+    def hit(self, client: redis.Redis, key: str, times: int, seconds: int,
+            now_ms: Optional[int] = None) -> RateLimitResult:
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        window_ms = seconds * 1000
+        window, elapsed = divmod(now_ms, window_ms)
+        state = self._state(key, window_ms, window)
+
+        weight = 1 - elapsed / window_ms
+        estimate = state.previous * weight + state.synced + state.pending
+        reset_ms = window_ms - elapsed
+        if estimate >= times:
+            return RateLimitResult(False, times, 0, reset_ms, reset_ms)
+
+        state.pending += 1
+        self._client = client
+        if state.pending >= self.flush_hits and (self._pending_flush is None or self._pending_flush.done()):
+            self._pending_flush = asyncio.create_task(self._flush_safely(client))
+        return RateLimitResult(True, times, max(0, int(times - estimate - 1)), reset_ms, 0)
+
+    @staticmethod
+    def _redis_key(key: str, window: int) -> str:
+        return f"{key}:{window}"
+
+    async def flush(self, client: Optional[redis.Redis] = None, now_ms: Optional[int] = None) -> None:
+        client = client or self._client
+        if client is None:
+            return
+
+        batch = [(key, window_ms, state, state.window, state.pending)
+                 for (key, window_ms), state in self._windows.items() if state.pending]
+        carry, self._carry = self._carry, []
+        if not batch and not carry:
+            return
+
+        for _, _, state, _, pending in batch:
+            state.pending -= pending
+
+        async with client.pipeline(transaction=False) as pipe:
+            for key, window_ms, window, pending in carry:
+                pipe.incrby(self._redis_key(key, window), pending)
+                pipe.pexpire(self._redis_key(key, window), window_ms * 2)
+            for key, window_ms, _, window, pending in batch:
+                pipe.incrby(self._redis_key(key, window), pending)
+                pipe.pexpire(self._redis_key(key, window), window_ms * 2)
+                pipe.get(self._redis_key(key, window - 1))
+            results = await pipe.execute()
+
+        synced = results[len(carry) * 2:]
+        for i, (_, _, state, window, _) in enumerate(batch):
+            # Пока шел запрос, окно могло смениться: тогда ответ уже про прошлое окно
+            if state.window == window:
+                state.synced = max(state.synced, int(synced[i * 3]))
+                state.previous = max(state.previous, int(synced[i * 3 + 2] or 0))
+            elif state.window == window + 1:
+                state.previous = max(state.previous, int(synced[i * 3]))
+
+        self._forget_idle(now_ms or int(time.time() * 1000))
+
+    def _forget_idle(self, now_ms: int) -> None:
+        idle = [key for key, state in self._windows.items()
+                if not state.pending and state.window < now_ms // key[1] - 1]
+        for key in idle:
+            del self._windows[key]
+
+    async def _flush_safely(self, client: Optional[redis.Redis] = None) -> None:
+        try:
+            await self.flush(client)
+        except Exception as exc:
+            logger.warning(f"Не удалось отправить счетчики лимитера в Redis: {exc}")
+
+    def start(self, client: redis.Redis) -> None:
+        self._client = client
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._flush_safely()
+
+    async def _flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval_ms / 1000)
+            await self._flush_safely()
+
+
+local_rate_limits = LocalRateLimits(flush_interval_ms=settings.RATE_LIMIT_FLUSH_INTERVAL_MS,
+                                    flush_hits=settings.RATE_LIMIT_FLUSH_HITS)
+
+
 class RateLimiter:
-    def __init__(self, times: int, seconds: int):
+    def __init__(self, times: int, seconds: int, strategy: Optional[str] = None, mode: Optional[str] = None):
         self.times = times
         self.seconds = seconds
+        self.strategy = STRATEGIES[strategy or settings.RATE_LIMIT_STRATEGY]
+        self.approximate = (mode or settings.RATE_LIMIT_MODE) == "approximate"
+        self._rejected = metrics.RATE_LIMIT_REJECTED.labels("approximate" if self.approximate else self.strategy.name)
+
+    def key(self, request: Request) -> str:
+        if self.approximate:
+            return f"rate_limit:{request.client.host}:{request.scope['path']}"
+        return f"rate_limit:{self.strategy.name}:{request.client.host}:{request.scope['path']}"
+
+    async def check(self, r: redis.Redis, key: str) -> RateLimitResult:
+        if self.approximate:
+            return local_rate_limits.hit(r, key, self.times, self.seconds)
+        return await self.strategy.hit(r, key, self.times, self.seconds)
+
+    def reject(self, result: RateLimitResult) -> None:
+        self._rejected.inc()
+        raise TooManyRequestsError(message=f"Превышен лимит запросов: {self.times} за {self.seconds} сек.",
+                                   headers=rate_limit_headers(result))
 
     async def __call__(self,
                        request: Request,
+                       response: Response,
                        r: redis.Redis=Depends(get_redis_client)
                        ):
-        key = f"rate_limit:{request.client.host}:{request.scope['path']}"
+        result = await self.check(r, self.key(request))
+        if not result.allowed:
+            self.reject(result)
+        response.headers.update(rate_limit_headers(result))
+
+
+class PipelinedLimit(NamedTuple):
+    """Проверка лимита, которую выполняет чужой pipeline (см. RedisCacheService.auth_lookup)."""
+
+    limiter: RateLimiter
+    key: str
+
+    def queue(self, pipe) -> None:
+        self.limiter.strategy.queue(pipe, self.key, self.limiter.times, self.limiter.seconds)
 
-        count = await r.eval(LUA_LIMITER, 1, key, self.seconds)
+    def parse(self, raw: list) -> RateLimitResult:
+        return self.limiter.strategy.parse(raw, self.limiter.times)
 
-        if count > self.times:
-            raise TooManyRequestsError(message=f"Превышен лимит запросов: {self.times} за {self.seconds} сек.")
+    async def run(self, client: redis.Redis) -> RateLimitResult:
+        return await self.limiter.strategy.hit(client, self.key, self.limiter.times, self.limiter.seconds)
@@ -0,0 +1,27 @@
+import hashlib
+from typing import Sequence
+
+import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+
+
+class LuaScript:
+    """Lua-скрипт, который вызывается через EVALSHA по заранее посчитанному SHA1.
+
+    Тело скрипта передается в Redis только через SCRIPT LOAD: при старте
+    приложения или один раз после NOSCRIPT (рестарт Redis, SCRIPT FLUSH, failover).
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+    async def load(self, client: redis.Redis) -> None:
+        await client.script_load(self.source)
+
+    async def __call__(self, client: redis.Redis, keys: Sequence[str], args: Sequence) -> list:
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            await self.load(client)
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
@@ -0,0 +1,75 @@
+import os
+from typing import Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# С PROMETHEUS_MULTIPROC_DIR каждый воркер uvicorn пишет значения в mmap-файлы,
+# а /metrics собирает их по всем воркерам (см. render_latest).
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Для запросов к API и к Redis: от сотен микросекунд до секунд
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def mark_process_dead(pid: int) -> None:
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid)
+
+def snapshot() -> dict:
+    """Значения метрик текущего воркера в JSON (для /stats)."""
+    result = {}
+    for family in REGISTRY.collect():
+        for sample in family.samples:
+            if sample.name.endswith("_created"):
+                continue
+            labels = ":".join(sample.labels.values())
+            result.setdefault(sample.name, {})[labels] = sample.value
+    return result
+
+
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Время обработки запроса по роутам",
+                                 ("method", "route", "status"), buckets=LATENCY_BUCKETS)
+HTTP_REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "Запросы, которые сейчас обрабатываются",
+                                ("method", "route"), multiprocess_mode="livesum")
+
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Соединения пула SQLAlchemy, выданные сессиям",
+                            ("pool",), multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Соединения сверх pool_size", ("pool",), multiprocess_mode="livesum")
+DB_POOL_WAIT_SECONDS = Histogram("db_pool_wait_seconds", "Ожидание соединения из пула SQLAlchemy",
+                                 ("pool",), buckets=LATENCY_BUCKETS)
+DB_POOL_LIMIT = Gauge("db_pool_limit", "Размер пула воркера: постоянные соединения и overflow",
+                      ("pool", "kind"), multiprocess_mode="livesum")
+DB_READS = Counter("db_reads_total", "Сессии для чтения: на реплику или на primary", ("target",))
+DB_REPLICA_LAG_SECONDS = Gauge("db_replica_lag_seconds", "Отставание реплики по последней проверке",
+                               ("replica",), multiprocess_mode="max")
+
+REDIS_COMMAND_SECONDS = Histogram("redis_command_duration_seconds", "Время команд Redis (pipeline считается одной)",
+                                  ("command",), buckets=LATENCY_BUCKETS)
+
+PASSWORD_HASH_SECONDS = Histogram("password_hash_seconds",
+                                  "Время хеширования/проверки пароля вместе с ожиданием в очереди",
+                                  ("operation",))
+PASSWORD_HASH_IN_FLIGHT = Gauge("password_hash_in_flight", "Задачи bcrypt в пуле (выполняются и ждут)",
+                                multiprocess_mode="livesum")
+PASSWORD_HASH_QUEUE_DEPTH = Gauge("password_hash_queue_depth", "Задачи bcrypt, ожидающие свободного воркера",
+                                  multiprocess_mode="livesum")
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected_total", "Отказы 503 из-за переполненной очереди bcrypt")
+
+USER_CACHE_HITS = Counter("user_cache_hits_total", "Попадания в кэш пользователей", ("key_type", "tier"))
+USER_CACHE_MISSES = Counter("user_cache_misses_total", "Промахи кэша пользователей", ("key_type", "tier"))
+USER_CACHE_LOCK_WAITS = Counter("user_cache_lock_waits_total", "Загрузки, дождавшиеся пользователя от другого воркера")
+
+SINGLEFLIGHT_COALESCED = Counter("singleflight_coalesced_total", "Запросы, получившие результат чужой загрузки", ("loader",))
+
+AUTH_TOKEN_CACHE = Counter("auth_token_cache_total", "Проверки токена через локальный кэш", ("result",))
+REVOCATION_CHECKS = Counter("revocation_checks_total", "Проверки отзыва токена: ответ Bloom-фильтра или запрос в Redis", ("source",))
+
+RATE_LIMIT_REJECTED = Counter("rate_limit_rejected_total", "Запросы, отклоненные лимитером", ("strategy",))
@@ -0,0 +1,105 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional["QueryStats"]] = ContextVar("query_stats", default=None)
+
+
+def redact(parameters: Any) -> Any:
+    """Оставляет от параметров запроса только форму: имена и типы, без значений."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        if parameters and isinstance(parameters[0], (dict, list, tuple)):
+            return f"<{len(parameters)} rows>"
+        return [type(value).__name__ for value in parameters]
+    return parameters
+
+
+class QueryStats:
+    """Счетчики обращений к БД в рамках одного запроса (или блока в тесте).
+
+    round_trips — все обращения к серверу: выражения плюс BEGIN/COMMIT/ROLLBACK.
+    Вложенный сборщик передает все записи и во внешний.
+    """
+
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.statements = 0
+        self.transactions = 0
+        self.seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_statement: Optional[str] = None
+        self.slowest_parameters: Any = None
+
+    @property
+    def round_trips(self) -> int:
+        return self.statements + self.transactions
+
+    def record_statement(self, statement: str, parameters: Any, seconds: float) -> None:
+        self.statements += 1
+        self.seconds += seconds
+        if seconds > self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+            self.slowest_parameters = redact(parameters)
+        if self.parent is not None:
+            self.parent.record_statement(statement, parameters, seconds)
+
+    def record_transaction(self) -> None:
+        self.transactions += 1
+        if self.parent is not None:
+            self.parent.record_transaction()
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.seconds * 1000:.1f};desc="{self.round_trips} round trips"'
+
+
+@contextmanager
+def collect_queries() -> Iterator[QueryStats]:
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Время старта живет в контексте выражения: если выражение упадет, оно уйдет вместе
+    # с контекстом, а не останется в conn.info пулового соединения
+    context._query_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._query_started
+
+    stats = _current.get()
+    if stats is not None:
+        stats.record_statement(statement, parameters, seconds)
+
+    if seconds * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning(f"Медленный запрос {seconds * 1000:.1f} мс: {statement} параметры={redact(parameters)}")
+
+
+@event.listens_for(Engine, "begin")
+@event.listens_for(Engine, "commit")
+@event.listens_for(Engine, "rollback")
+def _on_transaction(conn):
+    # В AUTOCOMMIT SQLAlchemy шлет события, но BEGIN/COMMIT на сервер не уходят
+    if conn.get_execution_options().get("isolation_level") == "AUTOCOMMIT":
+        return
+    stats = _current.get()
+    if stats is not None:
+        stats.record_transaction()
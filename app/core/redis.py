@@ -1,10 +1,49 @@
+import time
+from typing import Dict
+
 import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
 
 from fastapi import Depends, Request
+from app.core import metrics
 from app.core.redis_service import RedisCacheService
+from app.core.local_cache import user_local_cache
+
+_COMMAND_TIMERS: Dict[str, object] = {}
+
+def _command_timer(command) -> object:
+    timer = _COMMAND_TIMERS.get(command)
+    if timer is None:
+        name = command.decode() if isinstance(command, bytes) else str(command)
+        timer = _COMMAND_TIMERS[command] = metrics.REDIS_COMMAND_SECONDS.labels(name.upper())
+    return timer
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            _command_timer("PIPELINE").observe(time.perf_counter() - started)
+
+
+class InstrumentedRedis(redis.Redis):
+    """redis.Redis с гистограммой времени команд; pipeline замеряется целиком, одним round trip."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            _command_timer(args[0]).observe(time.perf_counter() - started)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
 
 async def get_redis_client(request: Request) -> redis.Redis:
     return request.app.state.redis_client
 
 async def get_redis_service(client: redis.Redis = Depends(get_redis_client)) -> RedisCacheService:
-    return RedisCacheService(client)
+    return RedisCacheService(client, local_cache=user_local_cache)
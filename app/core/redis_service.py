@@ -1,12 +1,69 @@
+import asyncio
 import json
-from typing import Optional, Any
+import secrets
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional, Tuple, Any
 import redis.asyncio as redis
+from redis.exceptions import NoScriptError
+
+from app.core import metrics
+from app.core.codecs import VersionedCodec
+from app.core.config import settings
+from app.core.lua import LuaScript
+from app.core.local_cache import LocalTTLCache
+from app.core.security.tokens import TOKEN_REVOCATION_CHANNEL, token_digest
+from app.schemas.user import USER_CACHE_SCHEMA_VERSION
+
+USER_INVALIDATION_CHANNEL = "invalidate:user"
+
+RELEASE_LOCK = LuaScript("""
+if redis.call("GET", KEYS[1]) == ARGV[1] then
+    return redis.call("DEL", KEYS[1])
+end
+return 0
+""")
+
+class _CacheCounters(NamedTuple):
+    local_hits: Any
+    local_misses: Any
+    redis_hits: Any
+    redis_misses: Any
+
+    @classmethod
+    def for_key_type(cls, key_type: str) -> "_CacheCounters":
+        return cls(metrics.USER_CACHE_HITS.labels(key_type, "local"),
+                   metrics.USER_CACHE_MISSES.labels(key_type, "local"),
+                   metrics.USER_CACHE_HITS.labels(key_type, "redis"),
+                   metrics.USER_CACHE_MISSES.labels(key_type, "redis"))
+
+
+_BY_ID = _CacheCounters.for_key_type("id")
+_BY_USERNAME = _CacheCounters.for_key_type("username")
+
+def _counters(user_id) -> _CacheCounters:
+    # Ключи по username приходят уже с префиксом: get_user("user:ivan")
+    return _BY_ID if isinstance(user_id, int) else _BY_USERNAME
+
+# Версия записи лежит в заголовке: ETag для ответа из кэша берется без разбора JSON
+user_cache_codec = VersionedCodec(settings.CACHE_CODEC, USER_CACHE_SCHEMA_VERSION, record_version_field="version")
+
+
+class AuthLookup(NamedTuple):
+    blacklisted: bool
+    user: Optional[dict]
+    rate_limit: Any
 
 class RedisCacheService:
-    def __init__(self, client: redis.Redis):
+    def __init__(self,
+                 client: redis.Redis,
+                 local_cache: Optional[LocalTTLCache] = None,
+                 codec: VersionedCodec = user_cache_codec):
         self.client = client
+        self.local_cache = local_cache
+        self.codec = codec
         self._PREFIX_USER = "user"
         self._PREFIX_BLACKLIST = "blacklist"
+        self._PREFIX_LOCK = "lock"
+        self._PREFIX_WRITTEN = "written"
 
     def _get_user_key(self, user_id: int) -> str:
         return f"{self._PREFIX_USER}:{user_id}"
@@ -14,22 +71,240 @@ class RedisCacheService:
     def _get_blacklist_key(self, token: str) -> str:
         return f"{self._PREFIX_BLACKLIST}:{token}"
 
-    async def get_user(self, user_id: int) -> Optional[dict]:
+    def _get_lock_key(self, user_id: int) -> str:
+        return f"{self._PREFIX_LOCK}:{self._get_user_key(user_id)}"
+
+    def _get_local_payload(self, key: str, counters: _CacheCounters) -> Optional[bytes]:
+        if self.local_cache is None:
+            return None
+        data = self.local_cache.get(key)
+        if data is not None:
+            counters.local_hits.inc()
+            return data
+        counters.local_misses.inc()
+        return None
+
+    def _accept_remote_payload(self, key: str, data: Optional[bytes], counters: _CacheCounters) -> Optional[bytes]:
+        if not self.codec.accepts(data):
+            counters.redis_misses.inc()
+            return None
+
+        counters.redis_hits.inc()
+        if self.local_cache is not None:
+            self.local_cache.set(key, data)
+        return data
+
+    async def _get_user_payload(self, user_id) -> Optional[bytes]:
         key = self._get_user_key(user_id)
-        data = await self.client.get(key)
-        return json.loads(data) if data else None
+        counters = _counters(user_id)
+        data = self._get_local_payload(key, counters)
+        if data is not None:
+            return data
+        return self._accept_remote_payload(key, await self.client.get(key), counters)
+
+    async def get_user(self, user_id: int) -> Optional[dict]:
+        data = await self._get_user_payload(user_id)
+        return self.codec.decode(data)
+
+    async def get_user_json(self, user_id: int) -> Optional[Tuple[bytes, int]]:
+        """Тело пользователя в JSON и версия записи (для ETag) или None при промахе."""
+        data = await self._get_user_payload(user_id)
+        body = self.codec.decode_json(data)
+        if body is None:
+            return None
+        return body, self.codec.record_version(data)
 
     async def set_user(self, user_id: int, user_data: dict, expire: int = 3600):
         key = self._get_user_key(user_id)
-        await self.client.setex(key, expire, json.dumps(user_data))
+        data = self.codec.encode(user_data)
+        await self.client.setex(key, expire, data)
+        if self.local_cache is not None:
+            self.local_cache.set(key, data)
+
+    async def get_users(self, user_ids: List[int]) -> Dict[int, dict]:
+        found: Dict[int, dict] = {}
+        remote_ids = []
+        for user_id in user_ids:
+            data = self.local_cache.get(self._get_user_key(user_id)) if self.local_cache is not None else None
+            if data is not None:
+                _BY_ID.local_hits.inc()
+                found[user_id] = self.codec.decode(data)
+            else:
+                remote_ids.append(user_id)
+
+        if self.local_cache is not None:
+            _BY_ID.local_misses.inc(len(remote_ids))
+        if not remote_ids:
+            return found
+
+        values = await self.client.mget([self._get_user_key(user_id) for user_id in remote_ids])
+        for user_id, data in zip(remote_ids, values):
+            if not self.codec.accepts(data):
+                _BY_ID.redis_misses.inc()
+                continue
+            _BY_ID.redis_hits.inc()
+            if self.local_cache is not None:
+                self.local_cache.set(self._get_user_key(user_id), data)
+            found[user_id] = self.codec.decode(data)
+        return found
+
+    async def set_users(self, users: Dict[int, dict], expire: int = 3600):
+        if not users:
+            return
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, user_data in users.items():
+                key = self._get_user_key(user_id)
+                data = self.codec.encode(user_data)
+                pipe.setex(key, expire, data)
+                if self.local_cache is not None:
+                    self.local_cache.set(key, data)
+            await pipe.execute()
+
+    async def acquire_user_lock(self, user_id: int, ttl_ms: int) -> Optional[str]:
+        token = secrets.token_hex(8)
+        if await self.client.set(self._get_lock_key(user_id), token, nx=True, px=ttl_ms):
+            return token
+        return None
+
+    async def release_user_lock(self, user_id: int, token: str):
+        await RELEASE_LOCK(self.client, [self._get_lock_key(user_id)], [token])
+
+    async def wait_for_user(self, user_id: int, timeout_ms: int, poll_ms: int) -> Optional[dict]:
+        """Ждет, пока держатель лока положит пользователя в кэш.
+
+        None — если лок отпущен, а кэша нет (404, пользователь не для кэша, ошибка
+        загрузки) или вышел timeout_ms: тогда вызывающий грузит из БД сам.
+        """
+        key = self._get_user_key(user_id)
+        counters = _counters(user_id)
+        for _ in range(max(1, timeout_ms // poll_ms)):
+            await asyncio.sleep(poll_ms / 1000)
+            data = self._get_local_payload(key, counters)
+            if data is not None:
+                return self.codec.decode(data)
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.get(key)
+                pipe.exists(self._get_lock_key(user_id))
+                data, locked = await pipe.execute()
+            data = self._accept_remote_payload(key, data, counters)
+            if data is not None:
+                return self.codec.decode(data)
+            if not locked:
+                return None
+        return None
 
     async def delete_user(self, user_id: int):
-        await self.client.delete(self._get_user_key(user_id))
+        await self._invalidate([self._get_user_key(user_id)])
+
+    def _user_keys(self, user_id: int, usernames) -> list[str]:
+        keys = [self._get_user_key(user_id)]
+        keys.extend(self._get_user_key(f"{self._PREFIX_USER}:{username}") for username in usernames if username)
+        return keys
+
+    def _get_written_key(self, user_key: str) -> str:
+        return f"{self._PREFIX_WRITTEN}:{user_key}"
+
+    async def invalidate_user(self, user_id: int, *usernames: Optional[str], written_ttl: Optional[float] = None):
+        """Сбрасывает кэш пользователя; с written_ttl заодно открывает окно read-your-writes."""
+        await self._invalidate(self._user_keys(user_id, usernames), written_ttl)
+
+    async def invalidate_users(self, users: Iterable[Tuple[int, str]], written_ttl: Optional[float] = None):
+        """Сбрасывает кэш многих пользователей (пары id, username) одним DEL в одном pipeline."""
+        keys = [key for user_id, username in users for key in self._user_keys(user_id, (username,))]
+        if keys:
+            await self._invalidate(keys, written_ttl)
+
+    async def mark_written(self, users: Iterable[Tuple[int, str]], ttl: float):
+        """Открывает окно read-your-writes для новых пользователей (пары id, username)."""
+        async with self.client.pipeline(transaction=False) as pipe:
+            for user_id, username in users:
+                for key in self._user_keys(user_id, (username,)):
+                    pipe.set(self._get_written_key(key), "1", px=int(ttl * 1000))
+            await pipe.execute()
+
+    async def recently_written(self, *user_ids) -> bool:
+        """Была ли запись кого-то из пользователей (id или "user:{username}") в окне read-your-writes."""
+        keys = [self._get_written_key(self._get_user_key(user_id)) for user_id in user_ids]
+        return bool(await self.client.exists(*keys))
+
+    async def _invalidate(self, keys: list[str], written_ttl: Optional[float] = None):
+        if self.local_cache is not None:
+            self.local_cache.delete(*keys)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.delete(*keys)
+            if written_ttl:
+                for key in keys:
+                    pipe.set(self._get_written_key(key), "1", px=int(written_ttl * 1000))
+            pipe.publish(USER_INVALIDATION_CHANNEL, json.dumps(keys))
+            await pipe.execute()
+
+    async def blacklist_token(self, revocation_id: str, digest: str, expire: int):
+        key = self._get_blacklist_key(revocation_id)
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.setex(key, expire, "1")
+            pipe.publish(TOKEN_REVOCATION_CHANNEL, f"{digest} {revocation_id}")
+            await pipe.execute()
+
+    async def is_token_blacklisted(self, revocation_id: str, legacy_token: Optional[str] = None) -> bool:
+        keys = [self._get_blacklist_key(revocation_id)]
+        if legacy_token:
+            # Старый формат записей, с полным JWT в ключе; живут до часа после выкладки
+            keys.append(self._get_blacklist_key(legacy_token))
+        return await self.client.exists(*keys) > 0
+
+    async def auth_lookup(self, user_id, revocation_id: Optional[str] = None,
+                          legacy_token: Optional[str] = None, rate_limit=None) -> AuthLookup:
+        """Черный список, кэш пользователя и лимит запроса за один round trip.
+
+        В pipeline попадает только то, на что нет локального ответа: проверка отзыва
+        (revocation_id=None, если Bloom-фильтр уже ответил), GET пользователя при
+        промахе локального кэша и EVALSHA лимитера (rate_limit — PipelinedLimit).
+        """
+        key = self._get_user_key(user_id)
+        counters = _counters(user_id)
+        payload = self._get_local_payload(key, counters)
+
+        if revocation_id is None and payload is not None and rate_limit is None:
+            return AuthLookup(False, self.codec.decode(payload), None)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            if revocation_id is not None:
+                keys = [self._get_blacklist_key(revocation_id)]
+                if legacy_token:
+                    keys.append(self._get_blacklist_key(legacy_token))
+                pipe.exists(*keys)
+            if payload is None:
+                pipe.get(key)
+            if rate_limit is not None:
+                rate_limit.queue(pipe)
+            results = await pipe.execute(raise_on_error=False)
+
+        limit_result = None
+        if rate_limit is not None:
+            raw = results.pop()
+            if isinstance(raw, NoScriptError):
+                limit_result = await rate_limit.run(self.client)
+            elif not isinstance(raw, Exception):
+                limit_result = rate_limit.parse(raw)
+            else:
+                raise raw
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+        blacklisted = revocation_id is not None and results[0] > 0
+        if payload is None:
+            payload = self._accept_remote_payload(key, results[-1], counters)
+
+        return AuthLookup(blacklisted, self.codec.decode(payload), limit_result)
 
-    async def blacklist_token(self, token: str, expire: int = 3600):
-        key = self._get_blacklist_key(token)
-        await self.client.setex(key, expire, "true")
+    async def scan_revoked_tokens(self) -> AsyncIterator[str]:
+        prefix = f"{self._PREFIX_BLACKLIST}:"
+        async for key in self.client.scan_iter(match=f"{prefix}*", count=1000):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            revocation_id = key[len(prefix):]
+            yield token_digest(revocation_id) if "." in revocation_id else revocation_id
 
-    async def is_token_blacklisted(self, token: str) -> bool:
-        key = self._get_blacklist_key(token)
-        return await self.client.exists(key) > 0
+def evict_local_users(local_cache: LocalTTLCache, message: str) -> None:
+    local_cache.delete(*json.loads(message))
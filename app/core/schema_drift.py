@@ -0,0 +1,98 @@
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import Index, MetaData, inspect
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+logger = logging.getLogger(__name__)
+
+
+class IndexShape(NamedTuple):
+    columns: Tuple[str, ...]
+    unique: bool
+    include: Tuple[str, ...]
+    where: Optional[str]
+
+    def __str__(self) -> str:
+        text = f"{'UNIQUE ' if self.unique else ''}({', '.join(self.columns)})"
+        if self.include:
+            text += f" INCLUDE ({', '.join(self.include)})"
+        if self.where:
+            text += f" WHERE {self.where}"
+        return text
+
+
+def _normalize_where(where) -> Optional[str]:
+    # Postgres возвращает условие в своей записи: "(is_deleted = false)" вместо "is_deleted = false"
+    if where is None:
+        return None
+    return re.sub(r"[()\s]+", " ", str(where)).strip().lower() or None
+
+
+def _model_shape(index: Index) -> IndexShape:
+    options = index.dialect_options["postgresql"]
+    return IndexShape(
+        columns=tuple(column.name for column in index.columns),
+        unique=bool(index.unique),
+        include=tuple(getattr(column, "name", column) for column in options["include"] or ()),
+        where=_normalize_where(options["where"]),
+    )
+
+
+def _live_shape(index: dict) -> IndexShape:
+    options = index.get("dialect_options", {})
+    return IndexShape(
+        columns=tuple(index["column_names"]),
+        unique=bool(index["unique"]),
+        include=tuple(index.get("include_columns") or ()),
+        where=_normalize_where(options.get("postgresql_where")),
+    )
+
+
+def index_drift(connection: Connection, metadata: Optional[MetaData] = None) -> List[str]:
+    """Расхождения индексов таблиц модели с живой схемой; пустой список, если все совпадает.
+
+    Сравниваются имя, колонки, уникальность, INCLUDE и условие частичного индекса.
+    Индекс первичного ключа не сравнивается. Вызывать через AsyncConnection.run_sync.
+    """
+    if metadata is None:
+        from app.core.database import Base
+        metadata = Base.metadata
+
+    inspector = inspect(connection)
+    problems = []
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name, schema=table.schema):
+            problems.append(f"{table.name}: таблицы нет в БД")
+            continue
+
+        expected: Dict[str, IndexShape] = {index.name: _model_shape(index) for index in table.indexes}
+        actual: Dict[str, IndexShape] = {index["name"]: _live_shape(index)
+                                         for index in inspector.get_indexes(table.name, schema=table.schema)}
+
+        for name in sorted(expected.keys() - actual.keys()):
+            problems.append(f"{table.name}.{name}: нет в БД, ожидается {expected[name]}")
+        for name in sorted(actual.keys() - expected.keys()):
+            problems.append(f"{table.name}.{name}: нет в модели, в БД {actual[name]}")
+        for name in sorted(expected.keys() & actual.keys()):
+            if expected[name] != actual[name]:
+                problems.append(f"{table.name}.{name}: в модели {expected[name]}, в БД {actual[name]}")
+    return problems
+
+
+async def check_indexes(engine: AsyncEngine, mode: str) -> List[str]:
+    """Проверка при старте: mode "warn" пишет расхождения в лог, "fail" не дает приложению запуститься."""
+    if mode == "off":
+        return []
+
+    async with engine.connect() as conn:
+        problems = await conn.run_sync(index_drift)
+
+    if problems:
+        message = "Индексы в БД расходятся с моделью (миграции не применены?): " + "; ".join(problems)
+        if mode == "fail":
+            raise RuntimeError(message)
+        logger.warning(message)
+    return problems
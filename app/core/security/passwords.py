@@ -1,5 +1,14 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Optional
+
 import bcrypt
 
+from app.core import metrics
+from app.core.config import settings
+from app.core.exceptions import ServiceOverloadedError
+
 def hash_password(password) -> str:
     pwd_bytes = password.encode("utf-8")
     salt = bcrypt.gensalt()
@@ -9,4 +18,74 @@ def hash_password(password) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_bytes = plain_password.encode("utf-8")
     hashed_bytes = hashed_password.encode("utf-8")
-    return bcrypt.checkpw(password_bytes, hashed_bytes)
+    return bcrypt.checkpw(password_bytes, hashed_bytes)
+
+
+class PasswordHasher:
+    """Выносит bcrypt из event loop в пул воркеров с ограниченной очередью.
+
+    Если в пуле уже max_workers + max_queue задач, новая сразу получает 503,
+    так что всплеск логинов не копит бесконечную очередь и не трогает остальные роуты.
+    """
+
+    def __init__(self, max_workers: int, max_queue: int, use_processes: bool = False):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.use_processes = use_processes
+        self._executor: Optional[Executor] = None
+        self._in_flight = 0
+
+    def start(self) -> None:
+        if self._executor is None:
+            executor_class = ProcessPoolExecutor if self.use_processes else ThreadPoolExecutor
+            self._executor = executor_class(max_workers=self.max_workers)
+
+    async def shutdown(self) -> None:
+        # Ждем текущие задачи в отдельном потоке: event loop тем временем закрывает остальное
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.to_thread(executor.shutdown, True, cancel_futures=True)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._in_flight - self.max_workers)
+
+    def _track(self, delta: int) -> None:
+        self._in_flight += delta
+        metrics.PASSWORD_HASH_IN_FLIGHT.set(self._in_flight)
+        metrics.PASSWORD_HASH_QUEUE_DEPTH.set(self.queue_depth)
+
+    async def _run(self, func, *args):
+        if self._in_flight >= self.max_workers + self.max_queue:
+            metrics.PASSWORD_HASH_REJECTED.inc()
+            raise ServiceOverloadedError()
+
+        self.start()
+        self._track(1)
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self._track(-1)
+            metrics.PASSWORD_HASH_SECONDS.labels(func.__name__).observe(time.perf_counter() - started)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash_many(self, passwords: List[str]) -> List[str]:
+        # Не больше max_workers задач за раз: пачка не забивает очередь, в ней остается место логинам
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def hash_one(password: str) -> str:
+            async with limit:
+                return await self.hash(password)
+
+        return await asyncio.gather(*(hash_one(password) for password in passwords))
+
+
+password_hasher = PasswordHasher(max_workers=settings.PASSWORD_HASH_WORKERS,
+                                 max_queue=settings.PASSWORD_HASH_QUEUE_SIZE,
+                                 use_processes=settings.PASSWORD_HASH_EXECUTOR == "process")
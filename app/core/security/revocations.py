@@ -0,0 +1,116 @@
+import asyncio
+import hashlib
+import logging
+import math
+from typing import List, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.security.tokens import verified_tokens
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationFilter:
+    """Bloom-фильтр отозванных токенов воркера, синхронизируемый с Redis.
+
+    Отрицательный ответ фильтра достоверен, поэтому проверка в Redis нужна только
+    при положительном. Пока фильтр не загружен из Redis или подписка на отзывы
+    оборвана, он отвечает "возможно отозван" и все проверки идут в Redis.
+    Ключи в Redis истекают вместе с токенами, а из Bloom-фильтра удалить нельзя,
+    поэтому он периодически перестраивается заново через SCAN.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.synced = False
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._pending: Optional[List[str]] = None
+        # Загрузку зовут и периодическая перестройка, и переподключение подписки;
+        # одновременно идет только одна, иначе они делят и теряют _pending
+        self._load_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+
+    def add(self, revocation_id: str) -> None:
+        self._bloom.add(revocation_id)
+        if self._pending is not None:
+            self._pending.append(revocation_id)
+
+    def might_be_revoked(self, revocation_id: str) -> bool:
+        if not self.synced or revocation_id in self._bloom:
+            _FILTER_REMOTE.inc()
+            return True
+        _FILTER_LOCAL.inc()
+        return False
+
+    def invalidate(self) -> None:
+        self.synced = False
+
+    async def load(self, cache_service) -> None:
+        async with self._load_lock:
+            self._pending = []
+            try:
+                bloom = BloomFilter(self.capacity, self.error_rate)
+                async for revocation_id in cache_service.scan_revoked_tokens():
+                    bloom.add(revocation_id)
+                for revocation_id in self._pending:
+                    bloom.add(revocation_id)
+                self._bloom = bloom
+                self.synced = True
+            finally:
+                self._pending = None
+
+    def start_rebuilds(self, cache_service, interval: float) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._rebuild_forever(cache_service, interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _rebuild_forever(self, cache_service, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.load(cache_service)
+            except Exception as exc:
+                logger.warning(f"Не удалось перестроить фильтр отозванных токенов: {exc}")
+
+
+_FILTER_LOCAL = metrics.REVOCATION_CHECKS.labels("local")
+_FILTER_REMOTE = metrics.REVOCATION_CHECKS.labels("redis")
+
+revoked_tokens = RevocationFilter(capacity=settings.REVOCATION_FILTER_CAPACITY,
+                                  error_rate=settings.REVOCATION_FILTER_ERROR_RATE)
+
+def handle_token_revocation(message: str) -> None:
+    digest, revocation_id = message.split(" ", 1)
+    verified_tokens.delete(digest)
+    revoked_tokens.add(revocation_id)
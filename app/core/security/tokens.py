@@ -1,18 +1,37 @@
+import hashlib
+import secrets
 from datetime import datetime, timedelta
 from app.core.config import settings
 from jose import jwt, JWTError
 
 from app.core.exceptions import WrongDataError
+from app.core.local_cache import LocalTTLCache
+
+TOKEN_REVOCATION_CHANNEL = "revoke:token"
+
+# Проверенные claims по дайджесту токена: повторные запросы с тем же токеном
+# не ходят в Redis за черным списком и не проверяют подпись заново.
+# Logout в любом воркере удаляет запись через TOKEN_REVOCATION_CHANNEL;
+# короткий TTL ограничивает окно, если сообщение о выходе потерялось.
+verified_tokens = LocalTTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
 
 
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": secrets.token_hex(8)})
     return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
 
-def decode_token(token: str) -> dict:
+def decode_token(token: str, verify_exp: bool = True) -> dict:
     try:
-        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM],
+                          options={"verify_exp": verify_exp})
     except JWTError:
-        return WrongDataError
+        raise WrongDataError("Некорректный токен")
+
+def token_digest(token: str) -> str:
+    return hashlib.blake2b(token.encode("utf-8"), digest_size=16).hexdigest()
+
+def revocation_id(payload: dict, digest: str) -> str:
+    # Токены, выданные до появления jti, отзываются по дайджесту
+    return payload.get("jti") or digest
@@ -0,0 +1,37 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from app.core import metrics
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Схлопывает одновременные загрузки одного ключа внутри воркера.
+
+    Первый вызов запускает loader отдельной задачей, остальные ждут ее же результат
+    (или исключение). Отмена одного из ожидающих запросов не отменяет загрузку для остальных.
+    """
+
+    def __init__(self, name: str):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._coalesced = metrics.SINGLEFLIGHT_COALESCED.labels(name)
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    async def do(self, key: Hashable, loader: Callable[[], Awaitable[T]]) -> T:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self._coalesced.inc()
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Future) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()
@@ -1,24 +1,62 @@
+import os
+
 import redis.asyncio as redis
 from contextlib import asynccontextmanager
 from app.api.users.router import router
 from app.api.monitoring import router as monitoring_router
 from app.api.handlers import app_error_handler
+from app.api.middleware import QueryStatsMiddleware
 from app.core.exceptions import AppErrors
+from app.core import metrics
 from app.core.config import settings
+from app.core.database import engine, replica_router
+from app.core.security.passwords import password_hasher
+from app.core.invalidation import InvalidationListener
+from app.core.limiter import load_scripts, local_rate_limits
+from app.core.local_cache import user_local_cache
+from app.core.redis import InstrumentedRedis
+from app.core.redis_service import USER_INVALIDATION_CHANNEL, RedisCacheService, evict_local_users
+from app.core.schema_drift import check_indexes
+from app.core.security.revocations import handle_token_revocation, revoked_tokens
+from app.core.security.tokens import TOKEN_REVOCATION_CHANNEL, verified_tokens
 
 from fastapi import FastAPI
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await check_indexes(engine, settings.DB_SCHEMA_CHECK)
+
     pool = redis.ConnectionPool.from_url(f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-                                         encoding="utf-8", decode_responses=True)
+                                         decode_responses=False)
 
-    app.state.redis_client = await redis.Redis(connection_pool=pool)
+    app.state.redis_client = await InstrumentedRedis(connection_pool=pool)
+    await load_scripts(app.state.redis_client)
+    if settings.RATE_LIMIT_MODE == "approximate":
+        local_rate_limits.start(app.state.redis_client)
+    password_hasher.start()
+
+    listener = InvalidationListener(app.state.redis_client)
+    listener.subscribe(USER_INVALIDATION_CHANNEL, lambda message: evict_local_users(user_local_cache, message))
+    listener.on_reset(user_local_cache.clear)
+    revocations_source = RedisCacheService(app.state.redis_client)
+    listener.subscribe(TOKEN_REVOCATION_CHANNEL, handle_token_revocation)
+    listener.on_reset(verified_tokens.clear)
+    listener.on_reset(lambda: revoked_tokens.load(revocations_source))
+    listener.on_disconnect(revoked_tokens.invalidate)
+    listener.start()
+    revoked_tokens.start_rebuilds(revocations_source, settings.REVOCATION_FILTER_REBUILD_SECONDS)
+    replica_router.start(settings.REPLICA_HEALTH_CHECK_SECONDS)
 
     yield
 
+    await replica_router.stop()
+    await local_rate_limits.stop()
+    await revoked_tokens.stop()
+    await listener.stop()
+    await password_hasher.shutdown()
     await app.state.redis_client.aclose()
     await pool.disconnect()
+    metrics.mark_process_dead(os.getpid())
 
 app = FastAPI(title="Test FastAPI",
               description="Test FastAPI",
@@ -32,6 +70,8 @@ app.include_router(monitoring_router)
 
 app.add_exception_handler(AppErrors, app_error_handler)
 
+app.add_middleware(QueryStatsMiddleware)
+
 @app.get("/")
 async def root():
     return {"Session": "Online"}
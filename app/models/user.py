@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, Column, Integer, DateTime, ForeignKey, func, Boolean, CheckConstraint
+from sqlalchemy import String, Column, Integer, DateTime, ForeignKey, func, Boolean, CheckConstraint, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from app.core.database import Base
 
@@ -8,17 +8,25 @@ class User(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
 
-    username: Mapped[str] = mapped_column(String(50), nullable=False, unique=True, index=True)
+    username: Mapped[str] = mapped_column(String(50), nullable=False)
     email: Mapped[str] = mapped_column(String(128), nullable=False, unique=True, index=True)
-    password: Mapped[str] = mapped_column(String(24), nullable=False)
+    password: Mapped[str] = mapped_column(String(255), nullable=False)
 
     is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, server_default="true")
     is_deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False, server_default="false")
 
     created_at: Mapped[datetime] = mapped_column(server_default=func.now(), index=True)
 
+    # Растет на каждом изменении: ETag пользователя и условие If-Match в PATCH
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default="1")
+
     __table_args__ = (
         CheckConstraint("NOT (is_active = true AND is_deleted = true) OR (is_active = false)",
                         name="check_user_active_deleted_logic"
                         ),
+        Index("ix_users_id_not_deleted", "id", postgresql_where=text("is_deleted = false")),
+        Index("ix_users_id_inactive", "id", postgresql_where=text("is_active = false")),
+        # Уникальность username и покрывающий индекс для логина: все, что читает логин, берется из индекса
+        Index("ix_users_username", "username", unique=True,
+              postgresql_include=["id", "password", "is_active", "is_deleted"]),
     )
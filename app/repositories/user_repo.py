@@ -1,13 +1,137 @@
-from sqlalchemy import select, or_
+from itertools import combinations
+
+from sqlalchemy import select, update, or_, any_, bindparam, text, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import IntegrityError
 
 from app.models.user import User
-from app.schemas.user import UserCreate
 
 from fastapi import Depends
 
-from typing import Optional, List
+from typing import AsyncIterator, Dict, Optional, List, Set, Tuple
+
+
+# Запросы собираются один раз при импорте, значения приходят через bindparam.
+# У готовой конструкции ключ кэша компиляции запомнен, поэтому на вызове SQLAlchemy
+# не строит select() и не обходит его заново, а SQL-строка (и prepared statement
+# asyncpg) одна на каждый вариант фильтров. Цена: python -m benchmarks.repo_statements
+def _list_filters(query, show_deleted: bool, show_active: bool):
+    if not show_deleted:
+        query = query.where(User.is_deleted == False)
+    if not show_active:
+        query = query.where(User.is_active == False)
+    return query
+
+_FLAGS = (False, True)
+
+_LIST_BY_OFFSET = {
+    (show_deleted, show_active): _list_filters(
+        select(User).limit(bindparam("limit", type_=Integer)).order_by(User.id)
+        .offset(bindparam("skip", type_=Integer)),
+        show_deleted, show_active)
+    for show_deleted in _FLAGS for show_active in _FLAGS
+}
+
+_LIST_AFTER_ID = {
+    (show_deleted, show_active): _list_filters(
+        select(User).limit(bindparam("limit", type_=Integer)).order_by(User.id)
+        .where(User.id > bindparam("after_id", type_=Integer)),
+        show_deleted, show_active)
+    for show_deleted in _FLAGS for show_active in _FLAGS
+}
+
+_STREAM_LIST = {
+    (show_deleted, show_active): _list_filters(select(User).order_by(User.id), show_deleted, show_active)
+    for show_deleted in _FLAGS for show_active in _FLAGS
+}
+
+_BY_ID = select(User).where(User.id == bindparam("user_id", type_=Integer))
+_BY_ID_DELETED = _BY_ID.where(User.is_deleted == True)
+_BY_ID_ACTIVE = _BY_ID.where(User.is_active == True)
+
+_BY_IDS = select(User).where(User.id == any_(bindparam("ids", type_=ARRAY(Integer))))
+
+_BY_USERNAME = select(User).where(User.username == bindparam("username", type_=String))
+
+# Только колонки из ix_users_username: логин читается index-only scan без захода в таблицу
+_LOGIN = select(User.id, User.username, User.password, User.is_active, User.is_deleted).where(
+    User.username == bindparam("username", type_=String)
+)
+
+_TAKEN_CREDENTIALS = select(User.username, User.email).where(
+    or_(User.username == any_(bindparam("usernames", type_=ARRAY(String))),
+        User.email == any_(bindparam("emails", type_=ARRAY(String))))
+)
+
+# Значения is_active/is_deleted явные: в схеме из миграций у is_active нет DEFAULT
+_CREATE = select(User).from_statement(text(
+    "INSERT INTO users (username, email, password, is_active, is_deleted) "
+    "VALUES (:username, :email, :password, true, false) "
+    "ON CONFLICT DO NOTHING "
+    "RETURNING *"
+))
+
+_UPDATABLE = ("username", "email", "is_active", "is_deleted")
+
+
+def _update_statement(fields: Tuple[str, ...]):
+    # old берет строку под блокировку и отдает username до изменения (нужен для сброса кэша),
+    # RETURNING — уже новые значения. Версия проверяется, только если передана (:version не NULL)
+    users = User.__table__
+    old = (select(users.c.id, users.c.username)
+           .where(users.c.id == bindparam("user_id", type_=Integer))
+           .with_for_update()
+           .cte("old"))
+    version = bindparam("version", type_=Integer)
+    return (
+        update(users)
+        .where(users.c.id == old.c.id, or_(version.is_(None), users.c.version == version))
+        .values({**{field: bindparam(field, type_=users.c[field].type) for field in fields},
+                 "version": users.c.version + 1})
+        .returning(*(column for column in users.c if column.name != "password"),
+                   old.c.username.label("old_username"))
+    )
+
+_UPDATE = {
+    fields: _update_statement(fields)
+    for count in range(1, len(_UPDATABLE) + 1) for fields in combinations(_UPDATABLE, count)
+}
+
+# Новые значения флагов и условие, без которого действие нарушило бы check_user_active_deleted_logic
+_STATUS_CHANGES = {
+    "activate": ({"is_active": True}, User.is_deleted == False),
+    "deactivate": ({"is_active": False}, None),
+    "soft_delete": ({"is_active": False, "is_deleted": True}, None),
+}
+
+
+def _status_statement(values: dict, allowed):
+    users = User.__table__
+    query = update(users).where(
+        users.c.id == any_(bindparam("ids", type_=ARRAY(Integer))),
+        # Строки, уже стоящие в нужном состоянии, не трогаем: ни версии, ни сброса кэша
+        or_(*(users.c[field] != value for field, value in values.items())),
+    )
+    if allowed is not None:
+        query = query.where(allowed)
+    return query.values({**values, "version": users.c.version + 1}).returning(users.c.id, users.c.username)
+
+_SET_STATUS = {action: _status_statement(values, allowed) for action, (values, allowed) in _STATUS_CHANGES.items()}
+
+_STATUS_BY_IDS = select(User.id, User.is_active, User.is_deleted).where(
+    User.id == any_(bindparam("ids", type_=ARRAY(Integer)))
+)
+
+_CREATE_IMPORT_TABLE = text("CREATE TEMP TABLE users_import "
+                            "(username varchar, email varchar, password varchar) ON COMMIT DROP")
+
+_INSERT_IMPORTED = text(
+    "INSERT INTO users (username, email, password, is_active, is_deleted) "
+    "SELECT username, email, password, true, false FROM users_import "
+    "ON CONFLICT DO NOTHING "
+    "RETURNING id, username"
+)
+
 
 class UserRepo:
     def __init__(self, db: AsyncSession):
@@ -17,77 +141,103 @@ class UserRepo:
                        skip: int = 0,
                        limit: int = 10,
                        show_deleted: bool = False,
-                       show_active: bool = True) -> List[User]:
-        query = select(User).offset(skip).limit(limit).order_by(User.id)
-
-        if not show_deleted:
-            query = query.where(User.is_deleted == False)
-        if not show_active:
-            query = query.where(User.is_active == False)
-
-        results = await self.db.execute(query)
+                       show_active: bool = True,
+                       after_id: Optional[int] = None) -> List[User]:
+        if after_id is not None:
+            query, params = _LIST_AFTER_ID[show_deleted, show_active], {"limit": limit, "after_id": after_id}
+        else:
+            query, params = _LIST_BY_OFFSET[show_deleted, show_active], {"limit": limit, "skip": skip}
+
+        results = await self.db.execute(query, params)
         return results.scalars().all()
 
+    async def stream_list(self,
+                          show_deleted: bool = False,
+                          show_active: bool = True,
+                          chunk_size: int = 1000) -> AsyncIterator[List[User]]:
+        results = await self.db.stream_scalars(_STREAM_LIST[show_deleted, show_active],
+                                               execution_options={"yield_per": chunk_size})
+        async for users in results.partitions():
+            yield users
+
     async def get_user_by_id(self,
                              user_id: int,
                              only_deleted: bool = False,
                              only_active: bool = False):
-        query = select(User).where(User.id == user_id)
-
         if only_deleted:
-            query = query.where(User.is_deleted == True)
+            query = _BY_ID_DELETED
         elif only_active:
-            query = query.where(User.is_active == True)
+            query = _BY_ID_ACTIVE
+        else:
+            query = _BY_ID
 
-        results = await self.db.execute(query)
+        results = await self.db.execute(query, {"user_id": user_id})
         return results.scalars().one_or_none()
 
-    async def check_existing_user(self, data: UserCreate):
-        query = select(User).where(or_(User.username == data.username,
-                                       User.email == data.email
-                                       )
-                                   )
-        results = await self.db.execute(query)
-        return results.scalars().first()
-
-    async def create_user(self, user_data: dict):
-        new_user = User(**user_data)
-        self.db.add(new_user)
-        try:
-            await self.db.flush()
-            await self.db.refresh(new_user)
-        except IntegrityError:
-            raise
-        return new_user
-
-    async def get_conflicting_users(self,
-                                    user_id: int,
-                                    email: str = None,
-                                    username: str = None):
-        filters = []
-        if email:
-            filters.append(User.email == email)
-        if username:
-            filters.append(User.username == username)
-
-        if not filters:
-            return None
-        query = select(User).where(or_(*filters), User.id != user_id)
-        results = await self.db.execute(query)
+    async def get_users_by_ids(self, user_ids: List[int]) -> List[User]:
+        results = await self.db.execute(_BY_IDS, {"ids": user_ids})
+        return results.scalars().all()
+
+    async def get_taken_credentials(self,
+                                    usernames: List[str],
+                                    emails: List[str]) -> Tuple[Set[str], Set[str]]:
+        results = await self.db.execute(_TAKEN_CREDENTIALS, {"usernames": usernames, "emails": emails})
+        taken_usernames, taken_emails = set(), set()
+        for username, email in results:
+            taken_usernames.add(username)
+            taken_emails.add(email)
+        return taken_usernames, taken_emails
+
+    async def import_users(self, rows: List[Tuple[str, str, str]]) -> Dict[str, int]:
+        """Грузит (username, email, password) через COPY во временную таблицу и переносит в users одним INSERT.
+
+        Возвращает id созданных записей по username; строки, упершиеся в уникальность, пропускаются.
+        """
+        await self.db.execute(_CREATE_IMPORT_TABLE)
+        connection = await self.db.connection()
+        raw_connection = await connection.get_raw_connection()
+        await raw_connection.driver_connection.copy_records_to_table(
+            "users_import", records=rows, columns=["username", "email", "password"]
+        )
+
+        results = await self.db.execute(_INSERT_IMPORTED)
+        return {username: user_id for user_id, username in results}
+
+    async def create_user(self, username: str, email: str, password: str) -> Optional[User]:
+        """Создает пользователя одним INSERT; None, если username или email уже заняты."""
+        results = await self.db.execute(_CREATE, {"username": username, "email": email, "password": password})
         return results.scalars().one_or_none()
 
-    async def update_user(self, user_model: User, update_user: dict) -> User:
-        for key, value in update_user.items():
-            setattr(user_model, key, value)
+    async def update_user(self, user_id: int, changes: dict, version: Optional[int] = None):
+        """Меняет поля одним UPDATE и увеличивает version.
 
-        await self.db.flush()
-        return user_model
+        Возвращает строку с новыми значениями и old_username или None, если пользователя
+        нет или его version уже не равна переданной. Нарушения уникальности и check-ограничения
+        приходят как IntegrityError.
+        """
+        fields = tuple(field for field in _UPDATABLE if field in changes)
+        results = await self.db.execute(_UPDATE[fields], {**changes, "user_id": user_id, "version": version})
+        return results.one_or_none()
+
+    async def set_status(self, user_ids: List[int], action: str) -> Dict[int, str]:
+        """Применяет действие ко всем user_ids одним UPDATE; возвращает username измененных по id."""
+        results = await self.db.execute(_SET_STATUS[action], {"ids": user_ids})
+        return {user_id: username for user_id, username in results}
+
+    async def get_statuses(self, user_ids: List[int]) -> Dict[int, Tuple[bool, bool]]:
+        """(is_active, is_deleted) по id для найденных пользователей."""
+        results = await self.db.execute(_STATUS_BY_IDS, {"ids": user_ids})
+        return {user_id: (is_active, is_deleted) for user_id, is_active, is_deleted in results}
 
     async def delete_user(self, user) -> None:
         await self.db.delete(user)
         await self.db.flush()
 
     async def get_user_by_username(self, username: str) -> Optional[User]:
-        query = select(User).where(User.username == username)
-        result = await self.db.execute(query)
+        result = await self.db.execute(_BY_USERNAME, {"username": username})
         return result.scalars().one_or_none()
+
+    async def get_login_credentials(self, username: str):
+        """id, username, password, is_active и is_deleted пользователя (строкой) или None."""
+        result = await self.db.execute(_LOGIN, {"username": username})
+        return result.one_or_none()
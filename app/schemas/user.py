@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field, EmailStr, ConfigDict
-from typing import Optional
+from pydantic import BaseModel, Field, EmailStr, ConfigDict, TypeAdapter
+from typing import List, Literal, Optional
 from datetime import datetime
 
+from app.core.config import settings
+
 class UserBase(BaseModel):
     username: str = Field(..., min_length=3, max_length=50,
                           json_schema_extra={"example": "ivan-ivanov"},
@@ -55,6 +57,9 @@ class UserLogin(BaseModel):
                           json_schema_extra={"example": "1q2w3e4r"},
                           description="Пароль пользователя")
 
+# Увеличьте при изменении полей UserSchema: старые записи кэша станут промахами без сброса Redis
+USER_CACHE_SCHEMA_VERSION = 3
+
 class UserSchema(UserBase):
     id: int = Field(..., json_schema_extra={"example": 1},
                     description="Id пользователя в БД"
@@ -69,8 +74,68 @@ class UserSchema(UserBase):
                                  description="Дата и время регистрации"
                                  )
 
+    version: int = Field(..., json_schema_extra={"example": 1},
+                         description="Версия записи, она же ETag для If-Match в PATCH"
+                         )
+
     model_config = ConfigDict(from_attributes = True)
 
+USER_FIELDS = tuple(UserSchema.model_fields)
+
+# Строки из БД уже прошли валидацию при записи, поэтому ответы собираются
+# без повторной проверки (EmailStr самая дорогая часть) и сериализуются в JSON
+# за один вызов pydantic-core; вывод тот же, что у response_model=List[UserSchema].
+user_list_adapter = TypeAdapter(List[UserSchema])
+
+def trusted_user(user) -> UserSchema:
+    return UserSchema.model_construct(**{field: getattr(user, field) for field in USER_FIELDS})
+
+def dump_user(user) -> dict:
+    return trusted_user(user).model_dump(mode="json")
+
+def dump_users_json(users) -> bytes:
+    return user_list_adapter.dump_json([trusted_user(user) for user in users])
+
+class UserBatch(BaseModel):
+    users: List[UserSchema] = Field(..., description="Найденные пользователи в порядке запроса")
+    missing: List[int] = Field(..., json_schema_extra={"example": [42]},
+                               description="ID, которые не найдены или не прошли фильтры")
+
+class UserImportResult(BaseModel):
+    index: int = Field(..., description="Номер строки во входных данных, с нуля")
+    status: Literal["created", "conflict", "invalid"] = Field(..., description="Итог по строке")
+    id: Optional[int] = Field(None, description="ID созданного пользователя")
+    field: Optional[str] = Field(None, description="Поле, нарушившее уникальность")
+    error: Optional[str] = Field(None, description="Причина отказа валидации")
+
+class UserImportReport(BaseModel):
+    created: int
+    conflicts: int
+    invalid: int
+    results: List[UserImportResult]
+
+UserStatusAction = Literal["activate", "deactivate", "soft_delete"]
+
+class UserStatusChange(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=settings.USER_STATUS_MAX_IDS,
+                           json_schema_extra={"example": [1, 2, 3]},
+                           description="ID пользователей, повторы схлопываются")
+    action: UserStatusAction = Field(..., json_schema_extra={"example": "deactivate"},
+                                     description="activate, deactivate или soft_delete (заодно деактивирует)")
+
+class UserStatusResult(BaseModel):
+    id: int
+    status: Literal["updated", "unchanged", "conflict", "not_found"] = Field(
+        ..., description="conflict — удаленного пользователя нельзя активировать"
+    )
+
+class UserStatusReport(BaseModel):
+    updated: int
+    unchanged: int
+    conflicts: int
+    not_found: int
+    results: List[UserStatusResult]
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
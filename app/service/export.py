@@ -0,0 +1,33 @@
+import csv
+import io
+from typing import List
+
+import orjson
+
+from app.models.user import User
+from app.schemas.user import UserSchema
+
+EXPORT_FIELDS = tuple(UserSchema.model_fields)
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _row(user: User) -> tuple:
+    return tuple(getattr(user, field) for field in EXPORT_FIELDS)
+
+def encode_ndjson(users: List[User]) -> bytes:
+    return b"".join(orjson.dumps(dict(zip(EXPORT_FIELDS, _row(user))), option=orjson.OPT_APPEND_NEWLINE)
+                    for user in users)
+
+def encode_csv(users: List[User], with_header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if with_header:
+        writer.writerow(EXPORT_FIELDS)
+    for user in users:
+        row = _row(user)
+        writer.writerow(value.isoformat() if hasattr(value, "isoformat") else value for value in row)
+    return buffer.getvalue().encode("utf-8")
@@ -1,154 +1,491 @@
 from fastapi.security import OAuth2PasswordRequestForm
 
-import json
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Literal, Optional, Set, Tuple
 
+import orjson
 
+
+from app.api.etags import etag
 from app.core import exceptions as e
-from app.core.security.passwords import hash_password, verify_password
-from app.core.security.tokens import create_access_token, decode_token
-from app.schemas.user import UserCreate, UserUpdate, Token, UserSchema
+from app.core import metrics
+from app.core.config import settings
+from app.core.database import ReplicaRouter
+from app.core.limiter import PipelinedLimit
+from app.core.singleflight import SingleFlight
+from app.core.security.passwords import password_hasher
+from app.core.security.revocations import revoked_tokens
+from app.core.security.tokens import create_access_token, decode_token, revocation_id, token_digest, verified_tokens
+from app.schemas.user import UserCreate, UserStatusAction, UserUpdate, Token, dump_user
 from app.repositories.user_repo import UserRepo
+from app.service.export import encode_csv, encode_ndjson
 from app.models.user import User
 
+from pydantic import ValidationError
 from sqlalchemy.exc import IntegrityError
 
+user_loads = SingleFlight("user")
+
+_TOKEN_CACHE_HITS = metrics.AUTH_TOKEN_CACHE.labels("hit")
+_TOKEN_CACHE_MISSES = metrics.AUTH_TOKEN_CACHE.labels("miss")
+
+def _matches_filters(user_data: dict, only_deleted: bool, only_active: bool) -> bool:
+    if only_deleted:
+        return user_data["is_deleted"]
+    if only_active:
+        return user_data["is_active"]
+    return True
+
+def _cacheable(user_data: dict) -> bool:
+    # Кэш по id общий для всех фильтров, а get_user отдает из него без проверок:
+    # кладем только тех, кого видно с фильтрами по умолчанию
+    return user_data["is_active"] and not user_data["is_deleted"]
+
+def _conflicting_field(data: UserCreate, usernames: Set[str], emails: Set[str]) -> Optional[str]:
+    if data.username in usernames:
+        return "username"
+    if data.email in emails:
+        return "email"
+    return None
+
+# Ограничения users -> ошибка API; остальные нарушения целостности считаются нарушением логики
+_CONSTRAINT_ERRORS = {
+    "ix_users_username": lambda: e.AlreadyExistsError(field="username"),
+    "ix_users_email": lambda: e.AlreadyExistsError(field="email"),
+    "check_user_active_deleted_logic": e.InconsistentStateError,
+}
+
+def _integrity_error(exc: IntegrityError) -> e.AppErrors:
+    # Исходное исключение asyncpg лежит в __cause__ у обертки DBAPI
+    cause = getattr(exc.orig, "__cause__", None)
+    error = _CONSTRAINT_ERRORS.get(getattr(cause, "constraint_name", None))
+    if error is not None:
+        return error()
+    if getattr(cause, "sqlstate", None) == "23505":
+        return e.AlreadyExistsError(field="email/username")
+    return e.InconsistentStateError()
+
 class UserService:
-    def __init__(self, session_factory, cache_service):
+    def __init__(self, session_factory, cache_service, replicas: Optional[ReplicaRouter] = None):
         self.session_factory = session_factory
         self.cache_service = cache_service
+        self.replicas = replicas
+
+    async def _reader(self, *user_ids):
+        """Сессии для чтения: реплика, если она есть и читаемые пользователи
+        не менялись в последние READ_YOUR_WRITES_SECONDS (иначе primary)."""
+        if self.replicas is None or not self.replicas.enabled:
+            return self.session_factory
+        if user_ids and await self.cache_service.recently_written(*user_ids):
+            return self.session_factory
+        return self.replicas.reader()
+
+    def _written_ttl(self) -> Optional[float]:
+        if self.replicas is None or not self.replicas.enabled:
+            return None
+        return settings.READ_YOUR_WRITES_SECONDS
 
     async def get_user(self, user_id: int,
                        show_deleted: bool,
                        show_active: bool):
         cached_user = await self.cache_service.get_user(user_id)
         if cached_user:
-            return json.loads(cached_user)
+            return cached_user
 
-        async with self.session_factory() as db:
+        return await self._load_user(user_id, show_deleted, show_active)
+
+    async def get_user_json(self, user_id: int,
+                            show_deleted: bool,
+                            show_active: bool) -> Tuple[bytes, int]:
+        """Пользователь готовым JSON-телом и его версия для ETag."""
+        cached_user = await self.cache_service.get_user_json(user_id)
+        if cached_user:
+            return cached_user
+
+        user_data = await self._load_user(user_id, show_deleted, show_active)
+        return orjson.dumps(user_data), user_data["version"]
+
+    async def get_users(self, user_ids: List[int],
+                        show_deleted: bool,
+                        show_active: bool) -> dict:
+        user_ids = list(dict.fromkeys(user_ids))
+        found = await self.cache_service.get_users(user_ids)
+
+        missing_ids = [user_id for user_id in user_ids if user_id not in found]
+        if missing_ids:
+            async with (await self._reader(*missing_ids))() as db:
+                repo = UserRepo(db)
+                loaded = {user.id: dump_user(user)
+                          for user in await repo.get_users_by_ids(missing_ids)}
+            await self.cache_service.set_users({user_id: user_data for user_id, user_data in loaded.items()
+                                                if _cacheable(user_data)},
+                                               expire=self._cache_ttl())
+            found.update(loaded)
+
+        users, missing = [], []
+        for user_id in user_ids:
+            user_data = found.get(user_id)
+            if user_data is not None and _matches_filters(user_data, show_deleted, show_active):
+                users.append(user_data)
+            else:
+                missing.append(user_id)
+        return {"users": users, "missing": missing}
+
+    def _cache_ttl(self) -> int:
+        return settings.USER_CACHE_TTL + random.randint(0, settings.USER_CACHE_TTL_JITTER)
+
+    async def _fill_cache(self, cache_key, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        if not settings.USER_CACHE_LOCK_ENABLED:
+            return await fetch()
+
+        lock_token = await self.cache_service.acquire_user_lock(cache_key, settings.USER_CACHE_LOCK_TTL_MS)
+        if lock_token is None:
+            cached = await self.cache_service.wait_for_user(cache_key,
+                                                            settings.USER_CACHE_LOCK_TTL_MS,
+                                                            settings.USER_CACHE_LOCK_POLL_MS)
+            if cached is not None:
+                metrics.USER_CACHE_LOCK_WAITS.inc()
+                return cached
+            return await fetch()
+
+        try:
+            return await fetch()
+        finally:
+            await self.cache_service.release_user_lock(cache_key, lock_token)
+
+    async def _load_user(self, user_id: int,
+                         show_deleted: bool,
+                         show_active: bool) -> dict:
+        key = ("id", user_id, show_deleted, show_active)
+        fetch = lambda: self._fetch_user(user_id, show_deleted, show_active)
+        if show_deleted or not show_active:
+            # Лок по id ждет записи в общий кэш, а загрузка с фильтрами ее обычно не делает
+            return await user_loads.do(key, fetch)
+        return await user_loads.do(key, lambda: self._fill_cache(user_id, fetch))
+
+    async def _fetch_user(self, user_id: int,
+                          show_deleted: bool,
+                          show_active: bool) -> dict:
+        async with (await self._reader(user_id))() as db:
             repo = UserRepo(db)
             user = await repo.get_user_by_id(user_id, show_deleted, show_active)
             if not user:
                 raise e.EntityNotFoundError()
-            user_schema = UserSchema.from_orm(user)
-            json_data = user_schema.model_dump_json(exclude_unset=True)
-            await self.cache_service.set_user(user_id, json_data, expire=300)
-        return user_schema.model_dump()
+            user_data = dump_user(user)
 
-    async def authenticate_user(self, token: str):
-        if await self.cache_service.is_token_blacklisted(token):
-            raise e.TokenBlackListedError()
+        if _cacheable(user_data):
+            await self.cache_service.set_user(user_id, user_data, expire=self._cache_ttl())
+        return user_data
+
+    def _verify_token(self, token: str, digest: str) -> Tuple[dict, Optional[str]]:
+        """Проверяет подпись и срок токена без обращения к Redis.
+
+        Возвращает claims и id отзыва, если токен еще нужно проверить по черному
+        списку в Redis (None — уже проверен раньше или Bloom-фильтр ответил "нет").
+        """
+        payload = verified_tokens.get(digest)
+        if payload is not None:
+            _TOKEN_CACHE_HITS.inc()
+            return payload, None
+        _TOKEN_CACHE_MISSES.inc()
 
         payload = decode_token(token)
 
-        username = payload.get("sub")
-        if not username:
-            raise e.WrongDataError("Некорректный токен")
+        token_id = revocation_id(payload, digest)
+        if revoked_tokens.might_be_revoked(token_id):
+            return payload, token_id
+
+        self._remember_token(digest, payload)
+        return payload, None
+
+    @staticmethod
+    def _remember_token(digest: str, payload: dict) -> None:
+        ttl = min(settings.TOKEN_CACHE_TTL, payload.get("exp", 0) - time.time())
+        if ttl > 0:
+            verified_tokens.set(digest, payload, ttl=ttl)
+
+    async def authenticate_user(self, token: str):
+        user_data, _ = await self.authenticate(token)
+        return user_data
+
+    async def authenticate(self, token: str, rate_limit: Optional[PipelinedLimit] = None):
+        """Аутентификация по токену за один round trip в Redis.
+
+        Проверка отзыва, чтение кэша пользователя и (если передан) лимит запроса
+        уходят одним pipeline. Возвращает данные пользователя и результат лимитера.
+        """
+        digest = token_digest(token)
+        try:
+            payload, token_id = self._verify_token(token, digest)
+            username = payload.get("sub")
+            if not username:
+                raise e.WrongDataError("Некорректный токен")
+        except e.WrongDataError:
+            # До pipeline дело не дошло, но запрос с плохим токеном тоже расходует лимит
+            if rate_limit is not None:
+                result = await rate_limit.run(self.cache_service.client)
+                if not result.allowed:
+                    rate_limit.limiter.reject(result)
+            raise
 
         cache_key = f"user:{username}"
+        legacy_token = token if token_id is not None and "jti" not in payload else None
+        lookup = await self.cache_service.auth_lookup(cache_key, token_id, legacy_token, rate_limit)
 
-        cached = await self.cache_service.get_user(cache_key)
-        if cached:
-            user_data = json.loads(cached)
-            if not user_data["is_deleted"] and user_data["is_active"]:
-                return user_data
+        if lookup.rate_limit is not None and not lookup.rate_limit.allowed:
+            rate_limit.limiter.reject(lookup.rate_limit)
+        if lookup.blacklisted:
+            raise e.TokenBlackListedError()
+        if token_id is not None:
+            self._remember_token(digest, payload)
 
-        async with self.session_factory() as db:
+        cached = lookup.user
+        if cached:
+            if not cached["is_deleted"] and cached["is_active"]:
+                return cached, lookup.rate_limit
+
+        user_data = await user_loads.do(
+            ("username", username),
+            lambda: self._fill_cache(cache_key, lambda: self._fetch_active_user(username, cache_key))
+        )
+        if user_data["is_deleted"] or not user_data["is_active"]:
+            raise e.EntityNotFoundError()
+        return user_data, lookup.rate_limit
+
+    async def _fetch_active_user(self, username: str, cache_key: str) -> dict:
+        async with (await self._reader(cache_key))() as db:
             repo = UserRepo(db)
             user = await repo.get_user_by_username(username)
 
             if not user or user.is_deleted or not user.is_active:
                 raise e.EntityNotFoundError()
 
-            user_schema = UserSchema.from_orm(user)
-            json_data = user_schema.model_dump_json(exclude_unset=True)
-            await self.cache_service.set_user(cache_key, json_data, expire=300)
+            user_data = dump_user(user)
 
-            return user_schema.model_dump()
+        await self.cache_service.set_user(cache_key, user_data, expire=self._cache_ttl())
+        return user_data
 
-    async def create_user(self, data: UserCreate):
+    @asynccontextmanager
+    async def _autocommit(self) -> AsyncIterator[UserRepo]:
+        """Репозиторий без транзакции: каждое выражение фиксируется само, BEGIN/COMMIT не отправляются."""
         async with self.session_factory() as db:
-            repo = UserRepo(db)
-            existing_user = await repo.check_existing_user(data)
-
-            if existing_user:
-                raise e.AlreadyExistsError("Пользователь с таким username или email уже существует")
-
-            user_data = data.model_dump(exclude_unset=True)
-            user_data["password"] = hash_password(data.password)
+            await db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            yield UserRepo(db)
 
+    async def create_user(self, data: UserCreate):
+        # Дешевая проверка до bcrypt: на занятое имя хеш не считается. Соединение на время
+        # хеширования возвращается в пул, а гонку между проверкой и вставкой закрывает ON CONFLICT
+        async with self._autocommit() as repo:
+            taken_usernames, taken_emails = await repo.get_taken_credentials([data.username], [data.email])
+        field = _conflicting_field(data, taken_usernames, taken_emails)
+        if field:
+            raise e.AlreadyExistsError(field)
+
+        hashed = await password_hasher.hash(data.password)
+
+        async with self._autocommit() as repo:
+            new_user = await repo.create_user(data.username, data.email, hashed)
+            if new_user is None:
+                taken_usernames, taken_emails = await repo.get_taken_credentials([data.username], [data.email])
+                raise e.AlreadyExistsError(_conflicting_field(data, taken_usernames, taken_emails) or "email/username")
+
+        if self._written_ttl():
+            await self.cache_service.mark_written([(new_user.id, new_user.username)], ttl=self._written_ttl())
+        return new_user
+
+    async def import_users(self, rows: List[Any]) -> dict:
+        results: List[Optional[dict]] = [None] * len(rows)
+        candidates = []
+        seen_usernames: Set[str] = set()
+        seen_emails: Set[str] = set()
+
+        for index, row in enumerate(rows):
             try:
-                new_user = await repo.create_user(user_data)
+                data = UserCreate.model_validate(row)
+            except ValidationError as exc:
+                error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in exc.errors())
+                results[index] = {"index": index, "status": "invalid", "error": error}
+                continue
+
+            field = _conflicting_field(data, seen_usernames, seen_emails)
+            if field:
+                results[index] = {"index": index, "status": "conflict", "field": field}
+                continue
+            seen_usernames.add(data.username)
+            seen_emails.add(data.email)
+            candidates.append((index, data))
+
+        if candidates:
+            async with self.session_factory() as db:
+                repo = UserRepo(db)
+                taken_usernames, taken_emails = await repo.get_taken_credentials(list(seen_usernames),
+                                                                                 list(seen_emails))
+            fresh = []
+            for index, data in candidates:
+                field = _conflicting_field(data, taken_usernames, taken_emails)
+                if field:
+                    results[index] = {"index": index, "status": "conflict", "field": field}
+                else:
+                    fresh.append((index, data))
+
+            hashes = await password_hasher.hash_many([data.password for _, data in fresh])
+
+            async with self.session_factory() as db:
+                repo = UserRepo(db)
+                created = await repo.import_users([(data.username, data.email, hashed)
+                                                   for (_, data), hashed in zip(fresh, hashes)])
+                lost = [data for _, data in fresh if data.username not in created]
+                if lost:
+                    taken_usernames, taken_emails = await repo.get_taken_credentials(
+                        [data.username for data in lost], [data.email for data in lost]
+                    )
                 await db.commit()
-                return new_user
-            except IntegrityError:
-                await db.rollback()
-                raise e.AlreadyExistsError("Пользователь с таким username или email уже существует")
 
-    async def update_user(self, user_data: UserUpdate,
-                          user_id: int
-                          ):
-        async with self.session_factory() as db:
-            repo = UserRepo(db)
-            user = await repo.get_user_by_id(user_id)
-            if not user:
-                raise e.EntityNotFoundError()
+            if created and self._written_ttl():
+                await self.cache_service.mark_written([(user_id, username) for username, user_id in created.items()],
+                                                      ttl=self._written_ttl())
 
-            updated_dict = user_data.model_dump(exclude_unset=True)
+            for index, data in fresh:
+                if data.username in created:
+                    results[index] = {"index": index, "status": "created", "id": created[data.username]}
+                else:
+                    field = _conflicting_field(data, taken_usernames, taken_emails) or "email/username"
+                    results[index] = {"index": index, "status": "conflict", "field": field}
 
-            new_is_active = updated_dict.get("is_active", user.is_active)
-            new_is_deleted = updated_dict.get("is_deleted", user.is_deleted)
+        return {
+            "created": sum(result["status"] == "created" for result in results),
+            "conflicts": sum(result["status"] == "conflict" for result in results),
+            "invalid": sum(result["status"] == "invalid" for result in results),
+            "results": results,
+        }
 
-            if new_is_active and new_is_deleted:
-                raise e.InconsistentStateError()
-
-            conflicting_users = await repo.get_conflicting_users(user_id,
-                                                             email=updated_dict.get("email"),
-                                                             username=updated_dict.get("username")
-                                                             )
-
-            if conflicting_users:
-                raise e.AlreadyExistsError(field="email/username")
-
-            try:
-                updated_model = await repo.update_user(user, updated_dict)
-                await self.cache_service.delete_user(user_id)
-                await db.commit()
-                return updated_model
-            except IntegrityError:
-                await db.rollback()
-                raise e.InconsistentStateError()
+    async def update_user(self, user_data: UserUpdate,
+                          user_id: int,
+                          expected_version: Optional[int] = None
+                          ):
+        """PATCH одним UPDATE ... RETURNING вне транзакции.
+
+        expected_version — версия из If-Match: если запись успели изменить, ответ 412.
+        Кэш сбрасывается после того, как UPDATE зафиксирован.
+        """
+        changes = user_data.model_dump(exclude_unset=True)
+        if changes.get("is_active") and changes.get("is_deleted"):
+            raise e.InconsistentStateError()
+
+        async with self._autocommit() as repo:
+            if not changes:
+                updated = await repo.get_user_by_id(user_id)
+                if updated is not None and expected_version not in (None, updated.version):
+                    updated = None
+            else:
+                try:
+                    updated = await repo.update_user(user_id, changes, expected_version)
+                except IntegrityError as exc:
+                    raise _integrity_error(exc)
+
+            if updated is None:
+                current = await repo.get_user_by_id(user_id)
+                if current is None:
+                    raise e.EntityNotFoundError()
+                raise e.PreconditionFailedError(headers={"ETag": etag(current.version)})
+
+        if changes:
+            await self.cache_service.invalidate_user(user_id, updated.old_username, updated.username,
+                                                     written_ttl=self._written_ttl())
+        return updated
+
+    async def change_status(self, user_ids: List[int], action: UserStatusAction) -> dict:
+        """Массовая смена статуса: один UPDATE на все id, один pipeline на сброс кэша.
+
+        Статус по каждому id: updated, unchanged (уже в нужном состоянии), conflict
+        (активация удаленного) или not_found. Второй запрос только для неизмененных id.
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        async with self._autocommit() as repo:
+            updated = await repo.set_status(user_ids, action)
+            rest = [user_id for user_id in user_ids if user_id not in updated]
+            statuses = await repo.get_statuses(rest) if rest else {}
+
+        await self.cache_service.invalidate_users(updated.items(), written_ttl=self._written_ttl())
+
+        results = []
+        for user_id in user_ids:
+            if user_id in updated:
+                status = "updated"
+            elif user_id not in statuses:
+                status = "not_found"
+            elif action == "activate" and statuses[user_id][1]:
+                status = "conflict"
+            else:
+                status = "unchanged"
+            results.append({"id": user_id, "status": status})
+
+        return {
+            "updated": len(updated),
+            "unchanged": sum(result["status"] == "unchanged" for result in results),
+            "conflicts": sum(result["status"] == "conflict" for result in results),
+            "not_found": sum(result["status"] == "not_found" for result in results),
+            "results": results,
+        }
 
     async def login(self, username: str, password: str):
-        async with self.session_factory() as db:
+        async with (await self._reader(f"user:{username}"))() as db:
             repo = UserRepo(db)
-            user = await repo.get_user_by_username(username)
+            user = await repo.get_login_credentials(username)
 
-            if not user:
-                raise e.WrongDataError()
-            if not verify_password(password, user.password):
-                raise e.WrongDataError()
-            if not user.is_active or user.is_deleted:
-                raise e.EntityNotFoundError()
+        if not user:
+            raise e.WrongDataError()
+        if not await password_hasher.verify(password, user.password):
+            raise e.WrongDataError()
+        if not user.is_active or user.is_deleted:
+            raise e.EntityNotFoundError()
 
-            token_data = {"sub": user.username, "id": user.id}
-            access_token = create_access_token(data=token_data)
+        token_data = {"sub": user.username, "id": user.id}
+        access_token = create_access_token(data=token_data)
 
-            return Token(access_token=access_token, token_type="bearer")
+        return Token(access_token=access_token, token_type="bearer")
 
     async def logout(self, token: str):
-        await self.cache_service.blacklist_token(token)
+        digest = token_digest(token)
+        verified_tokens.delete(digest)
+
+        # Запись в черном списке живет ровно до exp токена: после него токен и так отклоняется
+        payload = decode_token(token, verify_exp=False)
+        expire = int(payload.get("exp", 0) - time.time()) + 1
+        if expire > 0:
+            token_id = revocation_id(payload, digest)
+            revoked_tokens.add(token_id)
+            await self.cache_service.blacklist_token(token_id, digest, expire)
         return {"detail": "Успешный выход"}
 
     async def user_list(self, skip: int,
                     limit: int,
                     show_deleted: bool,
-                    show_active: bool
+                    show_active: bool,
+                    after_id: Optional[int] = None
                     ):
-        async with self.session_factory() as db:
+        async with (await self._reader())() as db:
             repo = UserRepo(db)
-            users = await repo.get_list(skip, limit, show_deleted, show_active)
+            users = await repo.get_list(skip, limit, show_deleted, show_active, after_id)
             return users
 
+    async def export_users(self, export_format: Literal["ndjson", "csv"],
+                           show_deleted: bool,
+                           show_active: bool
+                           ) -> AsyncIterator[bytes]:
+        if export_format == "csv":
+            yield encode_csv([], with_header=True)
+
+        async with (await self._reader())() as db:
+            repo = UserRepo(db)
+            async for users in repo.stream_list(show_deleted, show_active, settings.USER_EXPORT_CHUNK_SIZE):
+                if export_format == "csv":
+                    yield encode_csv(users)
+                else:
+                    yield encode_ndjson(users)
+
     async def delete_user(self, user_id: int
                       ):
         async with self.session_factory() as db:
@@ -158,6 +495,9 @@ class UserService:
             if not user:
                 raise e.EntityNotFoundError()
 
+            username = user.username
             await repo.delete_user(user)
             await db.commit()
-            return None
+
+        await self.cache_service.invalidate_user(user_id, username, written_ttl=self._written_ttl())
+        return None
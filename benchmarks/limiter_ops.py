@@ -0,0 +1,110 @@
+"""Сколько обращений к Redis стоит один запрос к лимитеру в каждой стратегии.
+
+    python -m benchmarks.limiter_ops --requests 2000
+
+Для каждой стратегии (и для старого EVAL с телом скрипта в каждом запросе)
+печатает: round trip'ы на запрос, команды, выполненные сервером внутри скрипта
+(по INFO commandstats; фейковые Redis его не отдают), байты команды, уходящие
+в сокет, и среднее время запроса.
+"""
+import argparse
+import asyncio
+import time
+
+import redis.asyncio as redis
+from redis.connection import Connection
+
+from app.core.config import settings
+from app.core.limiter import STRATEGIES
+
+LEGACY_LUA_LIMITER = """
+local current = redis.call("INCR", KEYS[1])
+if current == 1 then
+    redis.call("EXPIRE", KEYS[1], ARGV[1])
+end
+return current
+"""
+
+_packer = Connection()
+
+
+def command_bytes(*args) -> int:
+    return sum(len(chunk) for chunk in _packer.pack_command(*args))
+
+
+class CountingRedis(redis.Redis):
+    round_trips = 0
+    sent_bytes = 0
+
+    async def execute_command(self, *args, **options):
+        self.round_trips += 1
+        self.sent_bytes += command_bytes(*args)
+        return await super().execute_command(*args, **options)
+
+
+async def server_commands(client: redis.Redis) -> int | None:
+    try:
+        stats = await client.info("commandstats")
+    except redis.ResponseError:
+        return None
+    total = sum(value["calls"] for name, value in stats.items() if name.startswith("cmdstat_"))
+    return total or None
+
+
+async def run_case(client: CountingRedis, name: str, hit, requests: int) -> dict:
+    await client.flushdb()
+    await hit(0)
+
+    client.round_trips = client.sent_bytes = 0
+    before = await server_commands(client)
+    client.round_trips = client.sent_bytes = 0
+
+    started = time.perf_counter()
+    for i in range(requests):
+        await hit(i)
+    elapsed = time.perf_counter() - started
+
+    round_trips, sent_bytes = client.round_trips, client.sent_bytes
+    after = await server_commands(client)
+    # INFO тоже считается командой, сам вызов INFO вычитаем
+    executed = (after - before - 1) / requests if before is not None and after is not None else None
+    return {
+        "case": name,
+        "round_trips": round_trips / requests,
+        "server_commands": executed,
+        "bytes_sent": sent_bytes / requests,
+        "us_per_request": elapsed / requests * 1e6,
+    }
+
+
+async def main(requests: int, keys: int):
+    client = CountingRedis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+    results = []
+
+    async def legacy(i: int):
+        await client.eval(LEGACY_LUA_LIMITER, 1, f"bench:legacy:{i % keys}", 60)
+
+    results.append(await run_case(client, "legacy_eval", legacy, requests))
+
+    for name, strategy in STRATEGIES.items():
+        async def hit(i: int, strategy=strategy):
+            await strategy.hit(client, f"bench:{strategy.name}:{i % keys}", times=requests, seconds=60)
+
+        results.append(await run_case(client, name, hit, requests))
+
+    await client.flushdb()
+    await client.aclose()
+
+    print(f"{'case':<16}{'rtt/req':>9}{'server cmds/req':>17}{'bytes/req':>11}{'us/req':>10}")
+    for row in results:
+        executed = f"{row['server_commands']:.2f}" if row["server_commands"] is not None else "n/a"
+        print(f"{row['case']:<16}{row['round_trips']:>9.2f}{executed:>17}"
+              f"{row['bytes_sent']:>11.0f}{row['us_per_request']:>10.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--keys", type=int, default=100, help="число разных клиентов (ключей лимитера)")
+    args = parser.parse_args()
+    asyncio.run(main(args.requests, args.keys))
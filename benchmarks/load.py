@@ -0,0 +1,309 @@
+"""Нагрузочный прогон API: сценарии, конкурентность, p50/p95/p99, RPS и доля ошибок.
+
+    python -m benchmarks.load --scenario me --concurrency 50 --duration 10
+    python -m benchmarks.load --scenario me=70,list=20,crud=10 --url http://localhost:8000
+    python -m benchmarks.load --scenario list --save-baseline baseline.json
+    python -m benchmarks.load --scenario list --baseline baseline.json --tolerance 0.2
+
+Без --url приложение app.main:app поднимается в этом же процессе (httpx.ASGITransport
+вместе с lifespan) поверх БД и Redis из настроек, таблицы должны быть созданы миграциями.
+Каждый виртуальный пользователь ходит со своего адреса, поэтому лимитеры по IP
+срабатывают на каждого отдельно, а --limit-factor умножает лимиты /login и /me
+(иначе горячий цикл /me почти целиком упирается в 429). С --url нагружается запущенный
+uvicorn, и все запросы идут с одного адреса.
+
+Сценарии (--scenario name[=вес],...; на каждой итерации сценарий выбирается по весу):
+    login — шторм логинов (bcrypt + лимитер /login);
+    me    — горячий цикл GET /me с одним токеном;
+    list  — листание списка курсором до конца и заново;
+    crud  — создание, изменение, чтение и удаление пользователя.
+
+Отчет — JSON: по каждому запросу сценария и в целом count, rps, p50/p95/p99 и среднее
+в миллисекундах, error_rate (ответы 5xx, неожиданные статусы и ошибки соединения)
+и rate_limited (429, в ошибки не входят). С --baseline прогон сравнивается с сохраненным
+отчетом, и при деградации больше --tolerance команда завершается с кодом 1.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import sys
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+API = "/api/users"
+LOAD_USERNAME = "loadtest_user"
+LOAD_PASSWORD = "loadtest-pass"
+PAGE_SIZE = 50
+
+# Насколько хуже базового прогона может быть error_rate (абсолютная разница долей)
+ERROR_RATE_SLACK = 0.01
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Перцентиль по ближайшему рангу; значения должны быть отсортированы."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """Замеры по меткам запросов; до measure_from (прогрев) ничего не записывает."""
+
+    def __init__(self, measure_from: float = 0.0):
+        self.measure_from = measure_from
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.rate_limited: Dict[str, int] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, seconds: float, status: Optional[int], ok: bool) -> None:
+        if time.perf_counter() < self.measure_from:
+            return
+        self.latencies.setdefault(label, []).append(seconds)
+        statuses = self.statuses.setdefault(label, {})
+        key = str(status) if status is not None else "connection_error"
+        statuses[key] = statuses.get(key, 0) + 1
+        if status == 429:
+            self.rate_limited[label] = self.rate_limited.get(label, 0) + 1
+        elif not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def _row(self, latencies: List[float], errors: int, rate_limited: int, elapsed: float) -> dict:
+        values = sorted(latencies)
+        count = len(values)
+        return {
+            "count": count,
+            "rps": count / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000,
+            "mean_ms": sum(values) / count * 1000 if count else 0.0,
+            "error_rate": errors / count if count else 0.0,
+            "rate_limited": rate_limited / count if count else 0.0,
+        }
+
+    def summary(self, elapsed: float) -> dict:
+        requests = {
+            label: {**self._row(values, self.errors.get(label, 0), self.rate_limited.get(label, 0), elapsed),
+                    "statuses": self.statuses[label]}
+            for label, values in sorted(self.latencies.items())
+        }
+        overall = self._row([value for values in self.latencies.values() for value in values],
+                            sum(self.errors.values()), sum(self.rate_limited.values()), elapsed)
+        return {"total": overall, "requests": requests}
+
+
+class VirtualUser:
+    """Один клиент нагрузки: свой httpx-клиент, свой курсор листания и свой генератор случайных чисел."""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, token: str, seed: int):
+        self.client = client
+        self.recorder = recorder
+        self.token = token
+        self.random = random.Random(seed)
+        self.cursor: Optional[str] = None
+
+    async def request(self, label: str, method: str, url: str, expect: Tuple[int, ...] = (200,),
+                      **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.record(label, time.perf_counter() - started, None, ok=False)
+            return None
+        self.recorder.record(label, time.perf_counter() - started, response.status_code,
+                             ok=response.status_code in expect)
+        return response
+
+
+async def login_storm(user: VirtualUser) -> None:
+    await user.request("login", "POST", f"{API}/login", expect=(201,),
+                       data={"username": LOAD_USERNAME, "password": LOAD_PASSWORD})
+
+
+async def me_loop(user: VirtualUser) -> None:
+    await user.request("me", "GET", f"{API}/me", headers={"Authorization": f"Bearer {user.token}"})
+
+
+async def list_paging(user: VirtualUser) -> None:
+    params = {"limit": PAGE_SIZE}
+    if user.cursor is not None:
+        params["cursor"] = user.cursor
+    response = await user.request("list", "GET", f"{API}/", params=params)
+    user.cursor = response.headers.get("X-Next-Cursor") if response is not None else None
+
+
+async def crud_mix(user: VirtualUser) -> None:
+    name = f"load_{uuid.uuid4().hex[:12]}"
+    created = await user.request("crud:create", "POST", f"{API}/", expect=(201,),
+                                 json={"username": name, "password": LOAD_PASSWORD, "email": f"{name}@example.com"})
+    if created is None or created.status_code != 201:
+        return
+    user_id = created.json()["id"]
+    await user.request("crud:update", "PATCH", f"{API}/{user_id}", json={"username": f"{name}_u"})
+    await user.request("crud:get", "GET", f"{API}/{user_id}")
+    await user.request("crud:delete", "DELETE", f"{API}/{user_id}", expect=(204,))
+
+
+Scenario = Callable[[VirtualUser], Awaitable[None]]
+
+SCENARIOS: Dict[str, Scenario] = {
+    "login": login_storm,
+    "me": me_loop,
+    "list": list_paging,
+    "crud": crud_mix,
+}
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """'me=70,list=20,crud' -> {'me': 70.0, 'list': 20.0, 'crud': 1.0}."""
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"неизвестный сценарий {name!r}, есть: {', '.join(SCENARIOS)}")
+        mix[name] = float(weight) if weight else 1.0
+    return mix
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Деградации относительно базового отчета: рост p95/p99 и падение RPS больше tolerance, рост ошибок."""
+    regressions = []
+    rows = {"total": (current["total"], baseline["total"])}
+    for label, base in baseline["requests"].items():
+        if label in current["requests"]:
+            rows[label] = (current["requests"][label], base)
+
+    for label, (now, base) in rows.items():
+        for key in ("p95_ms", "p99_ms"):
+            if base[key] and now[key] > base[key] * (1 + tolerance):
+                regressions.append(f"{label}: {key} {base[key]:.2f} -> {now[key]:.2f}")
+        if base["rps"] and now["rps"] < base["rps"] * (1 - tolerance):
+            regressions.append(f"{label}: rps {base['rps']:.1f} -> {now['rps']:.1f}")
+        if now["error_rate"] > base["error_rate"] + ERROR_RATE_SLACK:
+            regressions.append(f"{label}: error_rate {base['error_rate']:.3f} -> {now['error_rate']:.3f}")
+    return regressions
+
+
+async def prepare(client: httpx.AsyncClient, mix: Dict[str, float], seed_users: int) -> str:
+    """Учетка нагрузки, ее токен и (для list) не меньше seed_users пользователей в списке."""
+    await client.post(f"{API}/", json={"username": LOAD_USERNAME, "password": LOAD_PASSWORD,
+                                       "email": f"{LOAD_USERNAME}@example.com"})
+    response = await client.post(f"{API}/login", data={"username": LOAD_USERNAME, "password": LOAD_PASSWORD})
+    response.raise_for_status()
+    token = response.json()["access_token"]
+
+    if "list" in mix and seed_users:
+        existing = await client.get(f"{API}/", params={"limit": 100})
+        missing = seed_users - len(existing.json())
+        if missing > 0:
+            prefix = uuid.uuid4().hex[:8]
+            rows = [{"username": f"seed_{prefix}_{i}", "password": LOAD_PASSWORD,
+                     "email": f"seed_{prefix}_{i}@example.com"} for i in range(missing)]
+            (await client.post(f"{API}/bulk", json=rows)).raise_for_status()
+    return token
+
+
+async def run_user(user: VirtualUser, mix: Dict[str, float], deadline: float) -> None:
+    scenarios = [SCENARIOS[name] for name in mix]
+    weights = list(mix.values())
+    while time.perf_counter() < deadline:
+        await user.random.choices(scenarios, weights)[0](user)
+
+
+async def run(mix: Dict[str, float], concurrency: int, duration: float, warmup: float,
+              url: Optional[str], seed_users: int, limit_factor: int = 1) -> dict:
+    if url is None:
+        from app.api.users import router as users_router
+        from app.main import app
+
+        for limiter in (users_router.login_limiter, users_router.me_user.limiter):
+            limiter.times *= limit_factor
+
+        def make_client(i: int) -> httpx.AsyncClient:
+            address = (f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}", 50000)
+            return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, client=address),
+                                     base_url="http://load")
+
+        lifespan = app.router.lifespan_context(app)
+    else:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        shared = httpx.AsyncClient(base_url=url, limits=limits, timeout=30)
+
+        def make_client(i: int) -> httpx.AsyncClient:
+            return shared
+
+        lifespan = None
+
+    if lifespan is not None:
+        await lifespan.__aenter__()
+    try:
+        clients = [make_client(i) for i in range(concurrency + 1)]
+        setup = clients.pop()
+        token = await prepare(setup, mix, seed_users)
+
+        started = time.perf_counter()
+        recorder = Recorder(measure_from=started + warmup)
+        users = [VirtualUser(client, recorder, token, seed=i) for i, client in enumerate(clients)]
+        await asyncio.gather(*(run_user(user, mix, started + warmup + duration) for user in users))
+        elapsed = time.perf_counter() - started - warmup
+
+        for client in {setup, *clients}:
+            await client.aclose()
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+
+    report = recorder.summary(elapsed)
+    report["config"] = {"scenario": mix, "concurrency": concurrency, "duration": duration,
+                        "warmup": warmup, "target": url or "asgi",
+                        "limit_factor": limit_factor if url is None else 1}
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scenario", type=parse_mix, default=parse_mix("me"),
+                        help="сценарии с весами: me=70,list=20,crud=10")
+    parser.add_argument("--concurrency", type=int, default=20, help="число виртуальных пользователей")
+    parser.add_argument("--duration", type=float, default=10.0, help="длительность замера, секунды")
+    parser.add_argument("--warmup", type=float, default=1.0, help="прогрев без замеров, секунды")
+    parser.add_argument("--url", help="адрес запущенного uvicorn; без него приложение поднимается в процессе")
+    parser.add_argument("--limit-factor", type=int, default=1,
+                        help="во сколько раз поднять лимиты /login и /me (только без --url)")
+    parser.add_argument("--seed-users", type=int, default=200, help="сколько пользователей нужно для list")
+    parser.add_argument("--output", help="записать отчет в файл, а не в stdout")
+    parser.add_argument("--save-baseline", help="сохранить отчет как базовый")
+    parser.add_argument("--baseline", help="сравнить с базовым отчетом")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимая деградация, доля")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.scenario, args.concurrency, args.duration, args.warmup,
+                             args.url, args.seed_users, args.limit_factor))
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as file:
+            file.write(text + "\n")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+"""Микробенчмарки кирпичиков, через которые проходит каждый запрос.
+
+    python -m benchmarks.micro
+    python -m benchmarks.micro --filter token
+    python -m benchmarks.micro --baseline benchmarks/baselines/micro.json
+    python -m benchmarks.micro --save-baseline benchmarks/baselines/micro.json
+
+Для каждого случая печатает время одного вызова (лучший из --repeat замеров,
+число вызовов в замере подбирается под --min-time) и сколько памяти вызов
+выделяет сверх уже занятой (пик tracemalloc, байты). С --baseline добавляет
+изменение относительно сохраненного прогона и завершается с кодом 1, если время
+или память выросли больше --tolerance. Базовый прогон в репозитории снят на одной
+машине: после изменения app/schemas/user.py или app/core/security сравнивайте
+с прогоном той же машины до изменения, а при обновлении baseline коммитьте его.
+
+Redis и БД не нужны: get_current_user разрешается через FastAPI с прогретыми
+локальными кэшами (токен проверен, пользователь в кэше воркера, фильтр отзывов
+синхронизирован), то есть это горячий путь /me без сетевых обращений.
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import AsyncExitStack
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import bcrypt
+from fastapi.dependencies.utils import get_dependant, solve_dependencies
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from starlette.requests import Request
+
+from app.api.deps import get_current_user
+from app.api.users.router import router as users_router
+from app.core.codecs import VersionedCodec
+from app.core.local_cache import user_local_cache
+from app.core.redis import InstrumentedRedis
+from app.core.redis_service import RedisCacheService
+from app.core.security.passwords import verify_password
+from app.core.security.revocations import revoked_tokens
+from app.core.security.tokens import create_access_token, decode_token
+from app.models.user import User
+from app.schemas.user import USER_CACHE_SCHEMA_VERSION, UserSchema, dump_users_json
+
+BCRYPT_ROUNDS = (4, 10, 12)
+LIST_PAGE = 50
+PASSWORD = "1q2w3e4r"
+
+
+class Case(NamedTuple):
+    name: str
+    func: Callable
+    is_async: bool = False
+
+
+def make_user() -> User:
+    return User(id=1, username="ivan_ivanov", email="ivan@example.com", password="x" * 60,
+                is_active=True, is_deleted=False, created_at=datetime(2026, 1, 1, 12, 0), version=1)
+
+
+def schema_cases() -> List[Case]:
+    user = make_user()
+    schema = UserSchema.model_validate(user)
+    return [
+        Case("schema.model_validate", lambda: UserSchema.model_validate(user)),
+        Case("schema.model_dump", lambda: schema.model_dump(mode="json")),
+        Case("schema.model_dump_json", lambda: schema.model_dump_json()),
+        Case("schema.from_orm+dump", lambda: UserSchema.model_validate(user).model_dump(mode="json")),
+    ]
+
+
+def list_response_cases() -> List[Case]:
+    """Тело страницы списка: путь FastAPI (валидация в response_model + JSONResponse) и dump_users_json."""
+    users = [User(id=i, username=f"user_{i}", email=f"user{i}@example.com", password="x" * 60,
+                  is_active=True, is_deleted=False, created_at=datetime(2026, 1, 1, 12, 0, i % 60), version=1)
+             for i in range(1, LIST_PAGE + 1)]
+    route = next(route for route in users_router.routes if route.path == "/" and "GET" in route.methods)
+
+    async def response_model_path():
+        return JSONResponse(await serialize_response(field=route.response_field, response_content=users)).body
+
+    return [
+        Case(f"list{LIST_PAGE}.response_model", response_model_path, is_async=True),
+        Case(f"list{LIST_PAGE}.dump_users_json", lambda: dump_users_json(users)),
+    ]
+
+
+def codec_cases() -> List[Case]:
+    data = UserSchema.model_validate(make_user()).model_dump(mode="json")
+    cases = []
+    for codec_name in ("orjson", "msgpack"):
+        try:
+            codec = VersionedCodec(codec_name, USER_CACHE_SCHEMA_VERSION)
+        except RuntimeError:
+            continue
+        payload = codec.encode(data)
+        cases += [
+            Case(f"codec.{codec_name}.encode", lambda codec=codec: codec.encode(data)),
+            Case(f"codec.{codec_name}.decode", lambda codec=codec, payload=payload: codec.decode(payload)),
+            Case(f"codec.{codec_name}.decode_json", lambda codec=codec, payload=payload: codec.decode_json(payload)),
+        ]
+    return cases
+
+
+def token_cases() -> List[Case]:
+    claims = {"sub": "ivan_ivanov", "id": 1}
+    token = create_access_token(claims)
+    return [
+        Case("token.create", lambda: create_access_token(claims)),
+        Case("token.decode", lambda: decode_token(token)),
+    ]
+
+
+def password_cases() -> List[Case]:
+    cases = []
+    for rounds in BCRYPT_ROUNDS:
+        hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+        cases += [
+            Case(f"bcrypt.hash.cost{rounds}",
+                 lambda rounds=rounds: bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds))),
+            Case(f"bcrypt.verify.cost{rounds}", lambda hashed=hashed: verify_password(PASSWORD, hashed)),
+        ]
+    return cases
+
+
+def dependency_cases() -> List[Case]:
+    data = UserSchema.model_validate(make_user()).model_dump(mode="json")
+    cache = RedisCacheService(InstrumentedRedis(), local_cache=user_local_cache)
+    user_local_cache.set(cache._get_user_key(f"user:{data['username']}"), cache.codec.encode(data))
+    revoked_tokens.synced = True
+
+    token = create_access_token({"sub": data["username"], "id": data["id"]})
+    app = SimpleNamespace(state=SimpleNamespace(redis_client=cache.client))
+    scope = {"type": "http", "method": "GET", "path": "/api/users/me", "query_string": b"", "app": app,
+             "headers": [(b"authorization", f"Bearer {token}".encode())]}
+    dependant = get_dependant(path="/api/users/me", call=get_current_user)
+
+    async def resolve():
+        async with AsyncExitStack() as stack:
+            request = Request({**scope, "fastapi_inner_astack": stack, "fastapi_function_astack": stack})
+            solved = await solve_dependencies(request=request, dependant=dependant,
+                                              async_exit_stack=stack, embed_body_fields=False)
+            return await get_current_user(**solved.values)
+
+    return [Case("deps.get_current_user", resolve, is_async=True)]
+
+
+GROUPS = {
+    "schema": schema_cases,
+    "list": list_response_cases,
+    "codec": codec_cases,
+    "token": token_cases,
+    "bcrypt": password_cases,
+    "deps": dependency_cases,
+}
+
+
+def _runner(case: Case, loop: asyncio.AbstractEventLoop) -> Callable[[int], float]:
+    """Функция, которая вызывает case number раз и возвращает затраченные наносекунды."""
+    if case.is_async:
+        async def batch(number: int) -> int:
+            started = time.perf_counter_ns()
+            for _ in range(number):
+                await case.func()
+            return time.perf_counter_ns() - started
+
+        return lambda number: loop.run_until_complete(batch(number))
+
+    def run(number: int) -> int:
+        func = case.func
+        started = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        return time.perf_counter_ns() - started
+
+    return run
+
+
+def measure(case: Case, loop: asyncio.AbstractEventLoop, repeat: int, min_time: float) -> dict:
+    run = _runner(case, loop)
+
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= min_time * 1e9 or number >= 1 << 24:
+            break
+        number = max(number * 2, int(number * min_time * 1e9 / max(elapsed, 1) * 1.2))
+
+    # Как timeit: сборщик мусора не вклинивается в замер времени
+    gc.disable()
+    try:
+        best = min(run(number) for _ in range(repeat)) / number
+    finally:
+        gc.enable()
+
+    calls = min(number, 20)
+    tracemalloc.start()
+    allocated = 0
+    for _ in range(calls):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        run(1)
+        allocated += tracemalloc.get_traced_memory()[1] - current
+    tracemalloc.stop()
+
+    return {"ns": best, "alloc_bytes": allocated // calls, "number": number}
+
+
+def format_time(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} µs"
+    return f"{ns:.0f} ns"
+
+
+def compare(current: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    regressions = []
+    for name, now in current.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if now["ns"] > base["ns"] * (1 + tolerance):
+            regressions.append(f"{name}: {format_time(base['ns'])} -> {format_time(now['ns'])}")
+        # Небольшой допуск в байтах: tracemalloc учитывает и выравнивание аллокатора
+        if now["alloc_bytes"] > base["alloc_bytes"] * (1 + tolerance) + 64:
+            regressions.append(f"{name}: alloc {base['alloc_bytes']} B -> {now['alloc_bytes']} B")
+    return regressions
+
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", default="", help="только случаи, в имени которых есть подстрока")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.1, help="минимальная длительность замера, секунды")
+    parser.add_argument("--save-baseline", help="сохранить результаты как базовые")
+    parser.add_argument("--baseline", help="сравнить с базовыми результатами")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимый рост времени и памяти, доля")
+    args = parser.parse_args()
+
+    baseline: Optional[dict] = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        if baseline.get("environment") != environment():
+            print(f"baseline снят в другом окружении: {baseline.get('environment')}", file=sys.stderr)
+
+    loop = asyncio.new_event_loop()
+    results: Dict[str, dict] = {}
+    print(f"{'case':<32}{'time':>12}{'alloc':>10}{'vs baseline':>14}")
+    for build in GROUPS.values():
+        for case in build():
+            if args.filter not in case.name:
+                continue
+            row = results[case.name] = measure(case, loop, args.repeat, args.min_time)
+            delta = ""
+            if baseline is not None and case.name in baseline["results"]:
+                delta = f"{row['ns'] / baseline['results'][case.name]['ns'] - 1:+.1%}"
+            print(f"{case.name:<32}{format_time(row['ns']):>12}{row['alloc_bytes']:>8} B{delta:>14}")
+    loop.close()
+
+    if args.save_baseline:
+        saved = results
+        if args.filter and os.path.exists(args.save_baseline):
+            # С --filter обновляются только замеренные случаи, остальные берутся из файла
+            with open(args.save_baseline) as file:
+                saved = {**json.load(file)["results"], **results}
+        with open(args.save_baseline, "w") as file:
+            json.dump({"environment": environment(), "results": saved}, file, indent=2)
+            file.write("\n")
+
+    if baseline is not None:
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""Сколько Python-времени уходит на подготовку SQL одного запроса UserRepo.
+
+    python -m benchmarks.repo_statements --number 20000
+
+Для каждого горячего запроса сравнивает старый способ (select() собирается на
+каждом вызове) с готовыми выражениями из app.repositories.user_repo. Считается
+то, что SQLAlchemy делает до отправки запроса в asyncpg: сборка конструкции,
+ключ кэша компиляции и поиск в кэше (как в Connection.execute). БД не нужна,
+диалект берется у движка приложения.
+
+Колонки: build+compile — старый способ с кэшем компиляции, prebuilt — готовое
+выражение с тем же кэшем, no cache — компиляция готового выражения с нуля
+(столько стоил бы каждый вызов, если бы кэш все время промахивался).
+"""
+import argparse
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, or_
+
+from app.core.database import engine
+from app.models.user import User
+from app.repositories import user_repo
+
+
+# Запросы в том виде, в каком их строил UserRepo до готовых выражений
+def legacy_get_list(skip: int = 0, limit: int = 10, show_deleted: bool = False,
+                    show_active: bool = True, after_id: Optional[int] = None):
+    query = select(User).limit(limit).order_by(User.id)
+    if after_id is not None:
+        query = query.where(User.id > after_id)
+    else:
+        query = query.offset(skip)
+    if not show_deleted:
+        query = query.where(User.is_deleted == False)
+    if not show_active:
+        query = query.where(User.is_active == False)
+    return query
+
+
+def legacy_get_user_by_id(user_id: int, only_deleted: bool = False, only_active: bool = False):
+    query = select(User).where(User.id == user_id)
+    if only_deleted:
+        query = query.where(User.is_deleted == True)
+    elif only_active:
+        query = query.where(User.is_active == True)
+    return query
+
+
+def legacy_get_user_by_username(username: str):
+    return select(User).where(User.username == username)
+
+
+def legacy_check_existing_user(username: str, email: str):
+    return select(User).where(or_(User.username == username, User.email == email))
+
+
+CASES: List[Tuple[str, Callable, object]] = [
+    ("get_user_by_id", lambda: legacy_get_user_by_id(42), user_repo._BY_ID),
+    ("get_user_by_id(only_active)", lambda: legacy_get_user_by_id(42, only_active=True), user_repo._BY_ID_ACTIVE),
+    ("get_user_by_username", lambda: legacy_get_user_by_username("ivan_ivanov"), user_repo._BY_USERNAME),
+    # Проверка перед созданием: раньше check_existing_user, теперь get_taken_credentials
+    ("check_existing_user", lambda: legacy_check_existing_user("ivan_ivanov", "ivan@example.com"),
+     user_repo._TAKEN_CREDENTIALS),
+    ("get_list(offset)", lambda: legacy_get_list(skip=20), user_repo._LIST_BY_OFFSET[False, True]),
+    ("get_list(after_id)", lambda: legacy_get_list(after_id=20), user_repo._LIST_AFTER_ID[False, True]),
+    ("get_list(show_deleted)", lambda: legacy_get_list(skip=20, show_deleted=True),
+     user_repo._LIST_BY_OFFSET[True, True]),
+]
+
+
+def compile_cached(statement, cache: Dict) -> None:
+    # Тот же вызов, что делает Connection._execute_clauseelement
+    statement._compile_w_cache(engine.dialect, compiled_cache=cache, column_keys=[],
+                               for_executemany=False, schema_translate_map=None)
+
+
+def per_call_us(func: Callable[[], None], number: int) -> float:
+    func()
+    started = time.perf_counter()
+    for _ in range(number):
+        func()
+    return (time.perf_counter() - started) / number * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'query':<30}{'build+compile':>15}{'prebuilt':>12}{'no cache':>12}{'speedup':>10}")
+    for name, build, prebuilt in CASES:
+        cache: Dict = {}
+        legacy = per_call_us(lambda: compile_cached(build(), cache), args.number)
+        cached = per_call_us(lambda: compile_cached(prebuilt, cache), args.number)
+        uncached = per_call_us(lambda: prebuilt.compile(dialect=engine.dialect), max(1, args.number // 20))
+        print(f"{name:<30}{legacy:>12.1f} µs{cached:>9.1f} µs{uncached:>9.1f} µs{legacy / cached:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
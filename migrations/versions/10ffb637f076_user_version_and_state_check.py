@@ -0,0 +1,53 @@
+"""user version and state check
+
+Revision ID: 10ffb637f076
+Revises: 7cf63472ac28
+Create Date: 2026-10-18 16:02:47.530918
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '10ffb637f076'
+down_revision: Union[str, Sequence[str], None] = '7cf63472ac28'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATE_CHECK = 'NOT (is_active = true AND is_deleted = true) OR (is_active = false)'
+
+
+def _check_state_violations() -> None:
+    # VALIDATE runs after autocommit_block has committed the column and the NOT VALID
+    # constraint, so a violation found there would leave the upgrade half-applied.
+    violations = op.get_bind().execute(sa.text(
+        f"SELECT id FROM users WHERE NOT ({STATE_CHECK}) ORDER BY id LIMIT 5"
+    )).scalars().all()
+    if violations:
+        raise RuntimeError("users rows are both active and deleted, fix is_active/is_deleted "
+                           f"before upgrading: ids {violations}")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not op.get_context().as_sql:
+        _check_state_violations()
+
+    # A constant default makes ADD COLUMN a catalog-only change, no table rewrite.
+    op.add_column('users', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    # The model has always had this check, but no revision created it. NOT VALID takes
+    # the lock only briefly; VALIDATE, in its own transaction, scans without blocking writes.
+    op.create_check_constraint('check_user_active_deleted_logic', 'users', STATE_CHECK,
+                               postgresql_not_valid=True)
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE users VALIDATE CONSTRAINT check_user_active_deleted_logic')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('check_user_active_deleted_logic', 'users', type_='check')
+    op.drop_column('users', 'version')
@@ -0,0 +1,75 @@
+"""unique and covering user indexes
+
+Revision ID: 7cf63472ac28
+Revises: bfe002cbe934
+Create Date: 2026-10-18 14:36:05.214771
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7cf63472ac28'
+down_revision: Union[str, Sequence[str], None] = 'bfe002cbe934'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = ('ix_users_username', 'ix_users_email', 'ix_users_created_at')
+
+
+def _check_duplicates(column: str) -> None:
+    # A unique index can't be built over duplicates; CONCURRENTLY would fail only
+    # after a full scan and leave an INVALID index behind.
+    duplicates = op.get_bind().execute(sa.text(
+        f"SELECT {column} FROM users GROUP BY {column} HAVING count(*) > 1 LIMIT 5"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"users.{column} has duplicates, resolve them before upgrading: {duplicates}")
+
+
+def _drop_invalid_indexes() -> None:
+    # Leftovers of an interrupted CREATE INDEX CONCURRENTLY are INVALID but still
+    # "exist", so IF NOT EXISTS would skip them.
+    invalid = op.get_bind().execute(sa.text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid AND c.relname = ANY(:names)"
+    ), {"names": list(INDEXES)}).scalars().all()
+    for name in invalid:
+        op.drop_index(name, table_name='users', postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # The model has always declared these indexes, but no revision created them, so
+    # logins and uniqueness checks were full scans. ix_users_username is both the
+    # uniqueness index and the covering index for the login lookup (index-only scan).
+    if not op.get_context().as_sql:
+        _check_duplicates('username')
+        _check_duplicates('email')
+
+    with op.get_context().autocommit_block():
+        if not op.get_context().as_sql:
+            _drop_invalid_indexes()
+        op.create_index('ix_users_username', 'users', ['username'],
+                        unique=True,
+                        postgresql_include=['id', 'password', 'is_active', 'is_deleted'],
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_users_email', 'users', ['email'],
+                        unique=True,
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_users_created_at', 'users', ['created_at'],
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in reversed(INDEXES):
+            op.drop_index(name, table_name='users',
+                          postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,42 @@
+"""keyset pagination indexes
+
+Revision ID: bfe002cbe934
+Revises: 04bdd869e5be
+Create Date: 2026-10-18 10:12:41.305117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bfe002cbe934'
+down_revision: Union[str, Sequence[str], None] = '04bdd869e5be'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Partial indexes match the list filters, so "WHERE id > :after_id ... ORDER BY id LIMIT n"
+    # is an index range scan whatever the page depth. CONCURRENTLY can't run inside a transaction.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_users_id_not_deleted', 'users', ['id'],
+                        postgresql_where=sa.text('is_deleted = false'),
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+        op.create_index('ix_users_id_inactive', 'users', ['id'],
+                        postgresql_where=sa.text('is_active = false'),
+                        postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_id_inactive', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_id_not_deleted', table_name='users',
+                      postgresql_concurrently=True, if_exists=True)
@@ -2,6 +2,8 @@ import os
 
 os.environ.setdefault("PYTEST", "1")
 
+from contextlib import contextmanager
+
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient, ASGITransport
@@ -10,6 +12,10 @@ from app.core.config import settings
 from app.core.database import get_db
 from app.core.redis import get_redis_service, get_redis_client
 from app.core.redis_service import RedisCacheService
+from app.core.local_cache import user_local_cache
+from app.core.query_stats import collect_queries
+from app.core.security.revocations import revoked_tokens
+from app.core.security.tokens import verified_tokens
 from app.models.user import Base
 from app.main import app
 
@@ -54,8 +60,7 @@ async def redis_client():
     import redis.asyncio as redis
     pool = redis.ConnectionPool.from_url(
         f"redis://{settings.REDIS_HOST}:{settings.REDIS_PORT}",
-        encoding="utf-8",
-        decode_responses=True
+        decode_responses=False
     )
     client = redis.Redis(connection_pool=pool)
 
@@ -67,6 +72,9 @@ async def redis_client():
 async def flush_redis(redis_client):
     yield
     await redis_client.flushdb()
+    user_local_cache.clear()
+    verified_tokens.clear()
+    revoked_tokens.invalidate()
 
 @pytest_asyncio.fixture
 async def client(db_session, redis_client):
@@ -86,3 +94,42 @@ async def client(db_session, redis_client):
         yield ac
 
     app.dependency_overrides.clear()
+
+
+@pytest.fixture
+def max_round_trips():
+    """with max_round_trips(n): ... — тест падает, если блок обратился к БД больше n раз."""
+    @contextmanager
+    def check(limit: int):
+        with collect_queries() as stats:
+            yield stats
+        assert stats.round_trips <= limit, (
+            f"{stats.round_trips} обращений к БД при бюджете {limit} "
+            f"({stats.statements} выражений, {stats.transactions} BEGIN/COMMIT/ROLLBACK); "
+            f"самый медленный: {stats.slowest_statement}"
+        )
+    return check
+
+
+@pytest.fixture
+def create_user(client):
+    """await create_user("ivan") — создает пользователя через API и возвращает его id."""
+    async def create(username: str) -> int:
+        response = await client.post(
+            "/api/users/",
+            json={"username": username, "password": "pass1234", "email": f"{username}@example.com"},
+        )
+        assert response.status_code == 201
+        return response.json()["id"]
+    return create
+
+
+@pytest.fixture
+def login(client, create_user):
+    """await login("ivan") — создает пользователя и возвращает его access token."""
+    async def do_login(username: str) -> str:
+        await create_user(username)
+        response = await client.post("/api/users/login", data={"username": username, "password": "pass1234"})
+        assert response.status_code == 201
+        return response.json()["access_token"]
+    return do_login
@@ -0,0 +1,46 @@
+import pytest
+from prometheus_client import REGISTRY
+from sqlalchemy import text
+
+from app.core.config import settings
+from app.core.database import InstrumentedNullPool, InstrumentedQueuePool, make_engine, pool_limits
+
+
+def test_pool_limits_split_budget_between_workers():
+    assert pool_limits(budget=60, workers=6, overflow_fraction=0.25) == (8, 2)
+    assert pool_limits(budget=20, workers=1, overflow_fraction=0) == (20, 0)
+    # Бюджета не хватает даже по одному соединению: воркер все равно получает одно
+    assert pool_limits(budget=4, workers=6, overflow_fraction=0.25) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_engine_pool_is_sized_from_budget(monkeypatch):
+    monkeypatch.setattr(settings, "DB_CONNECTION_BUDGET", 12)
+    monkeypatch.setattr(settings, "WEB_CONCURRENCY", 3)
+    engine = make_engine(settings.DATABASE_URL, "budget_test")
+
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    assert engine.pool.size() + engine.pool._max_overflow == 4
+    assert REGISTRY.get_sample_value("db_pool_limit", {"pool": "budget_test", "kind": "size"}) == 3
+
+    async with engine.connect() as conn:
+        assert await conn.scalar(text("SELECT 1")) == 1
+    assert REGISTRY.get_sample_value("db_pool_wait_seconds_count", {"pool": "budget_test"}) == 1
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "budget_test"}) == 0
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pgbouncer_mode_uses_null_pool_without_statement_cache(monkeypatch):
+    monkeypatch.setattr(settings, "DB_PGBOUNCER", True)
+    engine = make_engine(settings.DATABASE_URL, "pgbouncer_test")
+    assert isinstance(engine.pool, InstrumentedNullPool)
+
+    for _ in range(2):
+        async with engine.connect() as conn:
+            assert await conn.scalar(text("SELECT 1")) == 1
+            raw = await conn.get_raw_connection()
+            assert raw.driver_connection._config.statement_cache_size == 0
+    assert REGISTRY.get_sample_value("db_pool_checked_out", {"pool": "pgbouncer_test"}) == 0
+    assert REGISTRY.get_sample_value("db_pool_wait_seconds_count", {"pool": "pgbouncer_test"}) == 2
+    await engine.dispose()
@@ -0,0 +1,43 @@
+from benchmarks.load import Recorder, compare, parse_mix, percentile
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7.0], 95) == 7
+    assert percentile([], 50) == 0
+
+
+def test_rate_limited_responses_are_not_errors():
+    recorder = Recorder()
+    recorder.record("me", 0.01, 200, ok=True)
+    recorder.record("me", 0.01, 429, ok=False)
+    recorder.record("me", 0.01, 500, ok=False)
+    recorder.record("me", 0.01, None, ok=False)
+
+    row = recorder.summary(elapsed=1.0)["requests"]["me"]
+    assert row["count"] == 4
+    assert row["error_rate"] == 0.5
+    assert row["rate_limited"] == 0.25
+    assert row["statuses"] == {"200": 1, "429": 1, "500": 1, "connection_error": 1}
+
+
+def test_compare_flags_only_degradation_beyond_tolerance():
+    recorder = Recorder()
+    for _ in range(10):
+        recorder.record("list", 0.010, 200, ok=True)
+    baseline = recorder.summary(elapsed=1.0)
+
+    assert compare(baseline, baseline, tolerance=0.2) == []
+
+    slower = Recorder()
+    for _ in range(10):
+        slower.record("list", 0.015, 200, ok=True)
+    regressions = compare(slower.summary(elapsed=1.0), baseline, tolerance=0.2)
+    assert any(line.startswith("list: p95_ms") for line in regressions)
+    assert any(line.startswith("total: p99_ms") for line in regressions)
+
+
+def test_parse_mix_defaults_weight_to_one():
+    assert parse_mix("me=70,list=20,crud") == {"me": 70.0, "list": 20.0, "crud": 1.0}
@@ -0,0 +1,46 @@
+import pytest
+from httpx import AsyncClient
+from prometheus_client import REGISTRY
+
+
+def _sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_exposes_prometheus_text(client: AsyncClient):
+    await client.get("/health")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "http_request_duration_seconds_bucket" in response.text
+    assert "db_pool_checked_out" in response.text
+
+
+@pytest.mark.asyncio
+async def test_request_latency_is_labelled_by_route_template(client: AsyncClient):
+    before = _sample("http_request_duration_seconds_count",
+                     method="GET", route="/api/users/{user_id}", status="404")
+
+    await client.get("/api/users/987654")
+    await client.get("/api/users/987655")
+
+    after = _sample("http_request_duration_seconds_count",
+                    method="GET", route="/api/users/{user_id}", status="404")
+    assert after - before == 2
+    assert _sample("http_requests_in_flight", method="GET", route="/api/users/{user_id}") == 0
+
+
+@pytest.mark.asyncio
+async def test_user_cache_hits_are_labelled_by_key_type(client: AsyncClient):
+    created = await client.post(
+        "/api/users/",
+        json={"username": "metered", "password": "pass1234", "email": "metered@example.com"},
+    )
+    user_id = created.json()["id"]
+    await client.get(f"/api/users/{user_id}")
+
+    before = _sample("user_cache_hits_total", key_type="id", tier="local")
+    await client.get(f"/api/users/{user_id}")
+    assert _sample("user_cache_hits_total", key_type="id", tier="local") - before == 1
@@ -0,0 +1,16 @@
+import pytest
+
+from benchmarks.micro import GROUPS
+
+
+@pytest.mark.asyncio
+async def test_every_micro_benchmark_case_runs():
+    # Дорогие стоимости bcrypt пропускаем: здесь важно только, что случаи не сломались
+    cases = [case for build in GROUPS.values() for case in build() if not case.name.endswith(("cost10", "cost12"))]
+    assert cases
+
+    for case in cases:
+        result = case.func()
+        if case.is_async:
+            result = await result
+        assert result is not None, case.name
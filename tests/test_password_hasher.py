@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.exceptions import ServiceOverloadedError
+from app.core.security.passwords import PasswordHasher
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_hashes_and_verifies():
+    hasher = PasswordHasher(max_workers=2, max_queue=2)
+    try:
+        hashed = await hasher.hash("secret123")
+        assert await hasher.verify("secret123", hashed) is True
+        assert await hasher.verify("wrong", hashed) is False
+    finally:
+        await hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_rejects_when_queue_is_full():
+    hasher = PasswordHasher(max_workers=1, max_queue=0)
+    try:
+        results = await asyncio.gather(hasher.hash("first123"),
+                                       hasher.hash("second123"),
+                                       return_exceptions=True)
+        assert isinstance(results[0], str)
+        assert isinstance(results[1], ServiceOverloadedError)
+        assert results[1].status_code == 503
+        assert hasher.queue_depth == 0
+    finally:
+        await hasher.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_shutdown_does_not_block_event_loop():
+    hasher = PasswordHasher(max_workers=1, max_queue=1)
+    in_flight = asyncio.create_task(hasher._run(time.sleep, 0.3))
+    await asyncio.sleep(0.05)
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    await hasher.shutdown()
+    ticker.cancel()
+
+    assert in_flight.done()
+    # Пока пул дожидался задачи, loop продолжал крутиться
+    assert ticks >= 10
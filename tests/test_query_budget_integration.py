@@ -0,0 +1,98 @@
+import asyncio
+import logging
+import time
+
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.core.config import settings
+from app.core.query_stats import collect_queries
+
+
+@pytest.mark.asyncio
+async def test_create_user_round_trip_budget(client: AsyncClient, max_round_trips):
+    # Проверка занятости и INSERT ... RETURNING, оба вне транзакции
+    with max_round_trips(2):
+        response = await client.post(
+            "/api/users/",
+            json={"username": "budget_create", "password": "pass1234", "email": "budget_create@example.com"},
+        )
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_update_user_round_trip_budget(client: AsyncClient, max_round_trips, create_user):
+    user_id = await create_user("budget_update")
+
+    # Один UPDATE ... RETURNING: конфликты ловит уникальный индекс, BEGIN/COMMIT не нужны
+    with max_round_trips(1):
+        response = await client.patch(f"/api/users/{user_id}", json={"username": "budget_renamed"})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_cached_get_does_not_touch_db(client: AsyncClient, max_round_trips, create_user):
+    user_id = await create_user("budget_cached")
+    await client.get(f"/api/users/{user_id}")
+
+    with max_round_trips(0):
+        response = await client.get(f"/api/users/{user_id}")
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header_reports_db_round_trips(client: AsyncClient, create_user):
+    user_id = await create_user("budget_timing")
+
+    response = await client.patch(f"/api/users/{user_id}", json={"is_active": False})
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("db;dur=")
+    # один UPDATE ... RETURNING вне транзакции
+    assert 'desc="1 round trips"' in response.headers["server-timing"]
+
+
+@pytest.mark.asyncio
+async def test_streaming_response_logs_db_round_trips_instead_of_header(client: AsyncClient, caplog, create_user):
+    await create_user("budget_export")
+
+    with caplog.at_level(logging.INFO, logger="app.api.middleware"):
+        response = await client.get("/api/users/export")
+    assert response.status_code == 200
+    # Заголовки ушли до выборки, честного числа в Server-Timing там быть не может
+    assert "server-timing" not in response.headers
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "app.api.middleware"]
+    assert len(messages) == 1
+    assert messages[0].startswith("GET /api/users/export: db;dur=")
+    assert 'desc="0 round trips"' not in messages[0]
+
+
+@pytest.mark.asyncio
+async def test_failed_statement_does_not_skew_next_timing(engine):
+    async with engine.connect() as conn:
+        with pytest.raises(DBAPIError):
+            await conn.execute(text("SELECT 1 / 0"))
+        await conn.rollback()
+        # Если бы старт упавшего выражения остался висеть, в замер попала бы и эта пауза
+        await asyncio.sleep(0.2)
+
+        with collect_queries() as stats:
+            started = time.perf_counter()
+            await conn.execute(text("SELECT 1"))
+            elapsed = time.perf_counter() - started
+    assert stats.statements == 1
+    assert stats.seconds <= elapsed
+
+
+@pytest.mark.asyncio
+async def test_slow_query_log_redacts_parameters(client: AsyncClient, monkeypatch, caplog, create_user):
+    monkeypatch.setattr(settings, "SLOW_QUERY_MS", 0)
+
+    with caplog.at_level(logging.WARNING, logger="app.core.query_stats"):
+        await create_user("budget_secret_name")
+
+    messages = [record.getMessage() for record in caplog.records if record.name == "app.core.query_stats"]
+    assert any("INSERT INTO users" in message for message in messages)
+    assert not any("budget_secret_name" in message for message in messages)
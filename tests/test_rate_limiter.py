@@ -0,0 +1,156 @@
+import time
+
+import pytest
+from httpx import AsyncClient
+from jose import jwt
+
+from app.api.users.router import me_user
+from app.core.config import settings
+from app.core.limiter import STRATEGIES, LocalRateLimits, RateLimiter
+
+START_MS = 1_700_000_000_000
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", sorted(STRATEGIES))
+async def test_strategy_allows_limit_then_rejects(redis_client, strategy):
+    engine = STRATEGIES[strategy]
+
+    results = [await engine.hit(redis_client, f"rl:{strategy}", times=3, seconds=60) for _ in range(4)]
+
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert [result.remaining for result in results[:3]] == [2, 1, 0]
+    assert 0 < results[3].retry_after_ms <= 60_000
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("strategy", ["sliding_window", "gcra"])
+async def test_no_double_burst_at_window_edge(redis_client, strategy):
+    engine = STRATEGIES[strategy]
+    for _ in range(3):
+        assert (await engine.hit(redis_client, "rl:edge", times=3, seconds=60, now_ms=START_MS + 59_000)).allowed
+
+    # Для фиксированного окна здесь начиналось бы новое окно и еще 3 запроса
+    result = await engine.hit(redis_client, "rl:edge", times=3, seconds=60, now_ms=START_MS + 61_000)
+    assert not result.allowed
+
+
+@pytest.mark.asyncio
+async def test_gcra_refills_gradually(redis_client):
+    engine = STRATEGIES["gcra"]
+    for _ in range(3):
+        await engine.hit(redis_client, "rl:gcra", times=3, seconds=60, now_ms=START_MS)
+
+    later = START_MS + 20_000
+    assert (await engine.hit(redis_client, "rl:gcra", times=3, seconds=60, now_ms=later)).allowed
+    assert not (await engine.hit(redis_client, "rl:gcra", times=3, seconds=60, now_ms=later)).allowed
+
+
+@pytest.mark.asyncio
+async def test_script_is_reloaded_after_noscript(redis_client):
+    await redis_client.script_flush()
+
+    result = await STRATEGIES["fixed_window"].hit(redis_client, "rl:flushed", times=1, seconds=60)
+
+    assert result.allowed
+    assert (await redis_client.script_exists(STRATEGIES["fixed_window"].script.sha)) == [True]
+
+
+@pytest.mark.asyncio
+async def test_me_returns_rate_limit_headers(client: AsyncClient):
+    await client.post(
+        "/api/users/",
+        json={"username": "limited", "password": "pass1234", "email": "limited@example.com"},
+    )
+    login = await client.post("/api/users/login", data={"username": "limited", "password": "pass1234"})
+    token = login.json()["access_token"]
+    assert login.headers["X-RateLimit-Limit"] == "10"
+
+    response = await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Limit"] == "20"
+    assert response.headers["X-RateLimit-Remaining"] == "19"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["exact", "approximate"])
+async def test_bad_tokens_on_me_count_towards_limit(client: AsyncClient, monkeypatch, mode):
+    monkeypatch.setattr(me_user, "limiter", RateLimiter(times=3, seconds=60, mode=mode))
+    expired = jwt.encode({"sub": "nobody", "exp": int(time.time()) - 60}, settings.SECRET_KEY,
+                         algorithm=settings.ALGORITHM)
+
+    statuses = []
+    for token in ("not-a-jwt", expired, "not-a-jwt", expired):
+        response = await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+        statuses.append(response.status_code)
+    assert statuses == [401, 401, 401, 429]
+
+
+@pytest.mark.asyncio
+async def test_login_over_limit_returns_retry_after(client: AsyncClient):
+    for _ in range(10):
+        await client.post("/api/users/login", data={"username": "nobody", "password": "pass1234"})
+
+    response = await client.post("/api/users/login", data={"username": "nobody", "password": "pass1234"})
+    assert response.status_code == 429
+    assert response.json()["error"] == "TooManyRequestsError"
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.headers["X-RateLimit-Remaining"] == "0"
+
+
+def test_limiter_key_includes_strategy():
+    assert RateLimiter(times=1, seconds=1, strategy="gcra").strategy.name == "gcra"
+
+
+@pytest.mark.asyncio
+async def test_approximate_mode_stays_off_redis_under_limit(redis_client):
+    counters = LocalRateLimits(flush_interval_ms=100, flush_hits=10)
+
+    for _ in range(3):
+        assert counters.hit(redis_client, "rate_limit:ip:/me", times=5, seconds=60, now_ms=START_MS).allowed
+    assert await redis_client.keys("rate_limit:*") == []
+
+    await counters.flush(redis_client, now_ms=START_MS)
+    window = START_MS // 60_000
+    assert await redis_client.get(f"rate_limit:ip:/me:{window}") == b"3"
+
+
+@pytest.mark.asyncio
+async def test_approximate_mode_rejects_locally_over_limit(redis_client):
+    counters = LocalRateLimits(flush_interval_ms=100, flush_hits=100)
+
+    results = [counters.hit(redis_client, "rate_limit:ip:/me", times=2, seconds=60, now_ms=START_MS)
+               for _ in range(3)]
+
+    assert [result.allowed for result in results] == [True, True, False]
+    assert results[2].retry_after_ms > 0
+
+
+@pytest.mark.asyncio
+async def test_approximate_mode_sees_other_workers_after_sync(redis_client):
+    first = LocalRateLimits(flush_interval_ms=100, flush_hits=100)
+    second = LocalRateLimits(flush_interval_ms=100, flush_hits=100)
+
+    for _ in range(4):
+        first.hit(redis_client, "rate_limit:ip:/me", times=5, seconds=60, now_ms=START_MS)
+    await first.flush(redis_client, now_ms=START_MS)
+
+    assert second.hit(redis_client, "rate_limit:ip:/me", times=5, seconds=60, now_ms=START_MS).allowed
+    await second.flush(redis_client, now_ms=START_MS)
+    assert not second.hit(redis_client, "rate_limit:ip:/me", times=5, seconds=60, now_ms=START_MS).allowed
+
+
+@pytest.mark.asyncio
+async def test_approximate_mode_weights_previous_window(redis_client):
+    counters = LocalRateLimits(flush_interval_ms=100, flush_hits=100)
+    window_start = (START_MS // 60_000 + 1) * 60_000
+
+    for _ in range(4):
+        counters.hit(redis_client, "rate_limit:ip:/me", times=4, seconds=60, now_ms=window_start - 1_000)
+
+    # Через 15 с после начала окна от прошлых 4 хитов остается вес 3
+    assert counters.hit(redis_client, "rate_limit:ip:/me", times=4, seconds=60, now_ms=window_start + 15_000).allowed
+    assert not counters.hit(redis_client, "rate_limit:ip:/me", times=4, seconds=60, now_ms=window_start + 15_000).allowed
+
+    await counters.flush(redis_client, now_ms=window_start + 15_000)
+    assert await redis_client.get(f"rate_limit:ip:/me:{window_start // 60_000 - 1}") == b"4"
@@ -0,0 +1,72 @@
+import pytest
+import pytest_asyncio
+
+from app.core.config import settings
+from app.core.database import Replica, ReplicaRouter, async_session_maker, make_engine
+from app.core.redis_service import RedisCacheService
+from app.schemas.user import UserCreate, UserUpdate
+from app.service.users import UserService
+
+UNREACHABLE_URL = "postgresql+asyncpg://postgres@127.0.0.1:1/test_db"
+
+
+@pytest_asyncio.fixture
+async def replicas():
+    # Роль реплики играет та же тестовая БД: она не в recovery, значит отставание 0
+    created = [Replica("replica0", make_engine(settings.DATABASE_URL, "replica0")),
+               Replica("replica1", make_engine(settings.DATABASE_URL, "replica1"))]
+    yield created
+    for replica in created:
+        await replica.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_primary_until_replicas_are_checked(replicas):
+    router = ReplicaRouter(async_session_maker, replicas, max_lag_seconds=5)
+    assert router.reader() is async_session_maker
+
+    await router.check()
+    assert [replica.lag for replica in replicas] == [0, 0]
+    assert {router.reader(), router.reader()} == {replica.session_maker for replica in replicas}
+
+
+@pytest.mark.asyncio
+async def test_unreachable_or_lagging_replica_falls_back_to_primary(replicas):
+    broken = Replica("broken", make_engine(UNREACHABLE_URL, "broken"))
+    router = ReplicaRouter(async_session_maker, [broken, replicas[0]], max_lag_seconds=5)
+
+    await router.check(timeout=2)
+    assert not broken.healthy
+    assert {router.reader() for _ in range(4)} == {replicas[0].session_maker}
+
+    lagging = ReplicaRouter(async_session_maker, [replicas[0]], max_lag_seconds=-1)
+    await lagging.check()
+    assert lagging.reader() is async_session_maker
+    await broken.engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_own_writes_are_read_from_primary(replicas, redis_client, prepare_db):
+    router = ReplicaRouter(async_session_maker, replicas[:1], max_lag_seconds=5)
+    await router.check()
+    service = UserService(async_session_maker, RedisCacheService(redis_client), replicas=router)
+
+    user = await service.create_user(UserCreate(username="ryw_user", password="pass1234", email="ryw@example.com"))
+    assert await service._reader(user.id) is async_session_maker
+    assert await service._reader("user:ryw_user") is async_session_maker
+    assert await service._reader(user.id + 1000) is replicas[0].session_maker
+    assert await service._reader() is replicas[0].session_maker
+
+    await redis_client.flushdb()
+    await service.update_user(UserUpdate(username="ryw_renamed"), user.id)
+    assert await service._reader(user.id) is async_session_maker
+    assert await service._reader("user:ryw_user") is async_session_maker
+    assert await service._reader("user:ryw_renamed") is async_session_maker
+
+
+@pytest.mark.asyncio
+async def test_without_replicas_no_write_markers_are_set(redis_client, prepare_db):
+    service = UserService(async_session_maker, RedisCacheService(redis_client))
+
+    await service.create_user(UserCreate(username="no_replicas", password="pass1234", email="norep@example.com"))
+    assert await redis_client.keys("written:*") == []
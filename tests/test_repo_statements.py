@@ -0,0 +1,52 @@
+import pytest
+from sqlalchemy import event
+
+from app.models.user import User
+from app.repositories.user_repo import UserRepo
+from benchmarks.repo_statements import CASES, compile_cached
+
+
+@pytest.mark.asyncio
+async def test_repo_queries_keep_one_sql_text_per_filter_variant(db_session, engine):
+    db_session.add_all([User(username=f"user_{i}", email=f"user{i}@example.com", password="x" * 60,
+                             is_active=i % 2 == 0, is_deleted=False)
+                        for i in range(1, 7)])
+    await db_session.flush()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        repo = UserRepo(db_session)
+        first = await repo.get_user_by_id(2)
+        second = await repo.get_user_by_id(4, only_active=True)
+        inactive = await repo.get_user_by_id(3, only_active=True)
+        by_username = await repo.get_user_by_username("user_5")
+        page = await repo.get_list(skip=1, limit=2)
+        next_page = await repo.get_list(limit=2, after_id=page[-1].id)
+        inactive_page = await repo.get_list(limit=10, show_active=False)
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+    assert (first.username, second.username, by_username.username) == ("user_2", "user_4", "user_5")
+    assert inactive is None
+    assert [user.username for user in page] == ["user_2", "user_3"]
+    assert [user.username for user in next_page] == ["user_4", "user_5"]
+    assert [user.username for user in inactive_page] == ["user_1", "user_3", "user_5"]
+
+    # Значения уходят параметрами: текст запроса зависит только от варианта фильтров
+    assert len(statements) == 7
+    assert len(set(statements)) == 6
+    assert statements[0] != statements[1]
+
+
+def test_every_repo_statement_benchmark_case_compiles():
+    cache = {}
+    for name, build, prebuilt in CASES:
+        compile_cached(build(), cache)
+        compile_cached(prebuilt, cache)
+    # По одной записи в кэше на старую и на готовую форму каждого запроса
+    assert len(cache) <= 2 * len(CASES)
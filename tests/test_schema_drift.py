@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.core.schema_drift import check_indexes, index_drift
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.asyncio
+async def test_schema_from_model_has_no_index_drift(engine, prepare_db):
+    async with engine.connect() as conn:
+        assert await conn.run_sync(index_drift) == []
+
+
+@pytest.mark.asyncio
+async def test_index_drift_is_reported_and_fails_startup(engine, prepare_db):
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP INDEX ix_users_username"))
+        await conn.execute(text("CREATE UNIQUE INDEX ix_users_username ON users (username)"))
+        await conn.execute(text("DROP INDEX ix_users_created_at"))
+        await conn.execute(text("CREATE INDEX ix_users_extra ON users (is_active)"))
+
+    async with engine.connect() as conn:
+        problems = await conn.run_sync(index_drift)
+
+    assert problems == [
+        "users.ix_users_created_at: нет в БД, ожидается (created_at)",
+        "users.ix_users_extra: нет в модели, в БД (is_active)",
+        "users.ix_users_username: в модели UNIQUE (username) INCLUDE (id, password, is_active, is_deleted), "
+        "в БД UNIQUE (username)",
+    ]
+    assert await check_indexes(engine, "warn") == problems
+    with pytest.raises(RuntimeError, match="ix_users_created_at"):
+        await check_indexes(engine, "fail")
+
+
+@pytest.fixture
+async def migrations_db(engine):
+    """Отдельная пустая БД под прогон миграций: (url, движок)."""
+    url = make_url(settings.DATABASE_URL)
+    database = f"{url.database}_migrations"
+    try:
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{database}"'))
+            await conn.execute(text(f'CREATE DATABASE "{database}"'))
+    except Exception as exc:
+        pytest.skip(f"нельзя создать отдельную БД под миграции: {exc}")
+
+    migrations_url = url.set(database=database).render_as_string(hide_password=False)
+    migrated = create_async_engine(migrations_url)
+    try:
+        yield migrations_url, migrated
+    finally:
+        await migrated.dispose()
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f'DROP DATABASE IF EXISTS "{database}"'))
+
+
+def _alembic(url: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-m", "alembic", *args], cwd=ROOT, capture_output=True, text=True,
+                          env={**os.environ, "DATABASE_URL": url})
+
+
+@pytest.mark.asyncio
+async def test_migrations_build_the_indexes_the_model_declares(migrations_db):
+    url, migrated = migrations_db
+    _alembic(url, "upgrade", "head").check_returncode()
+
+    async with migrated.connect() as conn:
+        assert await conn.run_sync(index_drift) == []
+        checks = await conn.run_sync(lambda sync: inspect(sync).get_check_constraints("users"))
+        columns = await conn.run_sync(lambda sync: inspect(sync).get_columns("users"))
+    assert "check_user_active_deleted_logic" in {check["name"] for check in checks}
+    assert "version" in {column["name"] for column in columns}
+
+
+@pytest.mark.asyncio
+async def test_state_check_migration_stops_before_changes_on_bad_rows(migrations_db):
+    url, migrated = migrations_db
+    _alembic(url, "upgrade", "7cf63472ac28").check_returncode()
+    async with migrated.begin() as conn:
+        await conn.execute(text("INSERT INTO users (username, email, password, is_active, is_deleted) "
+                                "VALUES ('both', 'both@example.com', 'x', true, true)"))
+
+    result = _alembic(url, "upgrade", "head")
+    assert result.returncode != 0
+    assert "users rows are both active and deleted" in result.stderr
+
+    async with migrated.connect() as conn:
+        columns = await conn.run_sync(lambda sync: inspect(sync).get_columns("users"))
+        checks = await conn.run_sync(lambda sync: inspect(sync).get_check_constraints("users"))
+    assert "version" not in {column["name"] for column in columns}
+    assert checks == []
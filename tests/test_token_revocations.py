@@ -0,0 +1,128 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.invalidation import InvalidationListener
+from app.core.redis_service import RedisCacheService
+from app.core.security.revocations import BloomFilter, RevocationFilter, handle_token_revocation, revoked_tokens
+from app.core.security.tokens import TOKEN_REVOCATION_CHANNEL, decode_token, token_digest
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"jti-{i}")
+
+    assert all(f"jti-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_unsynced_filter_defers_to_redis():
+    revocations = RevocationFilter(capacity=100, error_rate=0.01)
+    assert revocations.might_be_revoked("anything")
+
+
+@pytest.mark.asyncio
+async def test_logout_stores_jti_with_ttl_until_exp(client: AsyncClient, redis_client, login):
+    token = await login("short_key")
+    payload = decode_token(token)
+
+    response = await client.post("/api/users/logout", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+    keys = [key async for key in redis_client.scan_iter(match="blacklist:*")]
+    assert keys == [f"blacklist:{payload['jti']}".encode()]
+    ttl = await redis_client.ttl(keys[0])
+    assert 0 < ttl <= payload["exp"] - time.time() + 1
+
+
+@pytest.mark.asyncio
+async def test_synced_filter_answers_without_redis(client: AsyncClient, redis_client, monkeypatch, login):
+    token = await login("local_check")
+    cache_service = RedisCacheService(redis_client)
+    await revoked_tokens.load(cache_service)
+
+    checks = 0
+    original = RedisCacheService.auth_lookup
+
+    async def counting_lookup(self, user_key, revocation_id=None, *args):
+        nonlocal checks
+        checks += revocation_id is not None
+        return await original(self, user_key, revocation_id, *args)
+
+    monkeypatch.setattr(RedisCacheService, "auth_lookup", counting_lookup)
+
+    response = await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert checks == 0
+
+    await client.post("/api/users/logout", headers={"Authorization": f"Bearer {token}"})
+    response = await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401
+    assert checks == 1
+
+
+@pytest.mark.asyncio
+async def test_filter_load_includes_legacy_full_token_keys(redis_client):
+    await redis_client.setex("blacklist:header.claims.signature", 60, "true")
+    await redis_client.setex("blacklist:abc123", 60, "1")
+
+    revocations = RevocationFilter(capacity=100, error_rate=0.01)
+    await revocations.load(RedisCacheService(redis_client))
+
+    assert revocations.synced
+    assert revocations.might_be_revoked(token_digest("header.claims.signature"))
+    assert revocations.might_be_revoked("abc123")
+
+
+@pytest.mark.asyncio
+async def test_revocation_reaches_other_workers_filter(redis_client):
+    await revoked_tokens.load(RedisCacheService(redis_client))
+    assert not revoked_tokens.might_be_revoked("jti-remote")
+
+    listener = InvalidationListener(redis_client)
+    listener.subscribe(TOKEN_REVOCATION_CHANNEL, handle_token_revocation)
+    listener.start()
+    try:
+        await asyncio.wait_for(listener.connected.wait(), timeout=5)
+        await RedisCacheService(redis_client).blacklist_token("jti-remote", token_digest("t"), 60)
+
+        for _ in range(50):
+            if revoked_tokens.might_be_revoked("jti-remote"):
+                break
+            await asyncio.sleep(0.02)
+        assert revoked_tokens.might_be_revoked("jti-remote")
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_loads_keep_revocations_that_arrive_mid_scan():
+    stored = {"jti-stored"}
+
+    class SlowScan:
+        def __init__(self, delay: float):
+            self.delay = delay
+
+        async def scan_revoked_tokens(self):
+            # SCAN не видит ключи, появившиеся после его начала
+            snapshot = list(stored)
+            await asyncio.sleep(self.delay)
+            for revocation_id in snapshot:
+                yield revocation_id
+
+    revocations = RevocationFilter(capacity=100, error_rate=0.01)
+    # Перестройка по таймеру и перезагрузка после переподключения подписки
+    rebuild = asyncio.create_task(revocations.load(SlowScan(0.05)))
+    await asyncio.sleep(0.01)
+    reload = asyncio.create_task(revocations.load(SlowScan(0.03)))
+    await asyncio.sleep(0.02)
+    stored.add("jti-mid-scan")
+    revocations.add("jti-mid-scan")
+    await asyncio.gather(rebuild, reload)
+
+    assert revocations.might_be_revoked("jti-stored")
+    assert revocations.might_be_revoked("jti-mid-scan")
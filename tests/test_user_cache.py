@@ -0,0 +1,100 @@
+import asyncio
+import time
+
+import pytest
+
+from app.core.codecs import VersionedCodec
+from app.core.invalidation import InvalidationListener
+from app.core.local_cache import LocalTTLCache
+from app.core.redis_service import RedisCacheService, USER_INVALIDATION_CHANNEL, evict_local_users
+
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalTTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_local_cache_expires_entries(monkeypatch):
+    cache = LocalTTLCache(maxsize=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+
+
+@pytest.mark.asyncio
+async def test_invalidation_reaches_other_workers(redis_client):
+    writer_cache = LocalTTLCache(maxsize=10, ttl=60)
+    reader_cache = LocalTTLCache(maxsize=10, ttl=60)
+    writer = RedisCacheService(redis_client, local_cache=writer_cache)
+    reader = RedisCacheService(redis_client, local_cache=reader_cache)
+
+    listener = InvalidationListener(redis_client)
+    listener.subscribe(USER_INVALIDATION_CHANNEL, lambda message: evict_local_users(reader_cache, message))
+    listener.start()
+    try:
+        await asyncio.wait_for(listener.connected.wait(), timeout=5)
+
+        await writer.set_user(1, {"id": 1})
+        assert await reader.get_user(1) == {"id": 1}
+        assert len(reader_cache) == 1
+
+        await writer.invalidate_user(1, "ivan")
+        for _ in range(50):
+            if not len(reader_cache):
+                break
+            await asyncio.sleep(0.02)
+
+        assert len(reader_cache) == 0
+        assert await reader.get_user(1) is None
+    finally:
+        await listener.stop()
+
+
+def test_versioned_codec_treats_other_schema_versions_as_miss():
+    current = VersionedCodec("orjson", schema_version=2)
+    previous = VersionedCodec("orjson", schema_version=1)
+    payload = previous.encode({"id": 1})
+
+    assert current.decode(payload) is None
+    assert current.decode(b'"{\\"id\\": 1}"') is None
+    assert current.decode(current.encode({"id": 1})) == {"id": 1}
+
+
+def test_versioned_codec_json_fast_path_returns_body_without_parsing():
+    codec = VersionedCodec("orjson", schema_version=1)
+    payload = codec.encode({"id": 1, "username": "ivan"})
+
+    assert codec.decode_json(payload) == b'{"id":1,"username":"ivan"}'
+
+
+def test_versioned_codec_reads_record_version_from_header():
+    codec = VersionedCodec("orjson", schema_version=1, record_version_field="version")
+    payload = codec.encode({"id": 1, "version": 300})
+
+    assert codec.record_version(payload) == 300
+    assert codec.decode_json(payload) == b'{"id":1,"version":300}'
+    assert codec.decode(payload) == {"id": 1, "version": 300}
+    # Запись без версии в заголовке той же схемы — промах, а не обрезанное тело
+    assert codec.decode(codec.header + b"{}") is None
+
+
+@pytest.mark.asyncio
+async def test_cached_user_payload_is_encoded_once(redis_client):
+    cache = RedisCacheService(redis_client)
+    await cache.set_user(7, {"id": 7, "username": "ivan"})
+
+    raw = await redis_client.get("user:7")
+    assert raw == cache.codec.header + (0).to_bytes(4, "big") + b'{"id":7,"username":"ivan"}'
+    assert await cache.get_user(7) == {"id": 7, "username": "ivan"}
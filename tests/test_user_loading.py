@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+from app.core.exceptions import EntityNotFoundError
+from app.core.local_cache import LocalTTLCache, user_local_cache
+from app.core.redis_service import RedisCacheService
+from app.core.singleflight import SingleFlight
+from app.repositories.user_repo import UserRepo
+from app.service.users import UserService
+
+
+@pytest.mark.asyncio
+async def test_single_flight_runs_loader_once_for_concurrent_calls():
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"id": 1}
+
+    flight = SingleFlight("test")
+    results = await asyncio.gather(*(flight.do("user:1", loader) for _ in range(10)))
+
+    assert calls == 1
+    assert results == [{"id": 1}] * 10
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_loader_errors():
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise EntityNotFoundError()
+
+    flight = SingleFlight("test")
+    results = await asyncio.gather(*(flight.do("user:1", loader) for _ in range(3)),
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, EntityNotFoundError) for result in results)
+    assert len(flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_cache_misses_query_db_once(client: AsyncClient, redis_client, monkeypatch):
+    create = await client.post(
+        "/api/users/",
+        json={"username": "hot_user", "password": "pass1234", "email": "hot@example.com"},
+    )
+    user_id = create.json()["id"]
+
+    db_calls = 0
+    original = UserRepo.get_user_by_id
+
+    async def counting_get_user_by_id(self, *args, **kwargs):
+        nonlocal db_calls
+        db_calls += 1
+        await asyncio.sleep(0.05)
+        return await original(self, *args, **kwargs)
+
+    monkeypatch.setattr(UserRepo, "get_user_by_id", counting_get_user_by_id)
+    await redis_client.flushdb()
+    user_local_cache.clear()
+
+    responses = await asyncio.gather(*(client.get(f"/api/users/{user_id}") for _ in range(5)))
+
+    assert all(response.status_code == 200 for response in responses)
+    assert db_calls == 1
+
+
+@pytest.mark.asyncio
+async def test_redis_lock_lets_other_workers_reuse_loaded_user(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_POLL_MS", 10)
+    fetches = 0
+
+    def make_worker():
+        cache = RedisCacheService(redis_client, local_cache=LocalTTLCache(maxsize=10, ttl=60))
+        service = UserService(session_factory=None, cache_service=cache)
+
+        async def fetch():
+            nonlocal fetches
+            fetches += 1
+            await asyncio.sleep(0.1)
+            await cache.set_user(1, {"id": 1})
+            return {"id": 1}
+
+        return service, fetch
+
+    (first, first_fetch), (second, second_fetch) = make_worker(), make_worker()
+    results = await asyncio.gather(first._fill_cache(1, first_fetch),
+                                   second._fill_cache(1, second_fetch))
+
+    assert results == [{"id": 1}, {"id": 1}]
+    assert fetches == 1
+    assert await redis_client.get("lock:user:1") is None
+
+
+@pytest.mark.asyncio
+async def test_user_lock_release_goes_through_evalsha_and_keeps_foreign_lock(redis_client, monkeypatch):
+    cache = RedisCacheService(redis_client)
+    await redis_client.script_flush()
+    monkeypatch.setattr(redis_client, "eval", None)
+
+    token = await cache.acquire_user_lock(7, ttl_ms=1000)
+    await cache.release_user_lock(7, "someone-else")
+    assert await redis_client.get("lock:user:7") is not None
+
+    await cache.release_user_lock(7, token)
+    assert await redis_client.get("lock:user:7") is None
+
+
+@pytest.mark.asyncio
+async def test_lock_waiters_stop_waiting_when_holder_caches_nothing(redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_ENABLED", True)
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_TTL_MS", 2000)
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_POLL_MS", 10)
+    fetches = 0
+
+    async def fetch_missing():
+        nonlocal fetches
+        fetches += 1
+        await asyncio.sleep(0.1)
+        raise EntityNotFoundError()
+
+    def make_service():
+        return UserService(session_factory=None, cache_service=RedisCacheService(redis_client))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(make_service()._fill_cache(1, fetch_missing),
+                                   make_service()._fill_cache(1, fetch_missing),
+                                   return_exceptions=True)
+
+    assert all(isinstance(result, EntityNotFoundError) for result in results)
+    assert fetches == 2
+    # Второй воркер ушел в БД, как только лок отпустили, а не через USER_CACHE_LOCK_TTL_MS
+    assert time.perf_counter() - started < 1
+
+
+@pytest.mark.asyncio
+async def test_filtered_load_does_not_take_user_lock(client: AsyncClient, create_user, redis_client, monkeypatch):
+    monkeypatch.setattr(settings, "USER_CACHE_LOCK_ENABLED", True)
+    user_id = await create_user("lock_filters")
+    locks = []
+    acquire = RedisCacheService.acquire_user_lock
+
+    async def recording_acquire(self, user_id, ttl_ms):
+        locks.append(user_id)
+        return await acquire(self, user_id, ttl_ms)
+
+    monkeypatch.setattr(RedisCacheService, "acquire_user_lock", recording_acquire)
+
+    response = await client.get(f"/api/users/{user_id}", params={"show_active": False})
+    assert response.status_code == 200
+    assert locks == []
+
+    await redis_client.flushdb()
+    user_local_cache.clear()
+    await client.get(f"/api/users/{user_id}")
+    assert locks == [user_id]
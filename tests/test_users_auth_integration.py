@@ -0,0 +1,116 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+from redis.asyncio.client import Pipeline
+
+from app.core.invalidation import InvalidationListener
+from app.core.local_cache import LocalTTLCache, user_local_cache
+from app.core.redis_service import RedisCacheService
+from app.core.security.tokens import TOKEN_REVOCATION_CHANNEL, token_digest, verified_tokens
+from app.service import users as users_service
+
+
+@pytest.mark.asyncio
+async def test_me_returns_current_user(client: AsyncClient, login):
+    token = await login("me_user")
+
+    response = await client.get("/api/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["data"]["username"] == "me_user"
+
+
+@pytest.mark.asyncio
+async def test_me_with_garbage_token_returns_401(client: AsyncClient):
+    response = await client.get("/api/users/me", headers={"Authorization": "Bearer not-a-jwt"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_repeated_me_reuses_verified_token(client: AsyncClient, monkeypatch, login):
+    token = await login("hot_token")
+    headers = {"Authorization": f"Bearer {token}"}
+    await client.get("/api/users/me", headers=headers)
+
+    decodes = 0
+    original = users_service.decode_token
+
+    def counting_decode(value, **kwargs):
+        nonlocal decodes
+        decodes += 1
+        return original(value, **kwargs)
+
+    monkeypatch.setattr(users_service, "decode_token", counting_decode)
+
+    for _ in range(3):
+        response = await client.get("/api/users/me", headers=headers)
+        assert response.status_code == 200
+    assert decodes == 0
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_cached_token(client: AsyncClient, login):
+    token = await login("leaving")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert (await client.get("/api/users/me", headers=headers)).status_code == 200
+
+    logout = await client.post("/api/users/logout", headers=headers)
+    assert logout.status_code == 200
+
+    response = await client.get("/api/users/me", headers=headers)
+    assert response.status_code == 401
+    assert response.json()["error"] == "TokenBlackListedError"
+
+
+@pytest.mark.asyncio
+async def test_logout_evicts_token_in_other_workers(redis_client):
+    other_worker_tokens = LocalTTLCache(maxsize=10, ttl=60)
+    other_worker_tokens.set(token_digest("some.jwt.token"), {"sub": "ivan"})
+
+    listener = InvalidationListener(redis_client)
+    listener.subscribe(TOKEN_REVOCATION_CHANNEL, lambda message: other_worker_tokens.delete(message.split()[0]))
+    listener.start()
+    try:
+        await asyncio.wait_for(listener.connected.wait(), timeout=5)
+        await RedisCacheService(redis_client).blacklist_token("jti-1", token_digest("some.jwt.token"), 60)
+
+        for _ in range(50):
+            if not len(other_worker_tokens):
+                break
+            await asyncio.sleep(0.02)
+        assert len(other_worker_tokens) == 0
+    finally:
+        await listener.stop()
+
+
+@pytest.mark.asyncio
+async def test_me_costs_one_redis_round_trip(client: AsyncClient, redis_client, monkeypatch, login):
+    token = await login("one_rtt")
+    headers = {"Authorization": f"Bearer {token}"}
+    assert (await client.get("/api/users/me", headers=headers)).status_code == 200
+
+    # Холодный воркер: ни токена, ни пользователя в локальных кэшах, Bloom-фильтр не загружен
+    verified_tokens.clear()
+    user_local_cache.clear()
+
+    round_trips = 0
+    execute_command = redis_client.execute_command
+    pipeline_execute = Pipeline.execute
+
+    async def counting_command(*args, **kwargs):
+        nonlocal round_trips
+        round_trips += 1
+        return await execute_command(*args, **kwargs)
+
+    async def counting_pipeline(self, *args, **kwargs):
+        nonlocal round_trips
+        round_trips += 1
+        return await pipeline_execute(self, *args, **kwargs)
+
+    monkeypatch.setattr(redis_client, "execute_command", counting_command)
+    monkeypatch.setattr(Pipeline, "execute", counting_pipeline)
+
+    response = await client.get("/api/users/me", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["X-RateLimit-Remaining"] == "18"
+    assert round_trips == 1
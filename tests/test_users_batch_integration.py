@@ -0,0 +1,75 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_batch_returns_users_in_request_order(client: AsyncClient, create_user):
+    first = await create_user("batch_first")
+    second = await create_user("batch_second")
+
+    response = await client.get(f"/api/users/batch?ids={second}&ids=99999&ids={first}")
+    assert response.status_code == 200
+    data = response.json()
+    assert [u["id"] for u in data["users"]] == [second, first]
+    assert data["missing"] == [99999]
+
+
+@pytest.mark.asyncio
+async def test_batch_serves_cached_and_uncached_users_together(client: AsyncClient, create_user):
+    first = await create_user("batch_cached")
+    second = await create_user("batch_fresh")
+    await client.get(f"/api/users/{first}")
+
+    response = await client.get(f"/api/users/batch?ids={first}&ids={second}&ids={first}")
+    assert response.status_code == 200
+    data = response.json()
+    assert [u["username"] for u in data["users"]] == ["batch_cached", "batch_fresh"]
+    assert data["missing"] == []
+
+    again = await client.get(f"/api/users/batch?ids={first}&ids={second}")
+    assert again.json() == {"users": data["users"], "missing": []}
+
+
+@pytest.mark.asyncio
+async def test_batch_applies_filters(client: AsyncClient, create_user):
+    active = await create_user("batch_active")
+    deleted = await create_user("batch_deleted")
+    await client.patch(f"/api/users/{deleted}", json={"is_deleted": True, "is_active": False})
+
+    response = await client.get(f"/api/users/batch?ids={active}&ids={deleted}")
+    assert [u["id"] for u in response.json()["users"]] == [active]
+    assert response.json()["missing"] == [deleted]
+
+    only_deleted = await client.get(f"/api/users/batch?ids={active}&ids={deleted}&show_deleted=true")
+    assert [u["id"] for u in only_deleted.json()["users"]] == [deleted]
+
+
+@pytest.mark.asyncio
+async def test_batch_without_ids_returns_422(client: AsyncClient):
+    response = await client.get("/api/users/batch")
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_batch_body_matches_response_model_serialization(client: AsyncClient, create_user):
+    from fastapi.responses import JSONResponse
+
+    from app.schemas.user import UserBatch
+
+    first = await create_user("batch_same_bytes")
+    response = await client.get(f"/api/users/batch?ids={first}&ids=424242")
+
+    expected = JSONResponse(UserBatch.model_validate(response.json()).model_dump(mode="json")).body
+    assert response.content == expected
+
+
+@pytest.mark.asyncio
+async def test_batch_does_not_cache_users_hidden_from_single_get(client: AsyncClient, create_user):
+    inactive = await create_user("batch_inactive")
+    await client.patch(f"/api/users/{inactive}", json={"is_active": False})
+    assert (await client.get(f"/api/users/{inactive}")).status_code == 404
+
+    response = await client.get(f"/api/users/batch?ids={inactive}&show_active=false")
+    assert [u["id"] for u in response.json()["users"]] == [inactive]
+
+    assert (await client.get(f"/api/users/{inactive}")).status_code == 404
@@ -0,0 +1,67 @@
+import pytest
+from httpx import AsyncClient
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_each_row(client: AsyncClient):
+    await client.post(
+        "/api/users/",
+        json={"username": "existing", "password": "pass1234", "email": "existing@example.com"},
+    )
+
+    response = await client.post(
+        "/api/users/bulk",
+        json=[
+            {"username": "bulk_one", "password": "pass1234", "email": "bulk_one@example.com"},
+            {"username": "existing", "password": "pass1234", "email": "other@example.com"},
+            {"username": "bulk_two", "password": "pass1234", "email": "bulk_one@example.com"},
+            {"username": "ab", "password": "pass1234", "email": "short@example.com"},
+            {"username": "bulk_three", "password": "pass1234", "email": "bulk_three@example.com"},
+        ],
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["created"], data["conflicts"], data["invalid"]) == (2, 2, 1)
+
+    statuses = [(r["index"], r["status"], r["field"]) for r in data["results"]]
+    assert statuses == [
+        (0, "created", None),
+        (1, "conflict", "username"),
+        (2, "conflict", "email"),
+        (3, "invalid", None),
+        (4, "created", None),
+    ]
+    assert "username" in data["results"][3]["error"]
+
+    created_id = data["results"][0]["id"]
+    get_response = await client.get(f"/api/users/{created_id}")
+    assert get_response.json()["username"] == "bulk_one"
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_accepts_ndjson_and_hashes_passwords(client: AsyncClient):
+    body = (
+        '{"username": "ndjson_user", "password": "secret123", "email": "ndjson@example.com"}\n'
+        '{"username": "ndjson_other", "password": "secret456", "email": "ndjson_other@example.com"}\n'
+    )
+    response = await client.post(
+        "/api/users/bulk",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.json()["created"] == 2
+
+    login = await client.post("/api/users/login", data={"username": "ndjson_user", "password": "secret123"})
+    assert login.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_rejects_malformed_body(client: AsyncClient):
+    response = await client.post(
+        "/api/users/bulk",
+        content=b"{not json",
+        headers={"Content-Type": "application/json"},
+    )
+    assert response.status_code == 400
+    assert response.json()["error"] == "InvalidPayloadError"
@@ -1,6 +1,9 @@
 import pytest
 from httpx import AsyncClient
 
+from app.core.security.passwords import password_hasher
+from app.repositories.user_repo import UserRepo
+
 @pytest.mark.asyncio
 async def test_create_user_returns_201_and_user(client: AsyncClient):
     response = await client.post(
@@ -102,3 +105,46 @@ async def test_create_user_does_not_return_password(client: AsyncClient):
     data = response.json()
     assert "password" not in data
     assert "password" not in data.get("user", {})
+
+
+@pytest.mark.asyncio
+async def test_create_user_taken_username_skips_password_hashing(client: AsyncClient, monkeypatch):
+    await client.post("/api/users/", json={"username": "taken", "password": "secret123", "email": "a@example.com"})
+
+    hashed = []
+    original = password_hasher.hash
+
+    async def counting_hash(password: str) -> str:
+        hashed.append(password)
+        return await original(password)
+
+    monkeypatch.setattr(password_hasher, "hash", counting_hash)
+    response = await client.post("/api/users/",
+                                 json={"username": "taken", "password": "other456", "email": "b@example.com"})
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "Entity with this username already exists"
+    assert hashed == []
+
+
+@pytest.mark.asyncio
+async def test_create_user_race_after_precheck_reports_conflicting_field(client: AsyncClient, monkeypatch):
+    await client.post("/api/users/", json={"username": "first", "password": "secret123", "email": "race@example.com"})
+
+    # Первая проверка "не видит" конкурента, как если бы он вставил строку сразу после нее
+    calls = []
+    original = UserRepo.get_taken_credentials
+
+    async def stale_first_check(self, usernames, emails):
+        calls.append(usernames)
+        if len(calls) == 1:
+            return set(), set()
+        return await original(self, usernames, emails)
+
+    monkeypatch.setattr(UserRepo, "get_taken_credentials", stale_first_check)
+    response = await client.post("/api/users/",
+                                 json={"username": "second", "password": "other456", "email": "race@example.com"})
+
+    assert response.status_code == 409
+    assert response.json()["message"] == "Entity with this email already exists"
+    assert len(calls) == 2
@@ -0,0 +1,46 @@
+import csv
+import io
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app.core.config import settings
+
+
+@pytest.mark.asyncio
+async def test_export_ndjson_streams_all_users_in_chunks(client: AsyncClient, monkeypatch, create_user):
+    monkeypatch.setattr(settings, "USER_EXPORT_CHUNK_SIZE", 2)
+    user_ids = [await create_user(f"export_{i}") for i in range(5)]
+    users = [(await client.get(f"/api/users/{user_id}")).json() for user_id in user_ids]
+
+    response = await client.get("/api/users/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert rows == users
+
+
+@pytest.mark.asyncio
+async def test_export_csv_applies_filters(client: AsyncClient, create_user):
+    user_ids = [await create_user(f"export_{i}") for i in range(3)]
+    await client.patch(f"/api/users/{user_ids[1]}", json={"is_deleted": True, "is_active": False})
+
+    response = await client.get("/api/users/export?format=csv")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [row["username"] for row in rows] == ["export_0", "export_2"]
+    assert rows[0]["email"] == "export_0@example.com"
+
+    with_deleted = await client.get("/api/users/export?format=csv&show_deleted=true")
+    assert len(list(csv.DictReader(io.StringIO(with_deleted.text)))) == 3
+
+
+@pytest.mark.asyncio
+async def test_export_empty_csv_has_header(client: AsyncClient, prepare_db):
+    response = await client.get("/api/users/export?format=csv")
+    assert response.status_code == 200
+    assert response.text.strip() == "username,email,id,is_active,is_deleted,created_at,version"
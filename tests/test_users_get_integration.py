@@ -43,3 +43,35 @@ async def test_get_user_show_deleted_returns_200(client: AsyncClient):
     assert response.status_code == 200
     assert response.json()["id"] == user_id
     assert response.json()["is_deleted"] is True
+
+
+@pytest.mark.asyncio
+async def test_get_user_cached_response_matches_uncached(client: AsyncClient):
+    create = await client.post(
+        "/api/users/",
+        json={"username": "cached_get", "password": "pass1234", "email": "cached_get@example.com"},
+    )
+    assert create.status_code == 201
+    user_id = create.json()["id"]
+
+    first = await client.get(f"/api/users/{user_id}")
+    second = await client.get(f"/api/users/{user_id}")
+    assert first.status_code == second.status_code == 200
+    assert first.headers["content-type"] == "application/json"
+    assert first.content == second.content
+    assert first.json() == create.json()
+
+
+@pytest.mark.asyncio
+async def test_filtered_get_does_not_cache_inactive_user(client: AsyncClient):
+    create = await client.post(
+        "/api/users/",
+        json={"username": "get_inactive", "password": "pass1234", "email": "get_inactive@example.com"},
+    )
+    user_id = create.json()["id"]
+    await client.patch(f"/api/users/{user_id}", json={"is_active": False})
+
+    shown = await client.get(f"/api/users/{user_id}", params={"show_active": False})
+    assert shown.json()["is_active"] is False
+
+    assert (await client.get(f"/api/users/{user_id}")).status_code == 404
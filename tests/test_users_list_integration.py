@@ -74,3 +74,81 @@ async def test_user_list_show_active_false_includes_inactive(client: AsyncClient
     assert response.status_code == 200
     ids = [u["id"] for u in response.json()]
     assert user_id in ids
+
+
+@pytest.mark.asyncio
+async def test_user_list_cursor_pages_through_all_users(client: AsyncClient):
+    created_ids = []
+    for i in range(5):
+        create = await client.post(
+            "/api/users/",
+            json={
+                "username": f"cursor_{i}",
+                "password": "pass1234",
+                "email": f"cursor{i}@example.com",
+            },
+        )
+        created_ids.append(create.json()["id"])
+
+    first_page = await client.get("/api/users/?limit=2")
+    assert first_page.status_code == 200
+    assert [u["id"] for u in first_page.json()] == created_ids[:2]
+    assert 'rel="next"' in first_page.headers["link"]
+
+    seen = [u["id"] for u in first_page.json()]
+    cursor = first_page.headers["x-next-cursor"]
+    while cursor:
+        page = await client.get("/api/users/", params={"limit": 2, "cursor": cursor})
+        assert page.status_code == 200
+        seen.extend(u["id"] for u in page.json())
+        cursor = page.headers.get("x-next-cursor")
+
+    assert seen == created_ids
+
+
+@pytest.mark.asyncio
+async def test_user_list_after_id_skips_lower_ids(client: AsyncClient):
+    ids = []
+    for i in range(3):
+        create = await client.post(
+            "/api/users/",
+            json={
+                "username": f"after_{i}",
+                "password": "pass1234",
+                "email": f"after{i}@example.com",
+            },
+        )
+        ids.append(create.json()["id"])
+
+    response = await client.get(f"/api/users/?after_id={ids[0]}&limit=10")
+    assert response.status_code == 200
+    assert [u["id"] for u in response.json()] == ids[1:]
+    assert "x-next-cursor" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_user_list_invalid_cursor_returns_400(client: AsyncClient):
+    response = await client.get("/api/users/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json()["error"] == "InvalidCursorError"
+
+
+@pytest.mark.asyncio
+async def test_user_list_body_matches_response_model_serialization(client: AsyncClient, db_session):
+    from fastapi.responses import JSONResponse
+    from sqlalchemy import select
+
+    from app.models.user import User
+    from app.schemas.user import user_list_adapter
+
+    for name in ("plain_user", "иван_петров"):
+        await client.post("/api/users/", json={"username": name, "password": "pass1234", "email": f"{len(name)}x@example.com"})
+
+    response = await client.get("/api/users/")
+
+    users = (await db_session.execute(select(User).order_by(User.id))).scalars().all()
+    assert len(users) == 2
+    validated = user_list_adapter.validate_python(users, from_attributes=True)
+    expected = JSONResponse(user_list_adapter.dump_python(validated, mode="json")).body
+    assert response.content == expected
+    assert response.headers["content-type"] == "application/json"
@@ -0,0 +1,75 @@
+import pytest
+from httpx import AsyncClient
+from redis.asyncio.client import Pipeline
+
+
+@pytest.mark.asyncio
+async def test_status_change_reports_each_id(client: AsyncClient, create_user):
+    first = await create_user("status_first")
+    second = await create_user("status_second")
+
+    response = await client.post("/api/users/status",
+                                 json={"ids": [first, second, 999, first], "action": "deactivate"})
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["updated"], data["unchanged"], data["conflicts"], data["not_found"]) == (2, 0, 0, 1)
+    assert data["results"] == [
+        {"id": first, "status": "updated"},
+        {"id": second, "status": "updated"},
+        {"id": 999, "status": "not_found"},
+    ]
+
+    again = await client.post("/api/users/status", json={"ids": [first], "action": "deactivate"})
+    assert again.json()["results"] == [{"id": first, "status": "unchanged"}]
+
+    await client.post("/api/users/status", json={"ids": [second], "action": "soft_delete"})
+    activated = await client.post("/api/users/status", json={"ids": [first, second], "action": "activate"})
+    assert activated.json()["results"] == [
+        {"id": first, "status": "updated"},
+        {"id": second, "status": "conflict"},
+    ]
+
+    deleted = await client.get(f"/api/users/{second}", params={"show_deleted": True, "show_active": False})
+    assert (deleted.json()["is_active"], deleted.json()["is_deleted"]) == (False, True)
+    # Две смены статуса, повторная деактивация версию не тронула
+    assert deleted.json()["version"] == 3
+
+
+@pytest.mark.asyncio
+async def test_status_change_invalidates_id_and_username_keys_in_one_pipeline(client: AsyncClient, redis_client,
+                                                                             monkeypatch, max_round_trips,
+                                                                             create_user):
+    user_ids = [await create_user(f"cached_{i}") for i in range(3)]
+    login = await client.post("/api/users/login", data={"username": "cached_0", "password": "pass1234"})
+    headers = {"Authorization": f"Bearer {login.json()['access_token']}"}
+    assert (await client.get("/api/users/me", headers=headers)).status_code == 200
+    for user_id in user_ids:
+        await client.get(f"/api/users/{user_id}")
+
+    pipelines = 0
+    pipeline_execute = Pipeline.execute
+
+    async def counting_pipeline(self, *args, **kwargs):
+        nonlocal pipelines
+        pipelines += 1
+        return await pipeline_execute(self, *args, **kwargs)
+
+    monkeypatch.setattr(Pipeline, "execute", counting_pipeline)
+    with max_round_trips(1):
+        response = await client.post("/api/users/status", json={"ids": user_ids, "action": "deactivate"})
+    assert response.json()["updated"] == 3
+    assert pipelines == 1
+
+    assert not await redis_client.exists("user:user:cached_0", *(f"user:{user_id}" for user_id in user_ids))
+    fetched = await client.get(f"/api/users/{user_ids[1]}", params={"show_active": False})
+    assert fetched.json()["is_active"] is False
+    assert (await client.get("/api/users/me", headers=headers)).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_status_change_validates_body(client: AsyncClient):
+    empty = await client.post("/api/users/status", json={"ids": [], "action": "deactivate"})
+    assert empty.status_code == 422
+
+    unknown = await client.post("/api/users/status", json={"ids": [1], "action": "ban"})
+    assert unknown.status_code == 422
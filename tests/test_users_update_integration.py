@@ -1,3 +1,5 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
 
@@ -120,3 +122,78 @@ async def test_update_user_conflict_username_returns_409(client: AsyncClient):
     assert response.status_code == 409
     message = response.json().get("message", "").lower()
     assert "username" in message or "имя" in message or "именем" in message
+
+
+@pytest.mark.asyncio
+async def test_update_user_with_matching_if_match_bumps_version(client: AsyncClient, max_round_trips, create_user):
+    user_id = await create_user("etag_user")
+    fetched = await client.get(f"/api/users/{user_id}")
+    assert fetched.headers["etag"] == '"1"'
+
+    response = await client.patch(f"/api/users/{user_id}", json={"username": "etag_renamed"},
+                                  headers={"If-Match": fetched.headers["etag"]})
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+    assert response.json()["version"] == 2
+
+    # Кэш сброшен после UPDATE: GET отдает новые данные и новый ETag
+    refetched = await client.get(f"/api/users/{user_id}")
+    assert refetched.json()["username"] == "etag_renamed"
+    assert refetched.headers["etag"] == '"2"'
+
+    # Повторный GET из кэша: версия берется из заголовка записи, тело не разбирается
+    with max_round_trips(0):
+        cached = await client.get(f"/api/users/{user_id}")
+    assert cached.headers["etag"] == '"2"'
+    assert cached.content == refetched.content
+
+
+@pytest.mark.asyncio
+async def test_update_user_with_stale_if_match_returns_412(client: AsyncClient, create_user):
+    user_id = await create_user("stale_user")
+    await client.patch(f"/api/users/{user_id}", json={"is_active": False})
+
+    response = await client.patch(f"/api/users/{user_id}", json={"username": "lost_update"},
+                                  headers={"If-Match": '"1"'})
+    assert response.status_code == 412
+    assert response.json()["error"] == "PreconditionFailedError"
+    assert response.headers["etag"] == '"2"'
+
+    current = await client.get(f"/api/users/{user_id}", params={"show_active": False})
+    assert current.json()["username"] == "stale_user"
+
+
+@pytest.mark.asyncio
+async def test_update_user_concurrent_patches_with_same_if_match_one_wins(client: AsyncClient, create_user):
+    user_id = await create_user("race_user")
+
+    responses = await asyncio.gather(*(
+        client.patch(f"/api/users/{user_id}", json={"username": f"race_{i}"}, headers={"If-Match": '"1"'})
+        for i in range(4)
+    ))
+    assert sorted(response.status_code for response in responses) == [200, 412, 412, 412]
+
+
+@pytest.mark.asyncio
+async def test_update_user_malformed_if_match_returns_412(client: AsyncClient, create_user):
+    user_id = await create_user("bad_etag")
+
+    response = await client.patch(f"/api/users/{user_id}", json={"is_active": False},
+                                  headers={"If-Match": 'W/"1"'})
+    assert response.status_code == 412
+
+
+@pytest.mark.asyncio
+async def test_update_user_missing_with_if_match_returns_404(client: AsyncClient, prepare_db):
+    response = await client.patch("/api/users/999", json={"is_active": False}, headers={"If-Match": '"1"'})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_update_user_deleting_active_user_maps_check_constraint_to_400(client: AsyncClient, create_user):
+    user_id = await create_user("check_user")
+
+    # В запросе только is_deleted: противоречие с текущим is_active ловит CHECK в БД
+    response = await client.patch(f"/api/users/{user_id}", json={"is_deleted": True})
+    assert response.status_code == 400
+    assert response.json()["error"] == "InconsistentStateError"